@@ -18,8 +18,9 @@
 """Global events."""
 
 from mailman.app import domain, membership, moderator, subscriptions
-from mailman.core import i18n, switchboard
+from mailman.core import i18n, metrics, switchboard
 from mailman.languages import manager as language_manager
+from mailman.model import template
 from mailman.styles import manager as style_manager
 from mailman.utilities import passwords
 from public import public
@@ -34,6 +35,7 @@ def initialize():
         i18n.handle_ConfigurationUpdatedEvent,
         language_manager.handle_ConfigurationUpdatedEvent,
         membership.handle_SubscriptionEvent,
+        metrics.handle_ConfigurationUpdatedEvent,
         moderator.handle_ListDeletingEvent,
         passwords.handle_ConfigurationUpdatedEvent,
         style_manager.handle_ConfigurationUpdatedEvent,
@@ -42,4 +44,5 @@ def initialize():
         subscriptions.handle_SubscriptionInvitationNeededEvent,
         subscriptions.handle_UnsubscriptionConfirmationNeededEvent,
         switchboard.handle_ConfigurationUpdatedEvent,
+        template.handle_ConfigurationUpdatedEvent,
         ])
@@ -17,13 +17,16 @@
 
 """Master subprocess watcher."""
 
+import gc
 import os
 import sys
 import click
 import signal
 import socket
 import logging
+import traceback
 
+from contextlib import suppress
 from datetime import timedelta
 from enum import Enum
 from flufl.lock import Lock, NotLockedError, TimeOutError
@@ -32,6 +35,7 @@ from mailman.config import config
 from mailman.core.i18n import _
 from mailman.core.initialize import initialize
 from mailman.core.logging import reopen
+from mailman.utilities.modules import find_name
 from mailman.utilities.options import I18nCommand, validate_runner_spec
 from mailman.version import MAILMAN_VERSION_FULL
 from public import public
@@ -311,6 +315,8 @@ class Loop:
         :return: The process id of the child runner.
         :rtype: int
         """
+        if as_boolean(config.mailman.preload_runners):
+            return self._fork_runner(spec)
         pid = os.fork()
         if pid:
             # Parent.
@@ -350,6 +356,67 @@ class Loop:
         # We should never get here.
         raise RuntimeError('os.execle() failed')
 
+    def _fork_runner(self, spec):
+        """Start a runner in a fork of the master, without exec'ing it.
+
+        The runner shares the master's initialized system, copy-on-write, so
+        only the resources which can't be shared are set up again.
+
+        :param spec: A runner spec, i.e. name:slice:count
+        :type spec: string
+        :return: The process id of the child runner.
+        :rtype: int
+        """
+        name, slice_number, count = spec.split(':')
+        # Import the runner here, so that it is shared by all of its
+        # processes.  Any error is reported by the child.
+        runner_config = getattr(config, 'runner.' + name, None)
+        if runner_config is not None:
+            with suppress(ImportError):
+                find_name(runner_config['class'])
+        # Database connections can't be shared with the child, so don't keep
+        # any open across the fork.  The master doesn't need them.
+        config.db.store.close()
+        config.db.engine.dispose()
+        # Keep the child's garbage collector from touching, and thus copying,
+        # the memory of the objects it inherits.  gc.freeze() is new in
+        # Python 3.7.
+        gc_enabled = gc.isenabled()
+        freeze = hasattr(gc, 'freeze')
+        if freeze:
+            gc.disable()
+            gc.freeze()
+        pid = os.fork()
+        if freeze:
+            if pid:
+                # The master's own objects are collected as usual.
+                gc.unfreeze()
+            if gc_enabled:
+                gc.enable()
+        if pid:
+            # Parent.
+            return pid
+        # Child.  Whatever happens, it must never return into the master.
+        status = 1
+        try:
+            status = _run_forked_runner(
+                name, int(slice_number), int(count))
+        except SystemExit as error:
+            status = 0 if error.code is None else error.code
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            # os._exit() skips the atexit handlers, which would save the
+            # runner's last statistics.  The master's own handlers must not
+            # run in the child.
+            try:
+                config.stats.save()
+            except Exception:
+                traceback.print_exc()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status if isinstance(status, int) else 1)
+
     def start_runners(self, runner_names=None):
         """Start all the configured runners.
 
@@ -488,6 +555,31 @@ Runner {0} reached maximum restart limit of {1:d}, not restarting.""".format(
                 continue
 
 
+def _run_forked_runner(name, slice_number, count):
+    # Run the runner in the child process, the way bin/runner would have.
+    # This changes the error behavior of make_runner() as in the exec'd
+    # runners.
+    os.environ['MAILMAN_UNDER_MASTER_CONTROL'] = '1'
+    # Forget the master's signal handlers and lock refreshing alarm; the
+    # runner installs its own handlers.
+    signal.alarm(0)
+    for signum in (signal.SIGALRM, signal.SIGHUP, signal.SIGUSR1,
+                   signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    # Open our own log files.
+    reopen()
+    # bin/runner starts measuring coverage when it is imported under the
+    # test suite, which only the runner should do.
+    from mailman.bin.runner import make_runner
+    runner = make_runner(name, slice_number, count)
+    runner.set_signals()
+    log = logging.getLogger('mailman.runner')
+    log.info('{} runner started.'.format(runner.name))
+    runner.run()
+    log.info('{} runner exiting.'.format(runner.name))
+    return runner.status
+
+
 @click.command(
     cls=I18nCommand,
     context_settings=dict(help_option_names=['-h', '--help']),
@@ -17,7 +17,9 @@
 
 """Test master watcher utilities."""
 
+import gc
 import os
+import signal
 import tempfile
 import unittest
 
@@ -40,6 +42,29 @@ class FakeLock:
         pass
 
 
+class PreloadedRunner:
+    # Set in the master, so only a forked runner sees it.
+    marker = None
+
+    def __init__(self, name, slice=None):
+        self.name = name
+        self.status = 0
+
+    def set_signals(self):
+        pass
+
+    def run(self):
+        if self.name == 'broken':
+            raise RuntimeError('by test runner')
+        path = os.path.join(config.VAR_DIR, 'preloaded.txt')
+        with open(path, 'w', encoding='utf-8') as fp:
+            print(self.marker, file=fp)
+            print(os.environ.get('MAILMAN_UNDER_MASTER_CONTROL'), file=fp)
+            print(signal.getsignal(signal.SIGALRM) == signal.SIG_DFL, file=fp)
+        config.stats.count('finished', self.name)
+        self.status = 42
+
+
 class TestMaster(unittest.TestCase):
     layer = ConfigLayer
 
@@ -135,3 +160,69 @@ Exiting.
             # We created a non-restartable loop.
             start_mock.assert_called_once_with([('in', 1, 1)])
             loop_mock.assert_called_once_with()
+
+
+class TestPreload(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        config.push('preload', """\
+        [mailman]
+        preload_runners: yes
+        [runner.preloaded]
+        class: mailman.bin.tests.test_master.PreloadedRunner
+        [runner.broken]
+        class: mailman.bin.tests.test_master.PreloadedRunner
+        """)
+        self.addCleanup(config.pop, 'preload')
+        PreloadedRunner.marker = 'preloaded'
+        self.addCleanup(setattr, PreloadedRunner, 'marker', None)
+        self._loop = master.Loop()
+
+    def _start(self, spec):
+        pid = self._loop._start_runner(spec)
+        self.assertNotEqual(pid, os.getpid())
+        ignore, status = os.waitpid(pid, 0)
+        self.assertTrue(os.WIFEXITED(status))
+        return os.WEXITSTATUS(status)
+
+    def test_fork_without_exec(self):
+        with patch('mailman.bin.master.os.execle') as execle:
+            self.assertEqual(self._start('preloaded:0:1'), 42)
+        execle.assert_not_called()
+        path = os.path.join(config.VAR_DIR, 'preloaded.txt')
+        self.addCleanup(os.remove, path)
+        with open(path, encoding='utf-8') as fp:
+            self.assertEqual(fp.read().splitlines(),
+                             ['preloaded', '1', 'True'])
+
+    @unittest.skipUnless(hasattr(gc, 'freeze'), 'Python 3.7 or later')
+    def test_garbage_collection(self):
+        # Only the child keeps the inherited objects frozen, the master
+        # collects its own garbage as usual.
+        self.assertEqual(self._start('preloaded:0:1'), 42)
+        self.addCleanup(os.remove, os.path.join(
+            config.VAR_DIR, 'preloaded.txt'))
+        self.assertEqual(gc.get_freeze_count(), 0)
+        self.assertTrue(gc.isenabled())
+
+    def test_statistics_saved(self):
+        # The runner's statistics are saved when it exits, even though they
+        # aren't due to be saved yet.
+        stats = config.stats
+        self.addCleanup(stats.reset)
+        self.addCleanup(setattr, stats, 'interval', stats.interval)
+        self.addCleanup(setattr, stats, 'enabled', stats.enabled)
+        stats.interval = 3600
+        stats.enabled = True
+        self.assertEqual(self._start('preloaded:0:1'), 42)
+        self.addCleanup(os.remove, os.path.join(
+            config.VAR_DIR, 'preloaded.txt'))
+        self.assertEqual(stats.counters(), {('finished', 'preloaded'): 1})
+
+    def test_runner_error(self):
+        # The child exits, without returning into the master.
+        self.assertEqual(self._start('broken:0:1'), 1)
+
+    def test_undefined_runner(self):
+        self.assertEqual(self._start('bogus:0:1'), signal.SIGTERM)
@@ -27,7 +27,9 @@ from mailman.config import config
 from mailman.core.i18n import _
 from mailman.interfaces.chain import LinkAction
 from mailman.interfaces.rules import IRule
+from mailman.utilities.string import combine_patterns
 from public import public
+from weakref import ref
 from zope.interface import implementer
 
 
@@ -43,7 +45,7 @@ def _make_rule_name(suffix):
     return 'header-match-{}'.format(suffix)
 
 
-def make_link(header, pattern, chain=None, suffix=None):
+def make_link(header, pattern, chain=None, suffix=None, matcher=None):
     """Create a Link object.
 
     The link action is to defer by default, since at the end of all the
@@ -60,23 +62,124 @@ def make_link(header, pattern, chain=None, suffix=None):
     :type chain: string
     :param suffix: An optional name suffix for the rule.
     :type suffix: string
+    :param matcher: An optional matcher shared with other rules, which
+        checks all their patterns against each message at once.
+    :type matcher: `HeaderMatcher`
     :return: The link representing this rule check.
     :rtype: `ILink`
     """
     rule_name = _make_rule_name(suffix)
     if rule_name in config.rules:
         del config.rules[rule_name]
-    rule = HeaderMatchRule(header, pattern, suffix)
+    rule = HeaderMatchRule(header, pattern, suffix, matcher)
     if chain is None:
         return Link(rule)
     return Link(rule, LinkAction.jump, chain)
 
 
+@public
+class HeaderMatcher:
+    """Match the headers of messages against a set of patterns.
+
+    The headers of each message are decoded only once, however many patterns
+    are checked against them.  All the patterns for the same header are also
+    combined into a single regular expression, so that a header which
+    matches none of them is ruled out with a single search.
+
+    The matches are remembered for the last message checked, until `reset()`
+    is called.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._compiled = None
+        self._message = None
+        self._matches = None
+
+    def add(self, header, pattern):
+        """Add a pattern to match against a header.
+
+        :param header: The case-insensitive header field name.
+        :param pattern: The regular expression to search the header's value
+            for, case-insensitively.
+        :return: The index of the pattern, to pass to `match()`.
+        """
+        self._entries.append((header.lower(), pattern))
+        self._compiled = None
+        self.reset()
+        return len(self._entries) - 1
+
+    def reset(self):
+        """Forget the matches of the last message checked."""
+        self._message = None
+        self._matches = None
+
+    def _compile(self, mlist):
+        by_header = {}
+        for index, (header, pattern) in enumerate(self._entries):
+            regexps = by_header.setdefault(header, [])
+            try:
+                regexps.append((index, re.compile(pattern, re.IGNORECASE)))
+            except re.error as error:
+                log.error(
+                    "Invalid regexp '{}' in header_matches for {}: {}".format(
+                        pattern, mlist.list_id, error.msg))
+        self._compiled = {}
+        for header, regexps in by_header.items():
+            combined = None
+            if len(regexps) > 1:
+                combined = combine_patterns(
+                    [cre.pattern for index, cre in regexps], re.IGNORECASE)
+            self._compiled[header] = (combined, regexps)
+
+    def _match_all(self, msg):
+        # Collect all the headers in all subparts.
+        headers = {header: [] for header in self._compiled}
+        for part in msg.walk():
+            for header, values in headers.items():
+                values.extend(part.get_all(header, []))
+        matches = {}
+        for header, values in headers.items():
+            combined, regexps = self._compiled[header]
+            decoded = []
+            for value in values:
+                if isinstance(value, Header):
+                    value = value.encode()
+                # RFC2047 decode, but don't change value as it affects the
+                # msg.
+                decoded.append((value, str(make_header(decode_header(value)))))
+            if (combined is not None and
+                    not any(combined.search(text) for value, text in decoded)):
+                continue
+            for index, cre in regexps:
+                for value, text in decoded:
+                    if cre.search(text):
+                        matches[index] = value
+                        break
+        return matches
+
+    def match(self, index, mlist, msg):
+        """Match a message's headers against one of the patterns.
+
+        :param index: The index of the pattern, as returned by `add()`.
+        :param mlist: The mailing list the message is posted to.
+        :param msg: The message.
+        :return: The first value of the pattern's header which matches it, or
+            None if none does.
+        """
+        if self._compiled is None:
+            self._compile(mlist)
+        if self._message is None or self._message() is not msg:
+            self._matches = self._match_all(msg)
+            self._message = ref(msg)
+        return self._matches.get(index)
+
+
 @implementer(IRule)
 class HeaderMatchRule:
     """Header matching rule used by header-match chain."""
 
-    def __init__(self, header, pattern, suffix=None):
+    def __init__(self, header, pattern, suffix=None, matcher=None):
         self.header = header
         self.pattern = pattern
         self.name = _make_rule_name(suffix)
@@ -88,6 +191,11 @@ class HeaderMatchRule:
         # rule name.  I suppose we could do the better hit recording in the
         # check() method, and set self.record = False.
         self.record = True
+        # A rule with its own matcher can't know when the next message
+        # starts, so it doesn't remember the matches.
+        self._shared = matcher is not None
+        self._matcher = HeaderMatcher() if matcher is None else matcher
+        self._index = self._matcher.add(header, pattern)
         # Register this rule so that other parts of the system can query it.
         assert self.name not in config.rules, (
             'Duplicate HeaderMatchRule: {} [{}: {}]'.format(
@@ -96,32 +204,18 @@ class HeaderMatchRule:
 
     def check(self, mlist, msg, msgdata):
         """See `IRule`."""
-        # Collect all the headers in all subparts.
-        headers = []
-        for p in msg.walk():
-            headers.extend(p.get_all(self.header, []))
-        for value in headers:
-            if isinstance(value, Header):
-                value = value.encode()
-            # RFC2047 decode, but don't change value as it affects the msg.
-            new_value = str(make_header(decode_header(value)))
-            try:
-                mo = re.search(self.pattern, new_value, re.IGNORECASE)
-            except re.error as error:
-                log.error(
-                    "Invalid regexp '{}' in header_matches for {}: {}".format(
-                        self.pattern, mlist.list_id, error.msg))
-                return False
-            else:
-                if mo:
-                    msgdata['moderation_sender'] = msg.sender
-                    with _.defer_translation():
-                        # This will be translated at the point of use.
-                        msgdata.setdefault('moderation_reasons', []).append(
-                            (_('Header "{}" matched a header rule'),
-                             str(self.header) + ": " + str(value)))
-                    return True
-        return False
+        if not self._shared:
+            self._matcher.reset()
+        value = self._matcher.match(self._index, mlist, msg)
+        if value is None:
+            return False
+        msgdata['moderation_sender'] = msg.sender
+        with _.defer_translation():
+            # This will be translated at the point of use.
+            msgdata.setdefault('moderation_reasons', []).append(
+                (_('Header "{}" matched a header rule'),
+                 str(self.header) + ": " + str(value)))
+        return True
 
 
 @public
@@ -138,6 +232,10 @@ class HeaderMatchChain(Chain):
         # configuration file, the database, and any explicitly added header
         # checks (via the .extend() method).
         self._extended_links = []
+        self._extended_matcher = HeaderMatcher()
+        # The links for each mailing list, along with the header checks they
+        # were made from.  {list_id -> (checks, matcher, links, list_links)}
+        self._links = {}
 
     def extend(self, header, pattern):
         """Extend the existing header matches.
@@ -146,7 +244,8 @@ class HeaderMatchChain(Chain):
         :param pattern: The pattern to match the header's value again.  The
             match is not anchored and is done case-insensitively.
         """
-        self._extended_links.append(make_link(header, pattern))
+        self._extended_links.append(
+            make_link(header, pattern, matcher=self._extended_matcher))
 
     def flush(self):
         """See `IMutableChain`."""
@@ -156,10 +255,13 @@ class HeaderMatchChain(Chain):
             if rule_name.startswith('header-match-'):
                 del config.rules[rule_name]
         self._extended_links = []
+        self._extended_matcher = HeaderMatcher()
+        self._links.clear()
 
-    def get_links(self, mlist, msg, msgdata):
-        """See `IChain`."""
-        # First return all the configuration file links.
+    def _make_links(self, mlist):
+        # All the header checks of the mailing list share a single matcher.
+        matcher = HeaderMatcher()
+        links = []
         for index, line in enumerate(
                 config.antispam.header_checks.splitlines()):
             if len(line.strip()) == 0:
@@ -170,7 +272,40 @@ class HeaderMatchChain(Chain):
                           'contains bogus line: {}'.format(line))
                 continue
             rule_name = 'config-{}'.format(index)
-            yield make_link(parts[0], parts[1].lstrip(), suffix=rule_name)
+            links.append(make_link(
+                parts[0], parts[1].lstrip(), suffix=rule_name,
+                matcher=matcher))
+        list_links = []
+        for index, entry in enumerate(mlist.header_matches):
+            # Jump to the default antispam chain if the entry chain is None.
+            chain = (config.antispam.jump_chain
+                     if entry.chain is None
+                     else entry.chain)
+            rule_name = '{}-{}'.format(mlist.list_id, index)
+            list_links.append(make_link(
+                entry.header, entry.pattern, chain, rule_name, matcher))
+        return matcher, links, list_links
+
+    def get_links(self, mlist, msg, msgdata):
+        """See `IChain`."""
+        # The rules are only made again when the header checks in the
+        # configuration file or the mailing list's header matches change.
+        checks = (
+            config.antispam.header_checks,
+            config.antispam.jump_chain,
+            [(entry.header, entry.pattern, entry.chain)
+             for entry in mlist.header_matches],
+            )
+        cached = self._links.get(mlist.list_id)
+        if cached is None or cached[0] != checks:
+            cached = (checks, *self._make_links(mlist))
+            self._links[mlist.list_id] = cached
+        checks, matcher, links, list_links = cached
+        # This is a new message.
+        matcher.reset()
+        self._extended_matcher.reset()
+        # First return all the configuration file links.
+        yield from links
         # Then return all the explicitly added links.
         yield from self._extended_links
         # If any of the above rules matched, they will have deferred their
@@ -179,10 +314,4 @@ class HeaderMatchChain(Chain):
         # list-specific matches.
         yield Link('any', LinkAction.jump, config.antispam.jump_chain)
         # Then return all the list-specific header matches.
-        for index, entry in enumerate(mlist.header_matches):
-            # Jump to the default antispam chain if the entry chain is None.
-            chain = (config.antispam.jump_chain
-                     if entry.chain is None
-                     else entry.chain)
-            rule_name = '{}-{}'.format(mlist.list_id, index)
-            yield make_link(entry.header, entry.pattern, chain, rule_name)
+        yield from list_links
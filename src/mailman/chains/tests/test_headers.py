@@ -20,6 +20,7 @@
 import unittest
 
 from email import message_from_bytes
+from email.header import decode_header
 from mailman.app.lifecycle import create_list
 from mailman.chains.headers import HeaderMatchRule, make_link
 from mailman.config import config
@@ -39,6 +40,7 @@ from mailman.testing.helpers import (
     specialized_message_from_string as mfs,
 )
 from mailman.testing.layers import ConfigLayer
+from unittest.mock import patch
 
 
 class TestHeaderChain(unittest.TestCase):
@@ -442,17 +444,13 @@ A message body.
             self.assertEqual(event.mlist, self._mlist)
             self.assertEqual(event.msg, msg)
 
-    @unittest.expectedFailure
     @configuration('antispam', header_checks="""
     Header1: a+
     """, jump_chain='hold')
     def test_reuse_rules(self):
         # Test that existing header-match rules are used instead of creating
-        # new ones.
-        # MAS Reusing existing rules is problematic. If the rule with say
-        # position = 0 is deleted the following rule should become
-        # header-match-<list-id>-0 but that rule has the old values for
-        # header and pattern.
+        # new ones, as long as the header matches don't change.  See
+        # test_reuse_rules_changed() for what happens when they do.
         # See https://gitlab.com/mailman/mailman/-/issues/818
         chain = config.chains['header-match']
         header_matches = IHeaderMatchList(self._mlist)
@@ -475,6 +473,95 @@ A message body.
         for link1, link2 in zip(links_1, links_2):
             self.assertIs(link1.rule, link2.rule)
 
+    def test_reuse_rules_changed(self):
+        # When the header matches change, the rules are made again, so that
+        # their names still follow their positions.
+        chain = config.chains['header-match']
+        header_matches = IHeaderMatchList(self._mlist)
+        header_matches.append('Header1', 'a+')
+        header_matches.append('Header2', 'b+')
+        def get_links():                          # noqa: E306
+            return [
+                link for link in chain.get_links(self._mlist, Message(), {})
+                if link.rule.name != 'any'
+                ]
+        links_1 = get_links()
+        del header_matches[0]
+        links_2 = get_links()
+        self.assertEqual(
+            [(link.rule.name, link.rule.header) for link in links_2],
+            [('header-match-test.example.com-0', 'header2')])
+        self.assertIsNot(links_1[1].rule, links_2[0].rule)
+
+    def test_headers_decoded_once(self):
+        # However many header matches there are, each header is only decoded
+        # once per message.
+        msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Subject: =?utf-8?q?Bad_subject?=
+Message-ID: <ant>
+
+body
+""")
+        header_matches = IHeaderMatchList(self._mlist)
+        header_matches.append('Subject', 'good', 'accept')
+        header_matches.append('Subject', 'neutral', 'accept')
+        header_matches.append('Subject', 'bad', 'discard')
+        events = []
+        with patch('mailman.chains.headers.decode_header',
+                   wraps=decode_header) as decoder:
+            with event_subscribers(events.append):
+                process(self._mlist, msg, {}, start_chain='header-match')
+        self.assertEqual(decoder.call_count, 1)
+        self.assertEqual(len(events), 1)
+        self.assertIsInstance(events[0], DiscardEvent)
+
+    def test_uncombinable_patterns(self):
+        # Patterns which can't be combined with the others for the same
+        # header are still matched.
+        header_matches = IHeaderMatchList(self._mlist)
+        header_matches.append('Subject', 'good', 'accept')
+        header_matches.append('Subject', '(?s)ba+d', 'discard')
+        header_matches.append('Subject', r'(ug)\1ly', 'reject')
+        for subject, event_class in (('A baad one', DiscardEvent),
+                                     ('An ugugly one', RejectEvent)):
+            msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+
+body
+""")
+            msg['Subject'] = subject
+            events = []
+            with event_subscribers(events.append):
+                process(self._mlist, msg, {}, start_chain='header-match')
+            self.assertEqual(len(events), 1)
+            self.assertIsInstance(events[0], event_class)
+
+    def test_modified_message(self):
+        # The matches remembered for a message are forgotten when it's
+        # processed again.
+        msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Subject: Good subject
+Message-ID: <ant>
+
+body
+""")
+        header_matches = IHeaderMatchList(self._mlist)
+        header_matches.append('Subject', 'bad', 'discard')
+        events = []
+        with event_subscribers(events.append):
+            process(self._mlist, msg, {}, start_chain='header-match')
+            self.assertEqual(events, [])
+            msg.replace_header('Subject', 'Bad subject')
+            process(self._mlist, msg, {}, start_chain='header-match')
+        self.assertEqual(len(events), 1)
+        self.assertIsInstance(events[0], DiscardEvent)
+
     def test_hold_returns_reason(self):
         # Test that a match with hold action returns a reason
         msg = mfs("""\
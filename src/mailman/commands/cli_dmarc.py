@@ -0,0 +1,76 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The `mailman dmarc` subcommand."""
+
+import click
+
+from mailman.core.i18n import _
+from mailman.interfaces.command import ICLISubCommand
+from mailman.rules.dmarc import policy_cache
+from mailman.utilities.datetime import now
+from mailman.utilities.options import I18nCommand
+from public import public
+from zope.interface import implementer
+
+
+def _dmarc_domain(domain):
+    return domain if domain.startswith('_dmarc.') else '_dmarc.' + domain
+
+
+@click.command(
+    cls=I18nCommand,
+    help=_("""\
+    Show the cached DMARC policies, i.e. the DMARC records found in DNS for
+    the domains of recent posters, and how many seconds they'll still be
+    cached for.  Domains without a DMARC policy are shown as such."""))
+@click.option(
+    '--domain', '-d', 'domains',
+    multiple=True,
+    help=_("""\
+    Only show or flush the cached policy of this domain.  This option may be
+    given more than once."""))
+@click.option(
+    '--flush', '-f',
+    is_flag=True, default=False,
+    help=_('Forget the cached policies, in all Mailman processes.'))
+def dmarc(domains, flush):
+    dmarc_domains = {_dmarc_domain(domain.lower()) for domain in domains}
+    if flush:
+        if len(dmarc_domains) == 0:
+            policy_cache.flush()
+        for dmarc_domain in sorted(dmarc_domains):
+            policy_cache.flush(dmarc_domain)
+        return
+    right_now = now(strip_tzinfo=False).timestamp()
+    for dmarc_domain, expires, records in policy_cache.entries():
+        if len(dmarc_domains) > 0 and dmarc_domain not in dmarc_domains:
+            continue
+        ttl = int(expires - right_now)
+        if records is None:
+            print(_('${dmarc_domain} (${ttl}s): no DMARC policy'))
+            continue
+        print('{} ({}s)'.format(dmarc_domain, ttl))
+        for name, rdtype, value in records:
+            print('    {} {} {}'.format(name, rdtype, value))
+
+
+@public
+@implementer(ICLISubCommand)
+class DMARC:
+    name = 'dmarc'
+    command = dmarc
@@ -25,7 +25,6 @@ from mailman.interfaces.command import ICLISubCommand
 from mailman.interfaces.listmanager import IListManager
 from mailman.interfaces.member import DeliveryMode, DeliveryStatus, MemberRole
 from mailman.utilities.options import I18nCommand
-from operator import attrgetter
 from public import public
 from zope.component import getUtility
 from zope.interface import implementer
@@ -85,21 +84,22 @@ def display_members(ctx, mlist, role, regular, digest,
         # click should enforce a valid member role.
         roster = mlist.get_roster(MemberRole[role])
     # Print; outfp will be either the file or stdout to print to.
-    addresses = list(roster.addresses)
-    if len(addresses) == 0:
+    memberships = sorted(roster.with_preferences(),
+                         key=lambda item: item[0].address.email)
+    if len(memberships) == 0:
         print(_('${mlist.list_id} has no members'), file=outfp)
         return
-    for address in sorted(addresses, key=attrgetter('email')):
-        member = roster.get_member(address.email)
+    for member, preferences in memberships:
         if regular:
-            if member.delivery_mode != DeliveryMode.regular:
+            if preferences.delivery_mode != DeliveryMode.regular:
                 continue
         if digest is not None:
-            if member.delivery_mode not in digest_types:
+            if preferences.delivery_mode not in digest_types:
                 continue
         if nomail is not None:
-            if member.delivery_status not in status_types:
+            if preferences.delivery_status not in status_types:
                 continue
+        address = member.address
         if email_only:
             print(address.original_email, file=outfp)
         else:
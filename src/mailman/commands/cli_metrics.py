@@ -0,0 +1,93 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The `mailman metrics` subcommand."""
+
+import click
+
+from mailman.config import config
+from mailman.core.i18n import _
+from mailman.core.metrics import quantile
+from mailman.interfaces.command import ICLISubCommand
+from mailman.utilities.options import I18nCommand
+from public import public
+from zope.interface import implementer
+
+
+def _ms(seconds):
+    if seconds is None:
+        return '-'
+    if seconds == float('inf'):
+        return 'inf'
+    return '{:.1f}'.format(seconds * 1000)
+
+
+@click.command(
+    cls=I18nCommand,
+    help=_("""\
+    Show how long pipeline handlers, chain rules, chain actions, and queue
+    runners take to process messages, and how long messages wait in each
+    queue, merged across all Mailman processes.  Times are in
+    milliseconds; the 95th percentile is estimated from the latency
+    histogram."""))
+@click.option(
+    '--list', '-l', 'list_id',
+    help=_('Only show the timings for this list-id.'))
+@click.option(
+    '--kind', '-k',
+    type=click.Choice(('handler', 'rule', 'chain', 'queue-wait', 'runner')),
+    help=_('Only show the timings of this kind of component.'))
+@click.option(
+    '--reset', '-r',
+    is_flag=True, default=False,
+    help=_('Forget all collected timings.'))
+def metrics(list_id, kind, reset):
+    stats = config.stats
+    if reset:
+        stats.reset()
+        return
+    if not stats.enabled:
+        print(_('Metrics collection is disabled; see the [metrics] section '
+                'of the configuration.'))
+    rows = [
+        (entry['kind'], entry['name'], entry['list_id'] or '',
+         str(entry['count']), str(entry['errors']),
+         _ms(entry['seconds'] / entry['count']),
+         _ms(quantile(entry, 0.95)), _ms(entry['max_seconds']))
+        for entry in stats.collect()
+        if ((list_id is None or entry['list_id'] == list_id) and
+            (kind is None or entry['kind'] == kind))
+        ]
+    if len(rows) == 0:
+        return
+    rows.insert(0, (_('KIND'), _('NAME'), _('LIST'), _('COUNT'), _('ERRORS'),
+                    _('MEAN'), _('P95'), _('MAX')))
+    widths = [max(len(row[column]) for row in rows)
+              for column in range(len(rows[0]))]
+    for row in rows:
+        # Left align the names and right align the numbers.
+        print('  '.join(
+            [cell.ljust(width) for cell, width in zip(row[:3], widths)] +
+            [cell.rjust(width) for cell, width in zip(row[3:], widths[3:])]
+            ).rstrip())
+
+
+@public
+@implementer(ICLISubCommand)
+class Metrics:
+    name = 'metrics'
+    command = metrics
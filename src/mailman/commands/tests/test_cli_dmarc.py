@@ -0,0 +1,65 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test the `mailman dmarc` command."""
+
+import unittest
+
+from click.testing import CliRunner
+from mailman.commands.cli_dmarc import dmarc
+from mailman.rules.dmarc import policy_cache
+from mailman.rules.tests.test_dmarc import get_dns_resolver
+from mailman.testing.layers import ConfigLayer
+
+
+class TestDMARC(unittest.TestCase):
+    layer = ConfigLayer
+    maxDiff = None
+
+    def setUp(self):
+        self._command = CliRunner()
+        with get_dns_resolver():
+            policy_cache.lookup('_dmarc.example.biz')
+            policy_cache.lookup('_dmarc.example.org')
+
+    def test_show(self):
+        result = self._command.invoke(dmarc)
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(result.output, """\
+_dmarc.example.biz (3600s)
+    _dmarc.example.biz. TXT v=DMARC1; p=reject;
+_dmarc.example.org (3600s): no DMARC policy
+""")
+
+    def test_show_domain(self):
+        result = self._command.invoke(dmarc, ('--domain', 'example.org'))
+        self.assertEqual(result.output,
+                         '_dmarc.example.org (3600s): no DMARC policy\n')
+
+    def test_flush(self):
+        result = self._command.invoke(dmarc, ('--flush',))
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(policy_cache.entries(), [])
+
+    def test_flush_domain(self):
+        result = self._command.invoke(
+            dmarc, ('--flush', '--domain', '_dmarc.example.biz'))
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(
+            [dmarc_domain for dmarc_domain, expires, records
+             in policy_cache.entries()],
+            ['_dmarc.example.org'])
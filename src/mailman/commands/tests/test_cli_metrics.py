@@ -0,0 +1,83 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test the `mailman metrics` command."""
+
+import unittest
+
+from click.testing import CliRunner
+from mailman.commands.cli_metrics import metrics
+from mailman.config import config
+from mailman.testing.helpers import configuration
+from mailman.testing.layers import ConfigLayer
+
+
+class TestMetrics(unittest.TestCase):
+    layer = ConfigLayer
+    maxDiff = None
+
+    def setUp(self):
+        self._command = CliRunner()
+        self.addCleanup(lambda: config.stats.reset())
+
+    def _record(self):
+        stats = config.stats
+        stats.record('handler', 'decorate', 'ant.example.com', 0.002)
+        stats.record('handler', 'decorate', 'ant.example.com', 0.004)
+        stats.record('rule', 'approved', 'bee.example.com', 0.02, error=True)
+
+    @configuration('metrics', enabled='yes')
+    def test_table(self):
+        self._record()
+        result = self._command.invoke(metrics)
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(result.output, """\
+KIND     NAME      LIST             COUNT  ERRORS  MEAN   P95   MAX
+handler  decorate  ant.example.com      2       0   3.0   5.0   4.0
+rule     approved  bee.example.com      1       1  20.0  50.0  20.0
+""")
+
+    @configuration('metrics', enabled='yes')
+    def test_filters(self):
+        self._record()
+        result = self._command.invoke(metrics, ('--list', 'bee.example.com'))
+        self.assertEqual(result.output.splitlines()[1:], [
+            'rule  approved  bee.example.com      1       1  20.0  50.0  20.0',
+            ])
+        result = self._command.invoke(metrics, ('--kind', 'handler'))
+        self.assertEqual(
+            [line.split()[1] for line in result.output.splitlines()],
+            ['NAME', 'decorate'])
+
+    @configuration('metrics', enabled='yes')
+    def test_nothing_recorded(self):
+        result = self._command.invoke(metrics)
+        self.assertEqual(result.output, '')
+
+    def test_disabled(self):
+        result = self._command.invoke(metrics)
+        self.assertEqual(
+            result.output,
+            'Metrics collection is disabled; see the [metrics] section of '
+            'the configuration.\n')
+
+    @configuration('metrics', enabled='yes')
+    def test_reset(self):
+        self._record()
+        result = self._command.invoke(metrics, ('--reset',))
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(config.stats.collect(), [])
@@ -111,6 +111,7 @@ class Configuration:
         self.commands = {}
         self.plugins = {}
         self.password_context = None
+        self.stats = None
         self.db = None
         # ARC parameters.
         self.arc_enabled = False
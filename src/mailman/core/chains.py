@@ -38,6 +38,7 @@ def process(mlist, msg, msgdata, start_chain='default-posting-chain'):
     msgdata['rule_misses'] = misses = []
     # Find the starting chain and begin iterating through its links.
     chain = config.chains[start_chain]
+    stats = config.stats
     chain_iter = chain.get_links(mlist, msg, msgdata)
     # Loop until we've reached the end of all processing chains.
     while chain:
@@ -54,7 +55,9 @@ def process(mlist, msg, msgdata, start_chain='default-posting-chain'):
                 return
             chain, chain_iter = chain_stack.pop()
             continue
-        if link.rule.check(mlist, msg, msgdata):
+        with stats.timer('rule', link.rule.name, mlist.list_id):
+            matched = link.rule.check(mlist, msg, msgdata)
+        if matched:
             if link.rule.record:
                 hits.append(link.rule.name)
             # The rule matched so run its action.
@@ -76,7 +79,8 @@ def process(mlist, msg, msgdata, start_chain='default-posting-chain'):
                 # Just process the next link in the chain.
                 pass
             elif link.action is LinkAction.run:
-                link.function(mlist, msg, msgdata)
+                with stats.timer('chain', chain.name, mlist.list_id):
+                    link.function(mlist, msg, msgdata)
             else:
                 raise AssertionError(
                     'Bad link action: {}'.format(link.action))
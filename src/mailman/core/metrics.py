@@ -0,0 +1,446 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Run-time processing statistics.
+
+Every process keeps its own statistics in memory, and periodically saves a
+snapshot of them to a file in the metrics directory.  Since Mailman runs as a
+set of independent processes, readers such as the REST API and the `mailman
+metrics` command merge the snapshots of all processes to get the site-wide
+view.  The snapshots of processes which have exited are folded into a single
+file of retired statistics when they are merged.
+"""
+
+import os
+import json
+import atexit
+import socket
+import logging
+
+from bisect import bisect_left
+from datetime import timedelta
+from flufl.lock import Lock, TimeOutError
+from lazr.config import as_boolean, as_timedelta
+from mailman.interfaces.configuration import ConfigurationUpdatedEvent
+from mailman.utilities.string import expand
+from public import public
+from threading import RLock
+from time import monotonic, perf_counter, time
+
+
+elog = logging.getLogger('mailman.error')
+
+# The statistics of the processes which have exited.
+RETIRED_FILE = 'retired.json'
+
+
+class _NullTimer:
+    """The timer used when metrics are disabled; it does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    """Time a block of code and record it in the metrics."""
+
+    __slots__ = ('_metrics', '_key', '_expected', '_start')
+
+    def __init__(self, metrics, key, expected):
+        self._metrics = metrics
+        self._key = key
+        self._expected = expected
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        elapsed = perf_counter() - self._start
+        error = (exc_type is not None and
+                 not issubclass(exc_type, self._expected))
+        self._metrics.record(*self._key, elapsed, error=error)
+        return False
+
+
+@public
+class Metrics:
+    """The processing statistics of the current process."""
+
+    def __init__(self, directory, buckets, enabled=True, interval=10):
+        """Create the statistics registry.
+
+        :param directory: The directory where snapshots are saved.
+        :type directory: str
+        :param buckets: The upper bounds of the latency histogram buckets, in
+            seconds, in increasing order.
+        :type buckets: sequence of float
+        :param enabled: Whether statistics are collected at all.
+        :type enabled: bool
+        :param interval: The minimum number of seconds between two snapshots
+            saved by this process.
+        :type interval: float
+        """
+        self.directory = directory
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        self.interval = interval
+        # Maps (kind, name, list_id) to the statistics list:
+        # [count, errors, total seconds, max seconds, bucket counts].
+        self._stats = {}
+        # Maps (kind, name) to the value of a counter.
+        self._counters = {}
+        self._last_save = monotonic()
+        self._dirty = False
+        self._atexit = False
+        # Some processes, e.g. the LMTP runner, count from several threads.
+        self._lock = RLock()
+        # Include the start time, so that a later process reusing this pid
+        # doesn't overwrite this process's statistics.
+        self._started = int(time())
+
+    @property
+    def filename(self):
+        """The path of this process's snapshot file."""
+        return os.path.join(self.directory, '{}.{}.{}.json'.format(
+            socket.gethostname(), os.getpid(), self._started))
+
+    def timer(self, kind, name, list_id, expected=()):
+        """Return a context manager which times the block it wraps.
+
+        When metrics are disabled, this returns a shared no-op context
+        manager, so the overhead is a single method call.
+
+        :param kind: The kind of component being timed, e.g. 'handler'.
+        :param name: The name of the component being timed.
+        :param list_id: The list-id of the mailing list being processed.
+        :param expected: Exception classes which are a normal outcome of the
+            timed block, and are not counted as errors.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, (kind, name, list_id), expected)
+
+    def record(self, kind, name, list_id, seconds, error=False):
+        """Record one timed call.
+
+        :param kind: The kind of component, e.g. 'handler' or 'rule'.
+        :param name: The component's name.
+        :param list_id: The list-id of the mailing list being processed.
+        :param seconds: How long the call took.
+        :param error: Whether the call raised an unexpected exception.
+        """
+        key = (kind, name, list_id)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [
+                    0, 0, 0.0, 0.0, [0] * (len(self.buckets) + 1)]
+            stats[0] += 1
+            if error:
+                stats[1] += 1
+            stats[2] += seconds
+            if seconds > stats[3]:
+                stats[3] = seconds
+            stats[4][bisect_left(self.buckets, seconds)] += 1
+            self._changed()
+
+    def count(self, kind, name, amount=1):
+        """Add to a counter, if metrics are enabled.
+
+        :param kind: What is being counted, e.g. 'enqueued'.
+        :param name: The name of the component doing the counting.
+        :param amount: How much to add to the counter.
+        """
+        if not self.enabled:
+            return
+        key = (kind, name)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._changed()
+
+    def _changed(self):
+        self._dirty = True
+        if not self._atexit:
+            atexit.register(self.save)
+            self._atexit = True
+        if monotonic() - self._last_save >= self.interval:
+            self.save()
+
+    def save(self):
+        """Save a snapshot of this process's statistics, if they changed."""
+        with self._lock:
+            self._last_save = monotonic()
+            if not self._dirty:
+                return
+            if self._write(self.filename,
+                           self._snapshot(self._stats, self._counters)):
+                self._dirty = False
+
+    def _snapshot(self, stats, counters):
+        return dict(
+            buckets=self.buckets,
+            entries=[[kind, name, list_id, count, errors, total, maximum,
+                      counts]
+                     for (kind, name, list_id), (
+                         count, errors, total, maximum, counts)
+                     in stats.items()],
+            counters=[[kind, name, value]
+                      for (kind, name), value in counters.items()],
+            )
+
+    def _write(self, filename, snapshot):
+        tmpfile = filename + '.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmpfile, 'w') as fp:
+                json.dump(snapshot, fp)
+            os.replace(tmpfile, filename)
+        except OSError:
+            # Statistics are never worth breaking message processing for.
+            elog.exception('Cannot save metrics snapshot: %s', filename)
+            return False
+        return True
+
+    def collect(self):
+        """Merge the statistics of all processes.
+
+        This process's own statistics are saved first so that they are
+        included.
+
+        :return: A list of dictionaries, one per kind, name, and list-id,
+            sorted in that order.  Each dictionary has the keys `kind`,
+            `name`, `list_id`, `count`, `errors`, `seconds` (the total time),
+            `max_seconds`, and `buckets`, which maps each histogram upper
+            bound to the number of calls which took at most that long but
+            longer than the previous bound.  The final bucket's bound is
+            `inf`.
+        """
+        merged, counters = self._merge()
+        bounds = self.buckets + (float('inf'),)
+        return [
+            dict(kind=kind, name=name, list_id=list_id, count=count,
+                 errors=errors, seconds=total, max_seconds=maximum,
+                 buckets=dict(zip(bounds, counts)))
+            for (kind, name, list_id), (count, errors, total, maximum, counts)
+            in sorted(merged.items(),
+                      key=lambda item: tuple(
+                          '' if part is None else part for part in item[0]))
+            ]
+
+    def counters(self):
+        """Merge the counters of all processes.
+
+        This process's own counters are saved first so that they are
+        included.
+
+        :return: A dictionary mapping (kind, name) to the counter's value.
+        """
+        merged, counters = self._merge()
+        return counters
+
+    def _merge(self):
+        self.save()
+        self._retire()
+        return self._fold(self._snapshots())
+
+    def _fold(self, snapshots):
+        merged = {}
+        counters = {}
+        for snapshot in snapshots:
+            for kind, name, value in snapshot.get('counters', ()):
+                counters[kind, name] = counters.get((kind, name), 0) + value
+            same_buckets = tuple(snapshot['buckets']) == self.buckets
+            for (kind, name, list_id, count, errors, total, maximum,
+                    counts) in snapshot['entries']:
+                stats = merged.get((kind, name, list_id))
+                if stats is None:
+                    stats = merged[kind, name, list_id] = [
+                        0, 0, 0.0, 0.0, [0] * (len(self.buckets) + 1)]
+                stats[0] += count
+                stats[1] += errors
+                stats[2] += total
+                stats[3] = max(stats[3], maximum)
+                # Histograms recorded with a different bucket configuration
+                # can't be merged; their calls are still counted above.
+                if same_buckets:
+                    stats[4] = [a + b for a, b in zip(stats[4], counts)]
+        return merged, counters
+
+    def _snapshots(self):
+        try:
+            filenames = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            return
+        # Read the retired statistics after listing the directory, so that
+        # the snapshots which were folded into them in the meantime are
+        # skipped.
+        retired = self._read(RETIRED_FILE)
+        folded = set()
+        if retired is not None:
+            folded.update(retired.get('folded', ()))
+            yield retired
+        for filename in filenames:
+            if (filename.endswith('.json') and filename != RETIRED_FILE and
+                    filename not in folded):
+                snapshot = self._read(filename)
+                if snapshot is not None:
+                    yield snapshot
+
+    def _read(self, filename):
+        path = os.path.join(self.directory, filename)
+        try:
+            with open(path) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            # It was retired, or never saved.
+            return None
+        except (OSError, ValueError):
+            # The process may have been writing it, or it is corrupt.
+            elog.exception('Skipping metrics snapshot: %s', path)
+            return None
+
+    def _retire(self):
+        # Fold the snapshots of the processes on this host which have exited
+        # into the retired statistics, so that the number of files to merge
+        # doesn't grow with every process ever started.  The snapshots of
+        # other hosts are left to the readers there.
+        hostname = socket.gethostname()
+        try:
+            filenames = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        exited = []
+        for filename in filenames:
+            parts = filename.rsplit('.', 3)
+            if (len(parts) == 4 and parts[0] == hostname and
+                    parts[1].isdigit() and parts[3] == 'json' and
+                    not _is_running(int(parts[1]))):
+                exited.append(filename)
+        if len(exited) == 0:
+            return
+        lock = Lock(os.path.join(self.directory, 'retired.lck'))
+        try:
+            lock.lock(timeout=timedelta(seconds=1))
+        except TimeOutError:
+            # Another process is retiring them.
+            return
+        try:
+            retired = self._read(RETIRED_FILE)
+            snapshots = []
+            if retired is not None:
+                # Remove the snapshots which were folded in last time, in
+                # case that was interrupted before they were removed.
+                for filename in retired.get('folded', ()):
+                    self._remove(filename)
+                snapshots.append(retired)
+                exited = [filename for filename in exited
+                          if filename not in retired.get('folded', ())]
+            folded = []
+            for filename in exited:
+                snapshot = self._read(filename)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+                    folded.append(filename)
+            if len(folded) == 0:
+                return
+            snapshot = self._snapshot(*self._fold(snapshots))
+            # Record which snapshots are folded in, so that readers skip them
+            # until they are removed.
+            snapshot['folded'] = folded
+            if self._write(os.path.join(self.directory, RETIRED_FILE),
+                           snapshot):
+                for filename in folded:
+                    self._remove(filename)
+        finally:
+            lock.unlock(unconditionally=True)
+
+    def _remove(self, filename):
+        try:
+            os.remove(os.path.join(self.directory, filename))
+        except FileNotFoundError:
+            pass
+
+    def reset(self):
+        """Forget all statistics, both in memory and in saved snapshots."""
+        with self._lock:
+            self._stats.clear()
+            self._counters.clear()
+            self._dirty = False
+        try:
+            filenames = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for filename in filenames:
+            if filename.endswith(('.json', '.json.tmp')):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # It's running as another user.
+        pass
+    return True
+
+
+@public
+def quantile(stats, fraction):
+    """Estimate a latency quantile from a histogram.
+
+    :param stats: A dictionary as returned by `Metrics.collect()`.
+    :param fraction: The quantile to estimate, between 0 and 1.
+    :return: The upper bound of the histogram bucket containing the quantile,
+        which may be `inf`, or None if the histogram is empty.
+    """
+    total = sum(stats['buckets'].values())
+    if total == 0:
+        return None
+    wanted = fraction * total
+    seen = 0
+    for bound, count in sorted(stats['buckets'].items()):
+        seen += count
+        if seen >= wanted:
+            return bound
+    return float('inf')                             # pragma: nocover
+
+
+@public
+def handle_ConfigurationUpdatedEvent(event):
+    if isinstance(event, ConfigurationUpdatedEvent):
+        section = event.config.metrics
+        # Save what the previous registry collected before replacing it.
+        if event.config.stats is not None:
+            event.config.stats.save()
+        event.config.stats = Metrics(
+            expand(section.path, None, event.config.paths),
+            [float(bound) for bound in section.buckets.split()],
+            enabled=as_boolean(section.enabled),
+            interval=as_timedelta(section.save_interval).total_seconds(),
+            )
@@ -46,11 +46,14 @@ def process(mlist, msg, msgdata, pipeline_name='built-in'):
     """
     message_id = msg.get('message-id', 'n/a')
     pipeline = config.pipelines[pipeline_name]
+    stats = config.stats
     for handler in pipeline:
         dlog.debug('{} pipeline {} processing: {}'.format(
             message_id, pipeline_name, handler.name))
         try:
-            handler.process(mlist, msg, msgdata)
+            with stats.timer('handler', handler.name, mlist.list_id,
+                             (DiscardMessage, RejectMessage)):
+                handler.process(mlist, msg, msgdata)
         except DiscardMessage as error:
             vlog.info(
                 '{} discarded by "{}" pipeline handler "{}": {}'.format(
@@ -72,7 +72,8 @@ class Runner:
         if self.is_queue_runner:
             self.queue_directory = expand(section.path, None, substitutions)
             self.switchboard = Switchboard(
-                name, self.queue_directory, slice, numslices, True)
+                name, self.queue_directory, slice, numslices, True,
+                as_boolean(section.queue_index), section.queue_format)
         else:
             self.queue_directory = None
             self.switchboard = None
@@ -81,7 +82,9 @@ class Runner:
         self.sleep_float = (86400 * self.sleep_time.days +
                             self.sleep_time.seconds +
                             self.sleep_time.microseconds / 1.0e6)
+        self.wakeup = as_boolean(section.wakeup)
         self.max_restarts = int(section.max_restarts)
+        self.batch_size = int(section.batch_size)
         self.start = as_boolean(section.start)
         self._stop = False
         self.status = 0
@@ -145,6 +148,8 @@ class Runner:
                 # work now or not.
                 self._snooze(filecnt)
         self._clean_up()
+        if self.switchboard is not None:
+            self.switchboard.close()
 
     def _one_iteration(self):
         """See `IRunner`."""
@@ -156,12 +161,24 @@ class Runner:
             files = []
         else:
             files = self.switchboard.files
+        # In batch mode, each message is processed inside its own savepoint,
+        # and the enclosing transaction is committed once for the whole
+        # batch.  Queue entries are only finished after the commit, so that
+        # a crash before the commit leaves their .bak files to be recovered.
+        batching = (self.batch_size > 1)
+        batch = []
         for filebase in files:
             dlog.debug('[%s] processing filebase: %s', me, filebase)
             try:
                 # Ask the switchboard for the message and metadata objects
                 # associated with this queue file.
                 msg, msgdata = self.switchboard.dequeue(filebase)
+            except FileNotFoundError:
+                # The entry was removed from the queue by some other process
+                # after we learned about it.  There's nothing to preserve.
+                dlog.debug('[%s] skipping vanished filebase: %s',
+                           me, filebase)
+                continue
             except Exception as error:
                 # This used to just catch email.Errors.MessageParseError, but
                 # other problems can occur in message parsing, e.g.
@@ -172,13 +189,20 @@ class Runner:
                 elog.error('Skipping and preserving unparseable message: %s',
                            filebase)
                 self.switchboard.finish(filebase, preserve=True)
-                config.db.abort()
+                if not batching:
+                    config.db.abort()
                 continue
+            savepoint = (config.db.savepoint() if batching else None)
             try:
                 dlog.debug('[%s] processing onefile', me)
-                self._process_one_file(msg, msgdata)
-                dlog.debug('[%s] finishing filebase: %s', me, filebase)
-                self.switchboard.finish(filebase)
+                with config.stats.timer('runner', self.switchboard.name, None):
+                    self._process_one_file(msg, msgdata)
+                if savepoint is None:
+                    dlog.debug('[%s] finishing filebase: %s', me, filebase)
+                    self.switchboard.finish(filebase)
+                else:
+                    savepoint.commit()
+                    batch.append(filebase)
             except Exception as error:
                 # All runners that implement _dispose() must guarantee that
                 # exceptions are caught and dealt with properly.  Still, there
@@ -196,7 +220,11 @@ class Runner:
                     shunt = config.switchboards['shunt']
                     new_filebase = shunt.enqueue(msg, msgdata)
                     elog.error('SHUNTING: %s', new_filebase)
-                    self.switchboard.finish(filebase)
+                    config.stats.count('shunted', self.switchboard.name)
+                    if savepoint is None:
+                        self.switchboard.finish(filebase)
+                    else:
+                        batch.append(filebase)
                 except Exception as error:
                     # The message wasn't successfully shunted.  Log the
                     # exception and try to preserve the original queue entry
@@ -206,19 +234,34 @@ class Runner:
                         'SHUNTING FAILED, preserving original entry: %s',
                         filebase)
                     self.switchboard.finish(filebase, preserve=True)
-                config.db.abort()
-            # Other work we want to do each time through the loop.
-            dlog.debug('[%s] doing periodic', me)
-            self._do_periodic()
-            dlog.debug('[%s] committing transaction', me)
-            config.db.commit()
+                # Only throw away this message's changes when batching.
+                if savepoint is None:
+                    config.db.abort()
+                else:
+                    savepoint.rollback()
+            if not batching or len(batch) >= self.batch_size:
+                self._commit(batch)
+                batch = []
             dlog.debug('[%s] checking short circuit', me)
             if self._short_circuit():
                 dlog.debug('[%s] short circuiting', me)
                 break
+        if len(batch) > 0:
+            self._commit(batch)
         dlog.debug('[%s] ending oneloop: %s', me, len(files))
         return len(files)
 
+    def _commit(self, batch):
+        me = self.__class__.__name__
+        # Other work we want to do each time through the loop.
+        dlog.debug('[%s] doing periodic', me)
+        self._do_periodic()
+        dlog.debug('[%s] committing transaction', me)
+        config.db.commit()
+        for filebase in batch:
+            dlog.debug('[%s] finishing filebase: %s', me, filebase)
+            self.switchboard.finish(filebase)
+
     def _process_one_file(self, msg, msgdata):
         """See `IRunner`."""
         # Do some common sanity checking on the message metadata.  It's got to
@@ -249,6 +292,7 @@ class Runner:
                 '%s runner "%s" shunting message for missing list: %s',
                 msg['message-id'], self.name, identifier)
             config.switchboards['shunt'].enqueue(msg, msgdata)
+            config.stats.count('shunted', self.switchboard.name)
             return
         # Now process this message.  We also want to set up the language
         # context for this message.  The context will be the preferred
@@ -299,7 +343,11 @@ class Runner:
         """See `IRunner`."""
         if filecnt or self.sleep_float <= 0:
             return
-        time.sleep(self.sleep_float)
+        if self.wakeup and self.switchboard is not None:
+            # Sleep, but wake up as soon as a new entry is enqueued.
+            self.switchboard.wait(self.sleep_float)
+        else:
+            time.sleep(self.sleep_float)
 
     def _short_circuit(self):
         """See `IRunner`."""
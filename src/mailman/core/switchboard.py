@@ -22,17 +22,48 @@ subclass).  Metadata is represented as a Python dictionary.  For every
 message/metadata pair in a queue, a single file containing two pickles is
 written.  First, the message is written to the pickle, then the metadata
 dictionary is written.
+
+Switchboards can alternatively write queue files in the `raw` format.  These
+start with a magic string and a small metadata blob, which is JSON unless the
+metadata contains something JSON can't represent, followed by the flattened
+bytes of the message.  On dequeue, the message is parsed lazily, so a runner
+which never looks at the message body never parses it, and a message which
+passes through a runner unchanged is written back out without being
+flattened again.  Pickle queue files are always readable, whatever format
+the switchboard writes.
+
+Every enqueued file base name is also appended to a small journal file in the
+queue directory.  Runners which use an indexed switchboard keep an in-memory
+FIFO index of their slice of the queue, and only need to read the tail of the
+journal to pick up new entries, instead of listing and sorting the entire
+queue directory on every pass.  The index is rebuilt from a full directory
+scan on startup, whenever it runs empty, when the journal is rotated, and
+periodically as a safety net.
+
+Runners waiting for new entries listen on a named pipe in the queue directory,
+one per slice, and every enqueue writes a byte to the pipes of the queue's
+slices.  This wakes idle runners up right away instead of at the end of their
+sleep interval.  Like the journal, this is only a hint; runners still poll
+their slice of the queue once every sleep interval.
 """
 
 import os
+import json
 import time
 import email
+import errno
+import base64
+import bisect
 import pickle
+import select
+import struct
 import hashlib
 import logging
 
+from datetime import datetime, timedelta
+from lazr.config import as_boolean
 from mailman.config import config
-from mailman.email.message import Message
+from mailman.email.message import LazyMessage, Message
 from mailman.interfaces.configuration import ConfigurationUpdatedEvent
 from mailman.interfaces.switchboard import ISwitchboard
 from mailman.utilities.filesystem import makedirs
@@ -51,17 +82,145 @@ DELTA = .0001
 # In order to prevent loops and a message flood, when the count reaches this
 # value, we move the file to the bad queue as a .psv.
 MAX_BAK_COUNT = 3
+# The name of the enqueue journal file in each queue directory.  Since it has
+# no extension, it is ignored by .get_files().
+JOURNAL_FILE = '.journal'
+# The named pipe a runner listens on for new entries in its slice.
+WAKEUP_FILE = '.wakeup.{}'
+# When the journal grows beyond this many bytes, the enqueuing process unlinks
+# it and the next enqueue starts a fresh one.  Readers notice the new inode
+# and rebuild their index from the directory.
+JOURNAL_MAX_SIZE = 1024 * 1024
+# Indexes are rebuilt from a full directory scan at least this often (in
+# seconds), so that entries which never made it into the journal are
+# eventually found.
+INDEX_RESCAN_INTERVAL = 300
+# Queue files in the raw format start with this magic string.  No pickle can
+# start with a NUL byte, so the two formats can't be confused.
+RAW_MAGIC = b'\x00MQ1'
+# After the magic string comes the encoding of the metadata blob (JSON or
+# pickle) and its length.
+RAW_HEADER = struct.Struct('>cI')
+# Attributes of a message object which the flattened message bytes capture.
+# All other instance attributes which differ from their defaults are carried
+# along in the metadata blob.
+MESSAGE_DEFAULTS = Message().__dict__
+MESSAGE_CONTENT = frozenset((
+    '_headers', '_payload', 'preamble', 'epilogue', 'defects',
+    '_raw', '_raw_headers', '_raw_unixfrom',
+    ))
 
 elog = logging.getLogger('mailman.error')
 
 
+# Tags for the types which JSON can't represent natively, and which are
+# commonly found in message metadata.
+JSON_TAGS = {
+    tuple: '__tuple__',
+    set: '__set__',
+    bytes: '__bytes__',
+    datetime: '__datetime__',
+    timedelta: '__timedelta__',
+    }
+
+
+def _tag(obj):
+    # Convert the metadata into something which survives a round trip through
+    # JSON.  Raise TypeError for anything else, in which case the metadata is
+    # pickled instead.
+    kind = type(obj)
+    if obj is None or kind in (bool, int, float, str):
+        return obj
+    if kind is list:
+        return [_tag(item) for item in obj]
+    if kind is dict:
+        if not all(type(key) is str for key in obj):
+            raise TypeError('Non-string metadata key')
+        if len(obj) == 1 and next(iter(obj)) in JSON_TAGS.values():
+            raise TypeError('Ambiguous metadata dictionary')
+        return {key: _tag(value) for key, value in obj.items()}
+    tag = JSON_TAGS.get(kind)
+    if tag is None:
+        raise TypeError('Unsupported metadata type: {}'.format(kind))
+    if kind is datetime and obj.tzinfo is not None:
+        raise TypeError('Aware datetime metadata')
+    if kind in (tuple, set):
+        value = [_tag(item) for item in obj]
+    elif kind is bytes:
+        value = base64.b64encode(obj).decode('ascii')
+    elif kind is datetime:
+        value = [obj.year, obj.month, obj.day, obj.hour, obj.minute,
+                 obj.second, obj.microsecond]
+    else:
+        value = [obj.days, obj.seconds, obj.microseconds]
+    return {tag: value}
+
+
+def _untag(obj):
+    # The json.loads() object hook reversing _tag().
+    if len(obj) == 1:
+        tag, value = next(iter(obj.items()))
+        if tag == '__tuple__':
+            return tuple(value)
+        elif tag == '__set__':
+            return set(value)
+        elif tag == '__bytes__':
+            return base64.b64decode(value)
+        elif tag == '__datetime__':
+            return datetime(*value)
+        elif tag == '__timedelta__':
+            return timedelta(*value)
+    return obj
+
+
+def _dump_raw(fp, metadata, raw):
+    # Write a raw format queue entry to the open file.
+    try:
+        blob = json.dumps(_tag(metadata), separators=(',', ':'))
+    except (TypeError, ValueError):
+        encoding = b'p'
+        blob = pickle.dumps(metadata, pickle.HIGHEST_PROTOCOL)
+    else:
+        encoding = b'j'
+        blob = blob.encode('utf-8')
+    fp.write(RAW_MAGIC)
+    fp.write(RAW_HEADER.pack(encoding, len(blob)))
+    fp.write(blob)
+    fp.write(raw)
+
+
+def _load_raw_metadata(fp):
+    # Read the metadata blob of a raw format queue entry, positioned just
+    # after the magic string.
+    encoding, size = RAW_HEADER.unpack(fp.read(RAW_HEADER.size))
+    blob = fp.read(size)
+    if encoding == b'j':
+        return json.loads(blob.decode('utf-8'), object_hook=_untag)
+    elif encoding == b'p':
+        return pickle.loads(blob)
+    raise ValueError('Bad queue file metadata encoding: {!r}'.format(
+        encoding))
+
+
+def _message_attributes(msg):
+    # Return the instance attributes of the message which aren't captured by
+    # its flattened bytes, e.g. the envelope sender or `original_size`.
+    return {
+        key: value
+        for key, value in msg.__dict__.items()
+        if key not in MESSAGE_CONTENT and not (
+            key in MESSAGE_DEFAULTS and MESSAGE_DEFAULTS[key] == value)
+        }
+
+
 @public
 @implementer(ISwitchboard)
 class Switchboard:
     """See `ISwitchboard`."""
 
     def __init__(self, name, queue_directory,
-                 slice=None, numslices=1, recover=False):
+                 slice=None, numslices=1, recover=False, indexed=False,
+                 queue_format='pickle'):
         """Create a switchboard object.
 
         :param name: The queue name.
@@ -76,11 +235,24 @@ class Switchboard:
         :type numslices: int
         :param recover: True if backup files should be recovered.
         :type recover: bool
+        :param indexed: True if the `files` attribute should be served from
+            an incrementally maintained index of the queue rather than from a
+            full directory scan.  Only the process consuming this slice of
+            the queue should use an indexed switchboard.
+        :type indexed: bool
+        :param queue_format: The format of the queue files written by this
+            switchboard, either `pickle` or `raw`.  Files in either format
+            can always be read.
+        :type queue_format: str
         """
         assert (numslices & (numslices - 1)) == 0, (
             'Not a power of 2: {}'.format(numslices))
+        assert queue_format in ('pickle', 'raw'), (
+            'Bad queue format: {}'.format(queue_format))
         self.name = name
         self.queue_directory = queue_directory
+        self.queue_format = queue_format
+        self.journal_file = os.path.join(queue_directory, JOURNAL_FILE)
         # If configured to, create the directory if it doesn't yet exist.
         if config.create_paths:
             makedirs(self.queue_directory, 0o770)
@@ -91,9 +263,33 @@ class Switchboard:
         if numslices != 1:
             self._lower = ((shamax + 1) * slice) / numslices
             self._upper = (((shamax + 1) * (slice + 1)) / numslices) - 1
+        self._index = (QueueIndex(self) if indexed else None)
+        # The named pipe of this slice, which is only opened by wait(), and
+        # the named pipes of all the slices of the queue which are woken up
+        # when an entry is enqueued.
+        self.wakeup_file = os.path.join(
+            queue_directory, WAKEUP_FILE.format(slice or 0))
+        self._wakeup_fd = None
+        section = getattr(config, 'runner.' + name, None)
+        if section is not None and as_boolean(section.wakeup):
+            self._wakeup_files = [
+                os.path.join(queue_directory, WAKEUP_FILE.format(n))
+                for n in range(int(section.instances))
+                ]
+        else:
+            self._wakeup_files = []
         if recover:
             self.recover_backup_files()
 
+    def in_slice(self, filebase):
+        """Is the given file base in this switchboard's slice?"""
+        if self._lower is None:
+            return True
+        when, digest = filebase.split('+', 1)
+        # BAW: test performance and end-cases of this algorithm.  MAS: both
+        # comparisons need to be <= to get complete range.
+        return self._lower <= int(digest, 16) <= self._upper
+
     def enqueue(self, _msg, _metadata=None, **_kws):
         """See `ISwitchboard`."""
         if _metadata is None:
@@ -106,9 +302,20 @@ class Switchboard:
         list_id = data.get('listid', '--nolist--')
         # Get some data for the input to the sha hash.
         now = repr(time.time())
+        raw = None
         if data.get('_plaintext'):
             protocol = 0
             msgsave = pickle.dumps(str(_msg), protocol)
+        elif (self.queue_format == 'raw' and
+                type(_msg) in (Message, LazyMessage)):
+            # Messages which are passed through unchanged don't need to be
+            # flattened again.  Other message classes are always pickled,
+            # since the class itself would otherwise be lost.
+            if type(_msg) is LazyMessage:
+                raw = _msg.pristine_bytes()
+            if raw is None:
+                raw = _msg.as_bytes()
+            msgsave = raw
         else:
             protocol = pickle.HIGHEST_PROTOCOL
             msgsave = pickle.dumps(_msg, protocol)
@@ -129,18 +336,105 @@ class Switchboard:
         for k in list(data):
             if k.startswith('_'):
                 del data[k]
-        # We have to tell the dequeue() method whether to parse the message
-        # object or not.
-        data['_parsemsg'] = (protocol == 0)
-        # Write to the pickle file the message object and metadata.
         with open(tmpfile, 'wb') as fp:
-            fp.write(msgsave)
-            pickle.dump(data, fp, protocol)
+            if raw is None:
+                # We have to tell the dequeue() method whether to parse the
+                # message object or not.
+                data['_parsemsg'] = (protocol == 0)
+                # Write to the pickle file the message object and metadata.
+                fp.write(msgsave)
+                pickle.dump(data, fp, protocol)
+            else:
+                metadata = dict(msgdata=data,
+                                msgattrs=_message_attributes(_msg))
+                _dump_raw(fp, metadata, raw)
             fp.flush()
             os.fsync(fp.fileno())
         os.rename(tmpfile, filename)
+        self._journal(filebase)
+        self._wake_up()
+        config.stats.count('enqueued', self.name)
         return filebase
 
+    def _journal(self, filebase):
+        # Record the new entry in the queue's journal.  The journal is only a
+        # hint for indexed switchboards, which always fall back to scanning
+        # the directory, so failures here are logged but otherwise ignored.
+        # A single small O_APPEND write is atomic with respect to other
+        # processes appending to the same file.
+        try:
+            fd = os.open(self.journal_file,
+                         os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o660)
+            try:
+                os.write(fd, (filebase + '\n').encode('ascii'))
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if size > JOURNAL_MAX_SIZE:
+                os.unlink(self.journal_file)
+        except EnvironmentError:
+            elog.exception('Failed to journal queue entry: %s', filebase)
+
+    def _wake_up(self):
+        # Tell the runners listening on this queue about the new entry.  A
+        # missing pipe means no runner has listened yet, a pipe without a
+        # reader means its runner is gone, and a full pipe means its runner
+        # hasn't woken up yet; none of these are errors.
+        for path in self._wakeup_files:
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as error:
+                if error.errno not in (errno.ENOENT, errno.ENXIO):
+                    elog.exception('Failed to open wakeup pipe: %s', path)
+                continue
+            try:
+                os.write(fd, b'\0')
+            except BlockingIOError:
+                pass
+            except OSError:
+                elog.exception('Failed to write wakeup pipe: %s', path)
+            finally:
+                os.close(fd)
+
+    def wait(self, timeout):
+        """See `ISwitchboard`."""
+        if self._wakeup_fd is None:
+            try:
+                try:
+                    os.mkfifo(self.wakeup_file, 0o660)
+                except FileExistsError:
+                    pass
+                # Opening the pipe for writing too means select() never sees
+                # an end of file when the last writer closes it.
+                self._wakeup_fd = os.open(
+                    self.wakeup_file, os.O_RDWR | os.O_NONBLOCK)
+            except OSError:
+                elog.exception('Cannot listen on wakeup pipe: %s',
+                               self.wakeup_file)
+                # Fall back to polling.
+                self._wakeup_fd = -1
+        if self._wakeup_fd < 0:
+            time.sleep(timeout)
+            return False
+        readable, writable, exceptional = select.select(
+            [self._wakeup_fd], [], [], timeout)
+        if len(readable) == 0:
+            return False
+        # Drain all pending notifications; one pass over the queue picks up
+        # all their entries.
+        try:
+            while os.read(self._wakeup_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        """See `ISwitchboard`."""
+        if self._wakeup_fd is not None and self._wakeup_fd >= 0:
+            os.close(self._wakeup_fd)
+        self._wakeup_fd = None
+
     def dequeue(self, filebase):
         """See `ISwitchboard`."""
         # Calculate the filename from the given filebase.
@@ -152,6 +446,20 @@ class Switchboard:
             # process crashes uncleanly the .bak file will be used to
             # re-instate the .pck file in order to try again.
             os.rename(filename, backfile)
+            if self._index is not None:
+                self._index.discard(filebase)
+            stats = config.stats
+            if stats.enabled:
+                # The file name starts with the time it was enqueued.
+                when, digest = filebase.split('+', 1)
+                stats.record('queue-wait', self.name, None,
+                             max(time.time() - float(when), 0.0))
+            if fp.read(len(RAW_MAGIC)) == RAW_MAGIC:
+                metadata = _load_raw_metadata(fp)
+                msg = LazyMessage(fp.read())
+                msg.__dict__.update(metadata['msgattrs'])
+                return msg, metadata['msgdata']
+            fp.seek(0)
             msg = pickle.load(fp)
             data = pickle.load(fp)
         if data.get('_parsemsg'):
@@ -184,28 +492,29 @@ class Switchboard:
         except EnvironmentError:
             elog.exception(
                 'Failed to unlink/preserve backup file: %s', bakfile)
+        else:
+            config.stats.count(
+                'preserved' if preserve else 'finished', self.name)
 
     @property
     def files(self):
         """See `ISwitchboard`."""
+        if self._index is not None:
+            return self._index.files()
         return self.get_files()
 
     def get_files(self, extension='.pck'):
         """See `ISwitchboard`."""
         times = {}
-        lower = self._lower
-        upper = self._upper
         for f in os.listdir(self.queue_directory):
             # By ignoring anything that doesn't end in .pck, we ignore
             # tempfiles and avoid a race condition.
             filebase, ext = os.path.splitext(f)
             if ext != extension:
                 continue
-            when, digest = filebase.split('+', 1)
-            # Throw out any files which don't match our bitrange.  BAW: test
-            # performance and end-cases of this algorithm.  MAS: both
-            # comparisons need to be <= to get complete range.
-            if lower is None or (lower <= int(digest, 16) <= upper):
+            # Throw out any files which don't match our bitrange.
+            if self.in_slice(filebase):
+                when, digest = filebase.split('+', 1)
                 key = float(when)
                 while key in times:
                     key += DELTA
@@ -226,10 +535,16 @@ class Switchboard:
             dst = os.path.join(self.queue_directory, filebase + '.pck')
             with open(src, 'rb+') as fp:
                 try:
-                    # Throw away the message object.
-                    pickle.load(fp)
-                    data_pos = fp.tell()
-                    data = pickle.load(fp)
+                    if fp.read(len(RAW_MAGIC)) == RAW_MAGIC:
+                        metadata = _load_raw_metadata(fp)
+                        data = metadata['msgdata']
+                    else:
+                        metadata = None
+                        fp.seek(0)
+                        # Throw away the message object.
+                        pickle.load(fp)
+                        data_pos = fp.tell()
+                        data = pickle.load(fp)
                 except Exception as error:
                     # If unpickling throws any exception, just log and
                     # preserve this entry
@@ -238,12 +553,19 @@ class Switchboard:
                     self.finish(filebase, preserve=True)
                 else:
                     data['_bak_count'] = data.get('_bak_count', 0) + 1
-                    fp.seek(data_pos)
-                    if data.get('_parsemsg'):
-                        protocol = 0
+                    if metadata is not None:
+                        # The message bytes follow the metadata, so the whole
+                        # entry has to be rewritten.
+                        raw = fp.read()
+                        fp.seek(0)
+                        _dump_raw(fp, metadata, raw)
                     else:
-                        protocol = 1
-                    pickle.dump(data, fp, protocol)
+                        fp.seek(data_pos)
+                        if data.get('_parsemsg'):
+                            protocol = 0
+                        else:
+                            protocol = 1
+                        pickle.dump(data, fp, protocol)
                     fp.truncate()
                     fp.flush()
                     os.fsync(fp.fileno())
@@ -253,6 +575,109 @@ class Switchboard:
                         self.finish(filebase, preserve=True)
                     else:
                         os.rename(src, dst)
+        # Recovered files don't show up in the journal, so force the index to
+        # rescan the directory.
+        if self._index is not None:
+            self._index.invalidate()
+
+
+@public
+class QueueIndex:
+    """An incrementally maintained FIFO index of a switchboard's slice.
+
+    The index is a sorted list of (received time, file base) entries for the
+    .pck files in the switchboard's slice.  Entries are removed when they are
+    dequeued through the switchboard, and new entries are picked up by reading
+    the tail of the queue's journal.
+    """
+
+    def __init__(self, switchboard):
+        self._switchboard = switchboard
+        self._entries = []
+        self._filebases = set()
+        self._inode = None
+        self._offset = 0
+        self._partial = b''
+        self._scanned_at = None
+
+    def invalidate(self):
+        """Force a full directory scan the next time the index is used."""
+        self._scanned_at = None
+
+    def discard(self, filebase):
+        """Remove the file base from the index, if it is present."""
+        self._filebases.discard(filebase)
+
+    def files(self):
+        """Return the file bases in the index in FIFO order."""
+        self._refresh()
+        # Drop the entries that have been discarded since the last call.
+        if len(self._entries) != len(self._filebases):
+            self._entries = [
+                entry for entry in self._entries
+                if entry[1] in self._filebases
+                ]
+        return [filebase for when, filebase in self._entries]
+
+    def _journal_stat(self):
+        try:
+            stat = os.stat(self._switchboard.journal_file)
+        except FileNotFoundError:
+            return None, 0
+        return stat.st_ino, stat.st_size
+
+    def _refresh(self):
+        inode, size = self._journal_stat()
+        if (self._scanned_at is None
+                or len(self._filebases) == 0
+                or inode != self._inode
+                or size < self._offset
+                or time.time() - self._scanned_at > INDEX_RESCAN_INTERVAL):
+            self._scan(inode, size)
+        elif size > self._offset:
+            self._read_journal(size)
+
+    def _scan(self, inode, size):
+        # Remember the journal position before listing the directory.  Any
+        # entries journaled after this point may also show up in the listing,
+        # but duplicates are ignored when the journal is read.
+        self._inode = inode
+        self._offset = size
+        self._partial = b''
+        self._scanned_at = time.time()
+        filebases = self._switchboard.get_files()
+        self._entries = [
+            (float(filebase.split('+', 1)[0]), filebase)
+            for filebase in filebases
+            ]
+        self._filebases = set(filebases)
+
+    def _read_journal(self, size):
+        try:
+            with open(self._switchboard.journal_file, 'rb') as fp:
+                fp.seek(self._offset)
+                data = self._partial + fp.read(size - self._offset)
+        except FileNotFoundError:
+            # The journal was rotated out from under us.
+            self.invalidate()
+            return
+        self._offset = size
+        # A concurrent writer may not have finished its line yet.
+        lines = data.split(b'\n')
+        self._partial = lines.pop()
+        queue_directory = self._switchboard.queue_directory
+        for line in lines:
+            filebase = line.decode('ascii')
+            if (filebase in self._filebases
+                    or not self._switchboard.in_slice(filebase)):
+                continue
+            # Skip entries that have already been dequeued.
+            pckfile = os.path.join(queue_directory, filebase + '.pck')
+            if not os.path.exists(pckfile):
+                continue
+            entry = (float(filebase.split('+', 1)[0]), filebase)
+            bisect.insort(self._entries, entry)
+            self._filebases.add(filebase)
 
 
 @public
@@ -271,4 +696,5 @@ def handle_ConfigurationUpdatedEvent(event):
             substitutions = config.paths
             substitutions['name'] = name
             path = expand(conf.path, None, substitutions)
-            config.switchboards[name] = Switchboard(name, path)
+            config.switchboards[name] = Switchboard(
+                name, path, queue_format=conf.queue_format)
@@ -0,0 +1,356 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test the processing statistics."""
+
+import os
+import sys
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+from mailman.app.lifecycle import create_list
+from mailman.config import config
+from mailman.core.chains import process as process_chain
+from mailman.core.metrics import Metrics, quantile
+from mailman.core.pipelines import process as process_pipeline
+from mailman.interfaces.handler import IHandler
+from mailman.interfaces.pipeline import DiscardMessage, IPipeline
+from mailman.interfaces.usermanager import IUserManager
+from mailman.testing.helpers import (
+    configuration,
+    specialized_message_from_string as mfs,
+)
+from mailman.testing.layers import ConfigLayer
+from operator import delitem
+from subprocess import PIPE, run
+from tempfile import TemporaryDirectory
+from zope.component import getUtility
+from zope.interface import implementer
+
+
+@implementer(IHandler)
+class DiscardingHandler:
+    name = 'discarding'
+
+    def process(self, mlist, msg, msgdata):
+        raise DiscardMessage('by test handler')
+
+
+@implementer(IHandler)
+class BrokenHandler:
+    name = 'broken'
+
+    def process(self, mlist, msg, msgdata):
+        raise RuntimeError('by test handler')
+
+
+@implementer(IPipeline)
+class TestingPipeline:
+    name = 'test-metrics'
+    description = 'Metrics test pipeline'
+
+    def __init__(self, handler):
+        self._handler = handler
+
+    def __iter__(self):
+        yield self._handler
+
+
+class TestMetrics(unittest.TestCase):
+    """Test the statistics registry itself."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        tempdir = TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self._directory = tempdir.name
+
+    def _metrics(self, **kws):
+        return Metrics(self._directory, (0.01, 0.1), **kws)
+
+    def test_record(self):
+        metrics = self._metrics()
+        metrics.record('handler', 'one', 'ant.example.com', 0.005)
+        metrics.record('handler', 'one', 'ant.example.com', 0.05)
+        metrics.record('handler', 'one', 'ant.example.com', 0.5, error=True)
+        [stats] = metrics.collect()
+        self.assertEqual(stats['kind'], 'handler')
+        self.assertEqual(stats['name'], 'one')
+        self.assertEqual(stats['list_id'], 'ant.example.com')
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(stats['errors'], 1)
+        self.assertAlmostEqual(stats['seconds'], 0.555)
+        self.assertEqual(stats['max_seconds'], 0.5)
+        self.assertEqual(stats['buckets'],
+                         {0.01: 1, 0.1: 1, float('inf'): 1})
+
+    def test_bucket_bounds_are_inclusive(self):
+        metrics = self._metrics()
+        metrics.record('rule', 'one', None, 0.01)
+        [stats] = metrics.collect()
+        self.assertEqual(stats['buckets'][0.01], 1)
+
+    def test_merge_processes(self):
+        # Each process saves its own snapshot; collecting merges them all.
+        first = self._metrics()
+        second = self._metrics()
+        # Pretend the second registry lives in another process.
+        second._started += 1
+        first.record('rule', 'one', 'ant.example.com', 0.05)
+        second.record('rule', 'one', 'ant.example.com', 0.2)
+        second.record('rule', 'two', 'ant.example.com', 0.2)
+        second.save()
+        entries = first.collect()
+        self.assertEqual(
+            [(stats['name'], stats['count']) for stats in entries],
+            [('one', 2), ('two', 1)])
+        self.assertEqual(entries[0]['max_seconds'], 0.2)
+        self.assertEqual(entries[0]['buckets'],
+                         {0.01: 0, 0.1: 1, float('inf'): 1})
+
+    def test_mismatched_buckets(self):
+        # Histograms saved with a different bucket configuration are not
+        # merged, but their calls are still counted.
+        first = self._metrics()
+        second = Metrics(self._directory, (0.5,))
+        second._started += 1
+        second.record('rule', 'one', None, 0.2)
+        second.save()
+        [stats] = first.collect()
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(sum(stats['buckets'].values()), 0)
+
+    def test_periodic_save(self):
+        metrics = self._metrics(interval=0)
+        metrics.record('rule', 'one', None, 0.2)
+        self.assertTrue(os.path.exists(metrics.filename))
+
+    def test_save_interval(self):
+        metrics = self._metrics(interval=3600)
+        metrics.record('rule', 'one', None, 0.2)
+        self.assertFalse(os.path.exists(metrics.filename))
+
+    def test_corrupt_snapshot(self):
+        with open(os.path.join(self._directory, 'bogus.json'), 'w') as fp:
+            fp.write('{')
+        metrics = self._metrics()
+        metrics.record('rule', 'one', None, 0.2)
+        [stats] = metrics.collect()
+        self.assertEqual(stats['count'], 1)
+
+    def test_reset(self):
+        metrics = self._metrics()
+        metrics.record('rule', 'one', None, 0.2)
+        metrics.save()
+        metrics.reset()
+        self.assertEqual(os.listdir(self._directory), [])
+        self.assertEqual(metrics.collect(), [])
+
+    def _exit(self, metrics):
+        # Save the registry's snapshot, and pretend the process which saved
+        # it has exited, by renaming it after the pid of one which has.
+        metrics.save()
+        pid = run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                  check=True, stdout=PIPE).stdout.decode().strip()
+        filename = os.path.basename(metrics.filename).replace(
+            '.{}.'.format(os.getpid()), '.{}.'.format(pid), 1)
+        os.rename(metrics.filename, os.path.join(self._directory, filename))
+        return filename
+
+    def test_retire_exited_processes(self):
+        # The snapshots of processes which have exited are folded into the
+        # retired statistics, which are still merged.
+        first = self._metrics()
+        first.record('rule', 'one', None, 0.05)
+        first.count('finished', 'in')
+        self._exit(first)
+        second = self._metrics()
+        second._started += 1
+        second.record('rule', 'one', None, 0.2)
+        second.count('finished', 'in', 2)
+        self._exit(second)
+        metrics = self._metrics()
+        metrics._started += 2
+        metrics.record('rule', 'two', None, 0.002)
+        entries = metrics.collect()
+        self.assertEqual(sorted(os.listdir(self._directory)), sorted(
+            ['retired.json', os.path.basename(metrics.filename)]))
+        self.assertEqual(
+            [(stats['name'], stats['count']) for stats in entries],
+            [('one', 2), ('two', 1)])
+        self.assertEqual(entries[0]['max_seconds'], 0.2)
+        self.assertEqual(entries[0]['buckets'],
+                         {0.01: 0, 0.1: 1, float('inf'): 1})
+        self.assertEqual(metrics.counters(), {('finished', 'in'): 3})
+        # Later exits are added to the retired statistics.
+        self._exit(metrics)
+        [one, two] = self._metrics().collect()
+        self.assertEqual(one['count'], 2)
+        self.assertEqual(two['count'], 1)
+        self.assertEqual(os.listdir(self._directory), ['retired.json'])
+
+    def test_retire_interrupted(self):
+        # Snapshots which were folded into the retired statistics, but not
+        # removed, are not counted again.
+        first = self._metrics()
+        first.record('rule', 'one', None, 0.05)
+        filename = self._exit(first)
+        path = os.path.join(self._directory, filename)
+        with open(path) as fp:
+            snapshot = fp.read()
+        metrics = self._metrics()
+        metrics._started += 1
+        self.assertEqual(metrics.collect()[0]['count'], 1)
+        with open(path, 'w') as fp:
+            fp.write(snapshot)
+        self.assertEqual(metrics.collect()[0]['count'], 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_disabled_timer(self):
+        metrics = self._metrics(enabled=False)
+        with metrics.timer('rule', 'one', None):
+            pass
+        self.assertEqual(metrics.collect(), [])
+
+    def test_timer(self):
+        metrics = self._metrics()
+        with metrics.timer('rule', 'one', None):
+            pass
+        with self.assertRaises(RuntimeError):
+            with metrics.timer('rule', 'one', None):
+                raise RuntimeError
+        with self.assertRaises(KeyError):
+            with metrics.timer('rule', 'one', None, (KeyError,)):
+                raise KeyError
+        [stats] = metrics.collect()
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(stats['errors'], 1)
+
+    def test_counters(self):
+        first = self._metrics()
+        second = self._metrics()
+        second._started += 1
+        first.count('enqueued', 'in')
+        first.count('enqueued', 'in', 2)
+        second.count('enqueued', 'in')
+        second.count('finished', 'in')
+        second.save()
+        self.assertEqual(first.counters(), {
+            ('enqueued', 'in'): 4,
+            ('finished', 'in'): 1,
+            })
+        first.reset()
+        self.assertEqual(first.counters(), {})
+
+    def test_disabled_counters(self):
+        metrics = self._metrics(enabled=False)
+        metrics.count('enqueued', 'in')
+        self.assertEqual(metrics.counters(), {})
+
+    def test_threads(self):
+        # Counters and timings can be updated from several threads at once.
+        metrics = self._metrics(interval=0)
+
+        def work(i):
+            for j in range(100):
+                metrics.count('enqueued', 'in')
+                metrics.record('rule', 'one', None, 0.002)
+
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(work, range(8)))
+        metrics.save()
+        self.assertEqual(metrics.counters(), {('enqueued', 'in'): 800})
+        [stats] = metrics.collect()
+        self.assertEqual(stats['count'], 800)
+
+    def test_quantile(self):
+        metrics = self._metrics()
+        for seconds in (0.001, 0.002, 0.003, 0.05, 1):
+            metrics.record('rule', 'one', None, seconds)
+        [stats] = metrics.collect()
+        self.assertEqual(quantile(stats, 0.5), 0.01)
+        self.assertEqual(quantile(stats, 0.8), 0.1)
+        self.assertEqual(quantile(stats, 0.95), float('inf'))
+        stats['buckets'] = {}
+        self.assertIsNone(quantile(stats, 0.5))
+
+
+class TestProcessingMetrics(unittest.TestCase):
+    """Test the instrumentation of pipelines and chains."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._mlist = create_list('ant@example.com')
+        self._msg = mfs("""\
+From: anne@example.com
+To: ant@example.com
+Subject: a test
+Message-ID: <ant>
+
+testing
+""")
+        # Snapshots outlive the registry of any one configuration.
+        self.addCleanup(lambda: config.stats.reset())
+
+    def _process_pipeline(self, handler):
+        config.pipelines['test-metrics'] = TestingPipeline(handler)
+        self.addCleanup(delitem, config.pipelines, 'test-metrics')
+        process_pipeline(self._mlist, self._msg, {}, 'test-metrics')
+
+    def test_disabled_by_default(self):
+        self.assertFalse(config.stats.enabled)
+        self._process_pipeline(DiscardingHandler())
+        self.assertEqual(config.stats.collect(), [])
+
+    def test_expected_handler_exception(self):
+        # Discarding a message is a normal outcome, not an error.
+        with configuration('metrics', enabled='yes'):
+            self._process_pipeline(DiscardingHandler())
+            [stats] = config.stats.collect()
+        self.assertEqual(stats['kind'], 'handler')
+        self.assertEqual(stats['name'], 'discarding')
+        self.assertEqual(stats['list_id'], 'ant.example.com')
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['errors'], 0)
+
+    def test_handler_error(self):
+        with configuration('metrics', enabled='yes'):
+            with self.assertRaises(RuntimeError):
+                self._process_pipeline(BrokenHandler())
+            [stats] = config.stats.collect()
+        self.assertEqual(stats['name'], 'broken')
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['errors'], 1)
+
+    def test_chain(self):
+        getUtility(IUserManager).create_address('anne@example.com')
+        with configuration('metrics', enabled='yes'):
+            process_chain(self._mlist, self._msg, {}, 'default-posting-chain')
+            entries = config.stats.collect()
+        rules = {stats['name'] for stats in entries
+                 if stats['kind'] == 'rule'}
+        self.assertIn('approved', rules)
+        self.assertIn('nonmember-moderation', rules)
+        chains = {stats['name'] for stats in entries
+                  if stats['kind'] == 'chain'}
+        # The message ends up in exactly one terminal chain, whose action is
+        # timed too.
+        self.assertEqual(len(chains), 1)
+        self.assertEqual(
+            {stats['list_id'] for stats in entries}, {'ant.example.com'})
@@ -24,6 +24,7 @@ from mailman.config import config
 from mailman.core.runner import Runner
 from mailman.interfaces.member import DeliveryMode
 from mailman.interfaces.runner import RunnerCrashEvent
+from mailman.interfaces.usermanager import IUserManager
 from mailman.runners.virgin import VirginRunner
 from mailman.testing.helpers import (
     configuration,
@@ -36,6 +37,8 @@ from mailman.testing.helpers import (
     subscribe,
 )
 from mailman.testing.layers import ConfigLayer
+from unittest.mock import patch
+from zope.component import getUtility
 
 
 class CrashingRunner(Runner):
@@ -47,6 +50,13 @@ class NonQueueRunner(Runner):
     is_queue_runner = False
 
 
+class AddressingRunner(Runner):
+    def _dispose(self, mlist, msg, msgdata):
+        getUtility(IUserManager).create_address(msg['from'])
+        if msg['subject'] == 'crash':
+            raise RuntimeError('borked')
+
+
 class TestRunner(unittest.TestCase):
     """Test the Runner base class behavior."""
 
@@ -90,6 +100,48 @@ Message-ID: <ant>
         items = get_queue_messages('shunt', expected_count=1)
         self.assertEqual(items[0].msg['message-id'], '<ant>')
 
+    @configuration('metrics', enabled='yes')
+    def test_queue_metrics(self):
+        # Runners time their processing of every queue entry, and count the
+        # entries they shunt.
+        self.addCleanup(lambda: config.stats.reset())
+        runner = make_testable_runner(CrashingRunner, 'in')
+        msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+
+""")
+        config.switchboards['in'].enqueue(msg, listid='test.example.com')
+        config.switchboards['in'].enqueue(msg, listid='missing.example.com')
+        runner.run()
+        [processing] = [entry for entry in config.stats.collect()
+                        if entry['kind'] == 'runner']
+        self.assertEqual(processing['name'], 'in')
+        self.assertEqual(processing['count'], 2)
+        # Only the crash is an error; the message for the missing list is
+        # shunted on purpose.
+        self.assertEqual(processing['errors'], 1)
+        counters = config.stats.counters()
+        self.assertEqual(counters['shunted', 'in'], 2)
+        self.assertEqual(counters['enqueued', 'shunt'], 2)
+        self.assertEqual(counters['finished', 'in'], 2)
+
+    def test_snooze_waits_for_wakeup(self):
+        runner = make_testable_runner(CrashingRunner, 'in')
+        with patch.object(runner.switchboard, 'wait') as wait:
+            runner._snooze(0)
+        wait.assert_called_once_with(runner.sleep_float)
+
+    @configuration('runner.in', wakeup='no')
+    def test_snooze_without_wakeup(self):
+        runner = make_testable_runner(CrashingRunner, 'in')
+        with patch.object(runner.switchboard, 'wait') as wait, \
+                patch('mailman.core.runner.time.sleep') as sleep:
+            runner._snooze(0)
+        wait.assert_not_called()
+        sleep.assert_called_once_with(runner.sleep_float)
+
     def test_digest_messages(self):
         # In LP: #1130697, the digest runner creates MIME digests using the
         # stdlib MIMEMutlipart class, however this class does not have the
@@ -135,3 +187,55 @@ Message-ID: <ant>
         runner = make_testable_runner(NonQueueRunner)
         # This will throw AttributeError on failure.
         runner.run()
+
+    def _enqueue(self, sender, subject):
+        msg = mfs("""\
+From: {}
+To: test@example.com
+Subject: {}
+
+""".format(sender, subject))
+        config.switchboards['in'].enqueue(msg, listid='test.example.com')
+
+    @configuration('runner.in', batch_size=3)
+    def test_batch_mode(self):
+        # In batch mode, several messages are processed per transaction, and
+        # a failing message is shunted without losing the rest of its batch.
+        runner = make_testable_runner(AddressingRunner, 'in')
+        self._enqueue('anne@example.com', 'first')
+        self._enqueue('bart@example.com', 'crash')
+        self._enqueue('cris@example.com', 'third')
+        self._enqueue('dave@example.com', 'fourth')
+        config.db.commit()
+        with patch.object(config.db, 'commit',
+                          wraps=config.db.commit) as commit:
+            runner._one_iteration()
+        # One commit for the first batch of three, and one for the leftover.
+        self.assertEqual(commit.call_count, 2)
+        user_manager = getUtility(IUserManager)
+        self.assertIsNotNone(user_manager.get_address('anne@example.com'))
+        self.assertIsNone(user_manager.get_address('bart@example.com'))
+        self.assertIsNotNone(user_manager.get_address('cris@example.com'))
+        self.assertIsNotNone(user_manager.get_address('dave@example.com'))
+        items = get_queue_messages('shunt', expected_count=1)
+        self.assertEqual(items[0].msg['subject'], 'crash')
+        get_queue_messages('in', expected_count=0)
+        # All the backup files have been cleaned up.
+        self.assertEqual(runner.switchboard.get_files('.bak'), [])
+
+    def test_no_batch_mode(self):
+        # By default, every message gets its own transaction.
+        runner = make_testable_runner(AddressingRunner, 'in')
+        self._enqueue('anne@example.com', 'first')
+        self._enqueue('bart@example.com', 'crash')
+        self._enqueue('cris@example.com', 'third')
+        config.db.commit()
+        with patch.object(config.db, 'commit',
+                          wraps=config.db.commit) as commit:
+            runner._one_iteration()
+        self.assertEqual(commit.call_count, 3)
+        user_manager = getUtility(IUserManager)
+        self.assertIsNotNone(user_manager.get_address('anne@example.com'))
+        self.assertIsNone(user_manager.get_address('bart@example.com'))
+        self.assertIsNotNone(user_manager.get_address('cris@example.com'))
+        get_queue_messages('shunt', expected_count=1)
@@ -20,8 +20,12 @@
 import os
 import unittest
 
+from datetime import datetime, timedelta
 from mailman.config import config
+from mailman.core.switchboard import RAW_MAGIC, Switchboard
+from mailman.email.message import LazyMessage, UserNotification
 from mailman.testing.helpers import (
+    configuration,
     LogFileMark,
     specialized_message_from_string as mfs,
 )
@@ -54,6 +58,49 @@ Message-ID: <ant>
         self.assertEqual(traceback[1], 'Traceback (most recent call last):')
         self.assertEqual(traceback[-1], 'OSError: Oops!')
 
+    def test_queue_metrics(self):
+        # Switchboards count their entries, and time how long they waited.
+        self.addCleanup(lambda: config.stats.reset())
+        msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+
+""")
+        switchboard = config.switchboards['shunt']
+        with configuration('metrics', enabled='yes'):
+            filebase = switchboard.enqueue(msg)
+            switchboard.dequeue(filebase)
+            switchboard.finish(filebase)
+            filebase = switchboard.enqueue(msg)
+            switchboard.dequeue(filebase)
+            switchboard.finish(filebase, preserve=True)
+            [wait] = config.stats.collect()
+            counters = config.stats.counters()
+        self.assertEqual(counters, {
+            ('enqueued', 'shunt'): 2,
+            ('finished', 'shunt'): 1,
+            ('preserved', 'shunt'): 1,
+            })
+        self.assertEqual(wait['kind'], 'queue-wait')
+        self.assertEqual(wait['name'], 'shunt')
+        self.assertEqual(wait['count'], 2)
+
+    def test_no_queue_metrics_when_disabled(self):
+        self.addCleanup(lambda: config.stats.reset())
+        msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+
+""")
+        switchboard = config.switchboards['shunt']
+        filebase = switchboard.enqueue(msg)
+        switchboard.dequeue(filebase)
+        switchboard.finish(filebase)
+        self.assertEqual(config.stats.collect(), [])
+        self.assertEqual(config.stats.counters(), {})
+
     def test_no_bak_but_pck(self):
         # if there is no .bak file but a .pck with the same filebase,
         # .finish() should handle the .pck.
@@ -72,3 +119,280 @@ Message-ID: <ant>
         bad_dir = config.switchboards['bad'].queue_directory
         psvfile = os.path.join(bad_dir, filebase + '.psv')
         self.assertTrue(os.path.isfile(psvfile))
+
+
+class TestIndexedSwitchboard(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+
+""")
+        # The global switchboard enqueues, the indexed one consumes, just
+        # like a runner would.
+        self._inq = config.switchboards['in']
+        self._switchboard = Switchboard(
+            'in', self._inq.queue_directory, indexed=True)
+
+    def test_index_matches_directory(self):
+        filebases = [self._inq.enqueue(self._msg) for i in range(5)]
+        self.assertEqual(self._switchboard.files, filebases)
+        self.assertEqual(self._switchboard.files, self._inq.files)
+
+    def test_new_entries_come_from_journal(self):
+        first = self._inq.enqueue(self._msg)
+        self.assertEqual(self._switchboard.files, [first])
+        # Now that the index isn't empty, new entries are picked up from the
+        # journal rather than by listing the directory.
+        second = self._inq.enqueue(self._msg)
+        with patch('mailman.core.switchboard.os.listdir',
+                   side_effect=AssertionError('listdir called')):
+            self.assertEqual(self._switchboard.files, [first, second])
+
+    def test_dequeued_entries_are_removed(self):
+        first = self._inq.enqueue(self._msg)
+        second = self._inq.enqueue(self._msg)
+        self.assertEqual(self._switchboard.files, [first, second])
+        self._switchboard.dequeue(first)
+        self._switchboard.finish(first)
+        self.assertEqual(self._switchboard.files, [second])
+
+    def test_journaled_entry_already_gone(self):
+        first = self._inq.enqueue(self._msg)
+        self.assertEqual(self._switchboard.files, [first])
+        # Some other process consumes the new entry before the index sees it.
+        second = self._inq.enqueue(self._msg)
+        self._inq.dequeue(second)
+        self._inq.finish(second)
+        self.assertEqual(self._switchboard.files, [first])
+
+    def test_journal_rotation(self):
+        first = self._inq.enqueue(self._msg)
+        self.assertEqual(self._switchboard.files, [first])
+        with patch('mailman.core.switchboard.JOURNAL_MAX_SIZE', 0):
+            second = self._inq.enqueue(self._msg)
+        # The journal has been unlinked, so its entries are lost, but the
+        # index notices and rescans the directory.
+        self.assertFalse(os.path.exists(self._inq.journal_file))
+        self.assertEqual(self._switchboard.files, [first, second])
+
+    def test_recovered_backup_files(self):
+        first = self._inq.enqueue(self._msg)
+        self.assertEqual(self._switchboard.files, [first])
+        second = self._inq.enqueue(self._msg)
+        # Simulate a crash while processing the second entry.
+        self._inq.dequeue(second)
+        self._switchboard.recover_backup_files()
+        self.assertEqual(self._switchboard.files, [first, second])
+
+
+class TestRawSwitchboard(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+MIME-Version: 1.0
+Content-Type: multipart/mixed; boundary="BOUNDARY"
+
+--BOUNDARY
+Content-Type: text/plain
+
+Hello.
+--BOUNDARY
+Content-Type: text/plain
+
+Goodbye.
+--BOUNDARY--
+""")
+        self._pickleq = config.switchboards['in']
+        self._switchboard = Switchboard(
+            'in', self._pickleq.queue_directory, queue_format='raw')
+
+    def _raw_file(self, filebase):
+        path = os.path.join(self._switchboard.queue_directory,
+                            filebase + '.pck')
+        with open(path, 'rb') as fp:
+            return fp.read()
+
+    def test_raw_file_format(self):
+        filebase = self._switchboard.enqueue(
+            self._msg, listid='test.example.com')
+        contents = self._raw_file(filebase)
+        self.assertTrue(contents.startswith(RAW_MAGIC))
+        self.assertTrue(contents.endswith(self._msg.as_bytes()))
+        # The metadata is JSON.
+        self.assertIn(b'"listid":"test.example.com"', contents)
+
+    def test_round_trip(self):
+        self._msg.original_size = 1234
+        self._msg.set_unixfrom('From anne@example.com')
+        deliver_until = datetime(2022, 1, 2, 3, 4, 5, 6)
+        filebase = self._switchboard.enqueue(
+            self._msg, listid='test.example.com',
+            recipients={'bart@example.com', 'cris@example.com'},
+            deliver_until=deliver_until,
+            pair=('a', 1), delta=timedelta(minutes=5),
+            blob=b'\x00\xff', _volatile=True)
+        msg, data = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertIsInstance(msg, LazyMessage)
+        self.assertEqual(msg.original_size, 1234)
+        self.assertEqual(msg.get_unixfrom(), 'From anne@example.com')
+        self.assertEqual(msg.as_bytes(), self._msg.as_bytes())
+        self.assertEqual(data['listid'], 'test.example.com')
+        self.assertEqual(data['recipients'],
+                         {'bart@example.com', 'cris@example.com'})
+        self.assertEqual(data['deliver_until'], deliver_until)
+        self.assertEqual(data['pair'], ('a', 1))
+        self.assertEqual(data['delta'], timedelta(minutes=5))
+        self.assertEqual(data['blob'], b'\x00\xff')
+        self.assertNotIn('_volatile', data)
+        self.assertEqual(data['version'], config.QFILE_SCHEMA_VERSION)
+
+    def test_unsupported_metadata_is_pickled(self):
+        # Metadata that JSON can't represent falls back to a pickle.
+        filebase = self._switchboard.enqueue(self._msg, odd=frozenset('a'))
+        self.assertTrue(self._raw_file(filebase).startswith(RAW_MAGIC))
+        msg, data = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(data['odd'], frozenset('a'))
+        self.assertEqual(msg['message-id'], '<ant>')
+
+    def test_lazy_parsing(self):
+        filebase = self._switchboard.enqueue(self._msg)
+        msg, data = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertNotIn('_headers', msg.__dict__)
+        # Looking at the headers does not parse the body.
+        self.assertEqual(msg['message-id'], '<ant>')
+        self.assertNotIn('_payload', msg.__dict__)
+        self.assertTrue(msg.is_multipart())
+        self.assertEqual(
+            [part.get_payload() for part in msg.get_payload()],
+            ['Hello.', 'Goodbye.'])
+
+    def test_unchanged_message_is_not_flattened(self):
+        filebase = self._switchboard.enqueue(self._msg)
+        msg, data = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(msg['message-id'], '<ant>')
+        with patch.object(LazyMessage, 'as_bytes',
+                          side_effect=AssertionError('as_bytes called')):
+            filebase = self._switchboard.enqueue(msg)
+        msg, data = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(msg.as_bytes(), self._msg.as_bytes())
+
+    def test_changed_message_is_flattened(self):
+        filebase = self._switchboard.enqueue(self._msg)
+        msg, data = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        msg['X-Added'] = 'yes'
+        filebase = self._switchboard.enqueue(msg)
+        msg, data = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(msg['x-added'], 'yes')
+        self.assertEqual(len(msg.get_payload()), 2)
+
+    def test_message_subclasses_are_pickled(self):
+        msg = UserNotification(
+            'anne@example.com', 'test@example.com', 'Hi', 'Hello.')
+        filebase = self._switchboard.enqueue(msg)
+        self.assertFalse(self._raw_file(filebase).startswith(RAW_MAGIC))
+        msg, data = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertIsInstance(msg, UserNotification)
+
+    def test_pickle_files_are_readable(self):
+        filebase = self._pickleq.enqueue(self._msg, listid='test.example.com')
+        msg, data = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertNotIsInstance(msg, LazyMessage)
+        self.assertEqual(msg['message-id'], '<ant>')
+        self.assertEqual(data['listid'], 'test.example.com')
+
+    def test_recover_raw_backup_files(self):
+        filebase = self._switchboard.enqueue(self._msg, listid='ant')
+        # Simulate crashes while processing the entry.
+        self._switchboard.dequeue(filebase)
+        self._switchboard.recover_backup_files()
+        msg, data = self._switchboard.dequeue(filebase)
+        self._switchboard.recover_backup_files()
+        msg, data = self._switchboard.dequeue(filebase)
+        self._switchboard.finish(filebase)
+        self.assertEqual(data['_bak_count'], 2)
+        self.assertEqual(data['listid'], 'ant')
+        self.assertEqual(msg.as_bytes(), self._msg.as_bytes())
+
+
+class TestWakeup(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._msg = mfs("""\
+From: anne@example.com
+To: test@example.com
+Message-ID: <ant>
+
+""")
+
+    def _listener(self):
+        writer = config.switchboards['in']
+        listener = Switchboard(
+            'in', writer.queue_directory, slice=0, numslices=1)
+        self.addCleanup(listener.close)
+        self.addCleanup(os.remove, listener.wakeup_file)
+        # The first wait starts listening.
+        self.assertFalse(listener.wait(0))
+        return listener
+
+    def test_timeout(self):
+        listener = self._listener()
+        self.assertFalse(listener.wait(0.01))
+
+    def test_enqueue_wakes_up(self):
+        listener = self._listener()
+        config.switchboards['in'].enqueue(self._msg)
+        config.switchboards['in'].enqueue(self._msg)
+        self.assertTrue(listener.wait(10))
+        # Both notifications were consumed at once.
+        self.assertFalse(listener.wait(0))
+
+    def test_no_listener(self):
+        # Enqueuing works whether or not any runner is listening.
+        switchboard = config.switchboards['in']
+        self.assertFalse(os.path.exists(switchboard.wakeup_file))
+        switchboard.enqueue(self._msg)
+        self.assertEqual(len(switchboard.files), 1)
+
+    def test_gone_listener(self):
+        # The pipe of a runner which exited is left without a reader.
+        listener = self._listener()
+        listener.close()
+        config.switchboards['in'].enqueue(self._msg)
+        self.assertEqual(len(config.switchboards['in'].files), 1)
+
+    def test_disabled(self):
+        listener = self._listener()
+        with configuration('runner.in', wakeup='no'):
+            config.switchboards['in'].enqueue(self._msg)
+        self.assertFalse(listener.wait(0))
+
+    def test_fall_back_to_polling(self):
+        switchboard = Switchboard(
+            'in', config.switchboards['in'].queue_directory)
+        error_log = LogFileMark('mailman.error')
+        with patch('mailman.core.switchboard.os.mkfifo',
+                   side_effect=PermissionError):
+            self.assertFalse(switchboard.wait(0))
+        self.assertIn('Cannot listen on wakeup pipe', error_log.read())
+        # Polling continues without trying to listen again.
+        with patch('mailman.core.switchboard.time.sleep') as sleep:
+            self.assertFalse(switchboard.wait(0.5))
+        sleep.assert_called_once_with(0.5)
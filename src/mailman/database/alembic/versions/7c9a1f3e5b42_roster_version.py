@@ -0,0 +1,49 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""add roster version
+
+Revision ID: 7c9a1f3e5b42
+Revises: 98224512c9c2
+Create Date: 2022-02-14 10:12:31.408195
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+from mailman.database.helpers import exists_in_db, is_sqlite
+from mailman.database.types import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = '7c9a1f3e5b42'
+down_revision = '98224512c9c2'
+
+
+def upgrade():
+    if not exists_in_db(op.get_bind(), 'mailinglist', 'roster_version'):
+        # SQLite may not have removed it when downgrading.
+        op.add_column(
+            'mailinglist',
+            sa.Column('roster_version', type_=UUID, nullable=True))
+
+
+def downgrade():
+    if not is_sqlite(op.get_bind()):
+        # diffcov runs with SQLite so this isn't covered.
+        op.drop_column('mailinglist', 'roster_version')     # pragma: nocover
@@ -0,0 +1,67 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""add ban version
+
+Revision ID: b5e2c8d41f07
+Revises: 7c9a1f3e5b42
+Create Date: 2022-02-21 15:40:07.117342
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+from mailman.database.types import SAUnicode, UUID
+from uuid import uuid4
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e2c8d41f07'
+down_revision = '7c9a1f3e5b42'
+
+
+def upgrade():
+    version_table = op.create_table(
+        'ban_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('list_id', SAUnicode(), nullable=True),
+        sa.Column('version', UUID(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    op.create_index(
+        op.f('ix_ban_version_list_id'), 'ban_version', ['list_id'],
+        unique=False)
+    # Every list with bans, and the site if it has global bans, needs a
+    # version so that the processes' ban indexes can tell when it changes.
+    # Don't import the table definition from the models, it may break this
+    # migration when the model is updated in the future.
+    ban_table = sa.sql.table(
+        'ban',
+        sa.sql.column('list_id', SAUnicode),
+        )
+    connection = op.get_bind()
+    op.bulk_insert(version_table, [
+        dict(list_id=list_id, version=uuid4())
+        for (list_id,) in connection.execute(
+            sa.select([ban_table.c.list_id]).distinct())
+        ])
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ban_version_list_id'), table_name='ban_version')
+    op.drop_table('ban_version')
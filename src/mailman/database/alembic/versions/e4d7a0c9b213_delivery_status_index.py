@@ -0,0 +1,44 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Add an index on the delivery status preference.
+
+The bounce runner looks up the members disabled by bounces with it.
+
+Revision ID: e4d7a0c9b213
+Revises: b5e2c8d41f07
+Create Date: 2022-02-28 09:27:44.581036
+
+"""
+
+from alembic import op
+
+
+# Revision identifiers, used by Alembic.
+revision = 'e4d7a0c9b213'
+down_revision = 'b5e2c8d41f07'
+
+
+def upgrade():
+    op.create_index(
+        op.f('ix_preferences_delivery_status'), 'preferences',
+        ['delivery_status'], unique=False)
+
+
+def downgrade():
+    op.drop_index(
+        op.f('ix_preferences_delivery_status'), table_name='preferences')
@@ -0,0 +1,47 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""add list directory version
+
+Revision ID: f1a6c2d8e935
+Revises: e4d7a0c9b213
+Create Date: 2022-03-07 13:52:18.660214
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+from mailman.database.types import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a6c2d8e935'
+down_revision = 'e4d7a0c9b213'
+
+
+def upgrade():
+    op.create_table(
+        'list_directory_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', UUID(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('list_directory_version')
@@ -55,6 +55,10 @@ class SABaseDatabase:
         """See `IDatabase`."""
         self.store.rollback()
 
+    def savepoint(self):
+        """See `IDatabase`."""
+        return self.store.begin_nested()
+
     def _pre_reset(self, store):
         """Clean up method for testing.
 
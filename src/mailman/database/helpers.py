@@ -20,6 +20,8 @@
 import sqlalchemy as sa
 
 from public import public
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 
 
 @public
@@ -43,3 +45,52 @@ def exists_in_db(bind, tablename, columnname=None):
             tablename in md.tables and
             columnname in [c.name for c in md.tables[tablename].columns]
             )
+
+
+class _AddInterval(FunctionElement):
+    type = sa.DateTime()
+    name = 'add_interval'
+
+
+@public
+def add_interval(timestamp, interval):
+    """Add an interval to a timestamp, in SQL.
+
+    SQLAlchemy only stores `Interval` columns natively on PostgreSQL.  The
+    other databases store them as the timestamp at that offset from the
+    epoch, so the date arithmetic has to be spelled out for each of them.
+
+    :param timestamp: A `DateTime` column or expression.
+    :param interval: An `Interval` column or expression.
+    :return: A `DateTime` expression.
+    """
+    return _AddInterval(timestamp, interval)
+
+
+@compiles(_AddInterval)
+def _compile_add_interval(element, compiler, **kw):
+    timestamp, interval = list(element.clauses)
+    return '({} + {})'.format(
+        compiler.process(timestamp, **kw), compiler.process(interval, **kw))
+
+
+@compiles(_AddInterval, 'sqlite')
+def _compile_add_interval_sqlite(element, compiler, **kw):
+    # Format the result like SQLAlchemy stores DateTime values in SQLite, so
+    # that it compares as expected with them, apart from the microseconds.
+    timestamp, interval = list(element.clauses)
+    return (
+        "strftime('%Y-%m-%d %H:%M:%f', {}, "
+        "strftime('%s', {}) || ' seconds')".format(
+            compiler.process(timestamp, **kw),
+            compiler.process(interval, **kw)))
+
+
+@compiles(_AddInterval, 'mysql')
+def _compile_add_interval_mysql(element, compiler, **kw):   # pragma: nocover
+    timestamp, interval = list(element.clauses)
+    return (
+        "TIMESTAMPADD(MICROSECOND, TIMESTAMPDIFF("
+        "MICROSECOND, '1970-01-01 00:00:00', {}), {})".format(
+            compiler.process(interval, **kw),
+            compiler.process(timestamp, **kw)))
@@ -42,3 +42,14 @@ class SQLiteDatabase(SABaseDatabase):
         # Ignore errors
         if fd > 0:
             os.close(fd)
+
+    def savepoint(self):
+        """See `IDatabase`."""
+        # pysqlite only begins a transaction implicitly before DML statements.
+        # A SAVEPOINT issued outside of a transaction starts one of its own,
+        # which is then committed when the savepoint is released, so make
+        # sure the enclosing transaction has really been started.
+        connection = self.store.connection().connection
+        if not connection.in_transaction:
+            connection.execute('BEGIN')
+        return super().savepoint()
@@ -26,6 +26,7 @@ attributes.
 import re
 import email
 import email.utils
+import email.parser
 import email.message
 
 from email.header import decode_header, Header, make_header
@@ -144,6 +145,66 @@ class MultipartDigestMessage(MIMEMultipart, Message):
     """Mix-in class for MIME digest messages."""
 
 
+# Message attributes which are only filled in by a full parse of the body.
+BODY_ATTRIBUTES = frozenset(('_payload', 'preamble', 'epilogue', 'defects'))
+
+
+@public
+class LazyMessage(Message):
+    """A message which is parsed from its raw bytes only when needed.
+
+    The headers are parsed the first time any message attribute is used, and
+    the body is only parsed when the payload (or any other attribute which
+    depends on the body) is first accessed.  As long as neither the headers
+    nor the body have been touched, `pristine_bytes()` returns the original
+    bytes so that they can be passed along without being flattened again.
+    """
+
+    def __init__(self, raw):
+        # Don't chain up; every standard message attribute is filled in by
+        # __getattr__() on first use.
+        self._raw = raw
+
+    def __getattr__(self, name):
+        # This is only called when normal attribute lookup fails.  Special
+        # names are looked up by pickle and copy, and must not cause a parse.
+        instance = self.__dict__
+        if name.startswith('__') or '_raw' not in instance:
+            raise AttributeError(name)
+        if '_headers' not in instance:
+            parsed = email.parser.BytesParser(Message).parsebytes(
+                self._raw, headersonly=True)
+            for key, value in parsed.__dict__.items():
+                if key not in BODY_ATTRIBUTES:
+                    instance.setdefault(key, value)
+            self._raw_headers = list(parsed._headers)
+            self._raw_unixfrom = self._unixfrom
+        if name in BODY_ATTRIBUTES and '_payload' not in instance:
+            parsed = email.message_from_bytes(self._raw, Message)
+            for key in BODY_ATTRIBUTES:
+                instance[key] = getattr(parsed, key)
+        try:
+            return instance[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def pristine_bytes(self):
+        """The original bytes of the message, if it is still unchanged.
+
+        :return: The raw bytes this message was created from, or None if the
+            body has been parsed or the headers have been changed since.
+        :rtype: bytes or None
+        """
+        instance = self.__dict__
+        if '_headers' not in instance:
+            return self._raw
+        if ('_payload' in instance or
+                self._headers != self._raw_headers or
+                self._unixfrom != self._raw_unixfrom):
+            return None
+        return self._raw
+
+
 @public
 class UserNotification(Message):
     """Class for internally crafted messages."""
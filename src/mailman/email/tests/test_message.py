@@ -18,6 +18,8 @@
 """Test the message API."""
 
 import sys
+import copy
+import pickle
 import unittest
 
 from email import message_from_binary_file
@@ -26,7 +28,7 @@ from email.parser import FeedParser
 from email.utils import _has_surrogates
 from importlib_resources import path
 from mailman.app.lifecycle import create_list
-from mailman.email.message import Message, UserNotification
+from mailman.email.message import LazyMessage, Message, UserNotification
 from mailman.testing.helpers import (
     get_queue_messages,
     specialized_message_from_string as mfs,
@@ -184,3 +186,40 @@ Message with \u201cNon-ascii\u201d.
                 fp.seek(0)
                 text = fp.read().decode('ascii', 'replace')
         self.assertEqual(msg.as_string(), text)
+
+
+class TestLazyMessage(unittest.TestCase):
+    """Test the lazily parsed message."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._raw = b"""\
+To: list@example.com
+From: user@example.com
+Subject: Hello
+
+Hello there.
+"""
+
+    def test_pristine_until_changed(self):
+        msg = LazyMessage(self._raw)
+        self.assertEqual(msg.pristine_bytes(), self._raw)
+        self.assertEqual(msg['subject'], 'Hello')
+        self.assertEqual(msg.pristine_bytes(), self._raw)
+        msg['X-Added'] = 'yes'
+        self.assertIsNone(msg.pristine_bytes())
+
+    def test_reading_the_body_parses_it(self):
+        msg = LazyMessage(self._raw)
+        self.assertEqual(msg.get_payload(), 'Hello there.\n')
+        self.assertIsNone(msg.pristine_bytes())
+        self.assertEqual(msg.as_bytes(), self._raw)
+
+    def test_copy_and_pickle_do_not_parse(self):
+        msg = LazyMessage(self._raw)
+        clone = copy.deepcopy(msg)
+        restored = pickle.loads(pickle.dumps(msg))
+        self.assertEqual(msg.__dict__, dict(_raw=self._raw))
+        self.assertEqual(clone['subject'], 'Hello')
+        self.assertEqual(restored['subject'], 'Hello')
@@ -17,7 +17,6 @@
 
 """Decorate a message by sticking the header and footer around it."""
 
-import re
 import copy
 import logging
 
@@ -28,7 +27,7 @@ from mailman.core.i18n import _
 from mailman.interfaces.handler import IHandler
 from mailman.interfaces.mailinglist import IListArchiverSet
 from mailman.interfaces.template import ITemplateLoader
-from mailman.utilities.string import expand
+from mailman.utilities.string import compile_template, standard_substitutions
 from public import public
 from zope.component import getUtility
 from zope.interface import implementer
@@ -68,25 +67,13 @@ def process(mlist, msg, msgdata):
         d['user_name_or_address'] = member.display_name or recipient
         # For backward compatibility.
         d['user_address'] = recipient
-    # Calculate the archiver permalink substitution variables.  This provides
-    # the $<archive-name>_url placeholder for every enabled archiver.
-    for archiver in IListArchiverSet(mlist).archivers:
-        if archiver.is_enabled:
-            # Get the permalink of the message from the archiver.  Watch out
-            # for exceptions in the archiver plugin.
-            try:
-                archive_url = archiver.system_archiver.permalink(mlist, msg)
-            except Exception:
-                alog.exception('Exception in "{}" archiver'.format(
-                    archiver.system_archiver.name))
-                archive_url = None
-            if archive_url is not None:
-                placeholder = '{}_url'.format(archiver.system_archiver.name)
-                d[placeholder] = archive_url
-    # These strings are descriptive for the log file and shouldn't be i18n'd
-    d.update(msgdata.get('decoration-data', {}))
-    header = decorate('list:member:regular:header', mlist, d)
-    footer = decorate('list:member:regular:footer', mlist, d)
+    # When delivering to each recipient individually, the decorations are
+    # shared by all of the message's recipients.
+    decorations = msgdata.get('decorations')
+    if decorations is None:
+        decorations = Decorations(mlist, msg, msgdata)
+    header = decorations.expand('list:member:regular:header', d)
+    footer = decorations.expand('list:member:regular:footer', d)
     # Escape hatch if both the footer and header are empty or None.
     if len(header) == 0 and len(footer) == 0:
         return
@@ -213,13 +200,11 @@ def decorate(name, mlist, extradict=None):
     return decorate_template(mlist, template, extradict)
 
 
-@public
-def decorate_template(mlist, template, extradict=None):
-    """Expand the decoration template."""
+def _list_substitutions(mlist):
     # Create a dictionary which includes the default set of interpolation
-    # variables allowed in headers and footers.  These will be augmented by
-    # any key/value pairs in the extradict.
-    substitutions = {
+    # variables allowed in headers and footers.
+    substitutions = standard_substitutions(mlist)
+    substitutions.update({
         key: getattr(mlist, key)
         for key in ('fqdn_listname',
                     'list_name',
@@ -229,12 +214,92 @@ def decorate_template(mlist, template, extradict=None):
                     'description',
                     'info',
                     )
-        }
+        })
+    return substitutions
+
+
+@public
+def decorate_template(mlist, template, extradict=None):
+    """Expand the decoration template."""
+    # The default interpolation variables are augmented by any key/value
+    # pairs in the extradict.
+    substitutions = _list_substitutions(mlist)
     if extradict is not None:
         substitutions.update(extradict)
-    text = expand(template, mlist, substitutions)
+    text = compile_template(template).substitute(substitutions)
     # Turn any \r\n line endings into just \n
-    return re.sub(r'\r\n', r'\n', text)
+    return text.replace('\r\n', '\n')
+
+
+@public
+class Decorations:
+    """The headers and footers of a message, for any of its recipients.
+
+    Everything but the recipient's personalization is the same for all
+    recipients of the message, so it is calculated only once, and bound into
+    the compiled templates.
+    """
+
+    def __init__(self, mlist, msg, msgdata):
+        self._mlist = mlist
+        self._msg = msg
+        self._msgdata = msgdata
+        # The message specific substitutions, calculated when first needed.
+        self._extras = None
+        self._substitutions = None
+        # Map template texts to their compiled and bound forms.
+        self._templates = {}
+
+    def _calculate(self):
+        extras = {}
+        # Calculate the archiver permalink substitution variables.  This
+        # provides the $<archive-name>_url placeholder for every enabled
+        # archiver.
+        for archiver in IListArchiverSet(self._mlist).archivers:
+            if archiver.is_enabled:
+                # Get the permalink of the message from the archiver.  Watch
+                # out for exceptions in the archiver plugin.
+                try:
+                    archive_url = archiver.system_archiver.permalink(
+                        self._mlist, self._msg)
+                except Exception:
+                    alog.exception('Exception in "{}" archiver'.format(
+                        archiver.system_archiver.name))
+                    archive_url = None
+                if archive_url is not None:
+                    placeholder = '{}_url'.format(
+                        archiver.system_archiver.name)
+                    extras[placeholder] = archive_url
+        # These strings are descriptive for the log file and shouldn't be
+        # i18n'd
+        extras.update(self._msgdata.get('decoration-data', {}))
+        self._extras = extras
+        self._substitutions = _list_substitutions(self._mlist)
+        self._substitutions.update(extras)
+
+    def expand(self, name, personalization):
+        """Expand the named decoration template for a recipient.
+
+        :param name: The name of the decoration template.
+        :type name: str
+        :param personalization: The recipient specific substitutions.
+        :type personalization: dict
+        :return: The expanded template.
+        :rtype: str
+        """
+        if self._extras is None:
+            self._calculate()
+        # The message specific substitutions take precedence.
+        kws = dict(personalization)
+        kws.update(self._extras)
+        template = getUtility(ITemplateLoader).get(name, self._mlist, **kws)
+        compiled = self._templates.get(template)
+        if compiled is None:
+            compiled = compile_template(template).bind(self._substitutions)
+            self._templates[template] = compiled
+        text = compiled.substitute(personalization)
+        # Turn any \r\n line endings into just \n
+        return text.replace('\r\n', '\n')
 
 
 @public
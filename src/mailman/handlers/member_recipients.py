@@ -26,7 +26,6 @@ SendmailDeliver and BulkDeliver modules.
 from mailman.config import config
 from mailman.core.i18n import _
 from mailman.interfaces.handler import IHandler
-from mailman.interfaces.member import DeliveryStatus
 from mailman.interfaces.pipeline import RejectMessage
 from mailman.utilities.string import wrap
 from public import public
@@ -80,10 +79,9 @@ authorized for delivery.  The original message as received by Mailman is
 attached.
 """)
                 raise RejectMessage(wrap(text))
-        # Calculate the regular recipients of the message
-        recipients = set(member.address.email
-                         for member in mlist.regular_members.members
-                         if member.delivery_status == DeliveryStatus.enabled)
+        # Calculate the regular recipients of the message.  The roster keeps
+        # a cached copy of them which we must not change.
+        recipients = set(mlist.regular_members.recipients)
         # Remove the sender if they don't want to receive their own posts
         if not include_sender and member.address.email in recipients:
             recipients.remove(member.address.email)
@@ -49,6 +49,13 @@ class IBanManager(Interface):
     bans = Attribute(
         """A `QuerySequence` over all the banned emails.""")
 
+    version = Attribute(
+        """An opaque value which changes whenever a ban is added or removed.
+
+        This only covers the bans managed by this ban manager, i.e. either
+        the bans of the mailing list, or the global bans.
+        """)
+
     def ban(email):
         """Ban an email address from subscribing to a mailing list.
 
@@ -105,6 +105,21 @@ class IBounceProcessor(Interface):
         :type event: IBounceEvent
         """
 
+    def process_events(batch_size=None):
+        """Process all the unprocessed bounce events, in batches.
+
+        The events are grouped by mailing list and their members are looked
+        up together.  Each batch is committed once.  Events for mailing
+        lists which no longer exist, or for addresses which aren't members,
+        are marked as processed and logged.  An event whose processing fails
+        is logged and left unprocessed.
+
+        :param batch_size: The number of events to process in each batch.
+            The default is given by the `batch_size` in the `[bounces]`
+            configuration section.
+        :type batch_size: int
+        """
+
     def send_warnings_and_remove():
         """Send warnings to disabled users and remove them if needed.
 
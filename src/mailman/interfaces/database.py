@@ -49,6 +49,16 @@ class IDatabase(Interface):
     def abort():
         """Abort the current transaction."""
 
+    def savepoint():
+        """Begin a nested transaction within the current transaction.
+
+        Committing the returned transaction releases the savepoint, keeping
+        its changes as part of the enclosing transaction.  Rolling it back
+        discards only the changes made since the savepoint was created.
+
+        :return: The nested transaction.
+        """
+
     store = Attribute(
         """The underlying database object on which you can do queries.""")
 
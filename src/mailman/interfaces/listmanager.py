@@ -153,6 +153,19 @@ class IListManager(Interface):
         """An iterator over the list ids of all mailing lists managed by this
         list manager.""")
 
+    list_ids_by_name = Attribute(
+        """A dictionary mapping the fully qualified list names of all mailing
+        lists managed by this list manager to their list ids.""")
+
+    directory_version = Attribute(
+        """The version of the directory of mailing lists and domains.
+
+        The version is an opaque value which changes whenever a mailing list
+        or domain is created, deleted, or renamed, or a domain's alias
+        changes.  Compare it to a previous value to tell whether a cached
+        copy of `list_ids_by_name` or of the domains is out of date.
+        """)
+
     name_components = Attribute(
         """An iterator over the 2-tuple of (list_name, mail_host) for all
         mailing lists managed by this list manager.""")
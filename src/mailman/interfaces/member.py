@@ -335,3 +335,17 @@ class IMembershipManager(Interface):
         These memberships have maximum number of warnings already sent out and
         are pending removal.
         """
+
+    def get_preferences(members):
+        """Resolve the effective preferences of many members at once.
+
+        Each preference is resolved just like the corresponding `IMember`
+        attribute does it, but a handful of queries are used for all the
+        members, instead of several queries per member.
+
+        :param members: The members whose preferences to resolve.
+        :type members: iterable of `IMember`
+        :return: A mapping from each member to its effective preferences,
+            which have the same attributes as `IPreferences`.
+        :rtype: dict
+        """
@@ -49,6 +49,19 @@ class IRoster(Interface):
         managed by this roster.
         """)
 
+    def with_preferences():
+        """Iterate over the members along with their effective preferences.
+
+        Each preference is resolved just like the corresponding `IMember`
+        attribute does it, i.e. from the membership, then the address, then
+        the user, then the system or list default.  All the members'
+        preferences are resolved in a single query though, so use this
+        instead of `members` when looking at many members' preferences.
+
+        :return: An iterator over (member, preferences) pairs, where the
+            preferences have the same attributes as `IPreferences`.
+        """
+
     def get_member(email):
         """Get the member for the given address.
 
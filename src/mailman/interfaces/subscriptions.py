@@ -131,8 +131,8 @@ class ISubscriptionService(Interface):
         a digest member), the member can appear multiple times in this list.
         Roles are sorted by: owner, moderator, member.
 
-        :return: The list of all members.
-        :rtype: list of `IMember`
+        :return: The sequence of all members.
+        :rtype: sequence of `IMember`
         """
 
     def get_member(member_id):
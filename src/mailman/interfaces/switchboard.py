@@ -77,6 +77,22 @@ class ISwitchboard(Interface):
         returned.
         """
 
+    def wait(timeout):
+        """Wait until an entry may have been enqueued in this slice.
+
+        The first call starts listening for notifications from other
+        switchboards enqueuing into this queue.  When notifications can't be
+        received, this simply sleeps.
+
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :return: True if woken up by a notification, False if the timeout
+            expired.
+        """
+
+    def close():
+        """Stop listening for enqueue notifications."""
+
     def recover_backup_files():
         """Move all backup files to active message files.
 
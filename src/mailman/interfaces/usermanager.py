@@ -130,7 +130,10 @@ class IUserManager(Interface):
         """
 
     addresses = Attribute(
-        """An iterator over all the `IAddresses` managed by this manager.""")
+        """A sequence of all the `IAddresses` managed by this manager.
+
+        The addresses are sorted by their original email address.
+        """)
 
     members = Attribute(
         """An iterator of all the `IMembers` in the database.""")
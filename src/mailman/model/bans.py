@@ -18,17 +18,27 @@
 """Ban manager."""
 
 import re
+import logging
 
 from mailman.database.model import Model
 from mailman.database.transaction import dbconnection
-from mailman.database.types import SAUnicode
+from mailman.database.types import SAUnicode, UUID
 from mailman.interfaces.bans import IBan, IBanManager
 from mailman.utilities.queries import QuerySequence
+from mailman.utilities.string import combine_patterns
 from public import public
-from sqlalchemy import Column, Integer
+from sqlalchemy import Column, Integer, or_
+from uuid import uuid4
 from zope.interface import implementer
 
 
+log = logging.getLogger('mailman.error')
+
+# The ban indexes of this process, keyed by list-id, or None for the global
+# bans.  The values are the index and the versions it was built from.
+_indexes = {}
+
+
 @public
 @implementer(IBan)
 class Ban(Model):
@@ -46,6 +56,68 @@ class Ban(Model):
         self.list_id = list_id
 
 
+@public
+class BanVersion(Model):
+    """The version of a list's bans, or of the global bans.
+
+    The version changes whenever a ban is added or removed, so that every
+    process can tell when its ban index is out of date.
+    """
+
+    __tablename__ = 'ban_version'
+
+    id = Column(Integer, primary_key=True)
+    list_id = Column(SAUnicode, index=True)
+    version = Column(UUID, nullable=False)
+
+    def __init__(self, list_id):
+        super().__init__()
+        self.list_id = list_id
+        self.version = uuid4()
+
+
+def _bump_version(store, list_id):
+    # Record that the bans of a list, or the global bans, have changed.
+    versions = store.query(BanVersion).filter_by(list_id=list_id).all()
+    if len(versions) == 0:
+        store.add(BanVersion(list_id))
+    for ban_version in versions:
+        ban_version.version = uuid4()
+
+
+class _BanIndex:
+    """The compiled bans of a mailing list, or the global bans."""
+
+    def __init__(self, store, list_id):
+        self._emails = set()
+        patterns = []
+        for (email,) in store.query(Ban.email).filter_by(list_id=list_id):
+            self._emails.add(email)
+            if not email.startswith('^'):
+                continue
+            try:
+                re.compile(email, re.IGNORECASE)
+            except re.error as error:
+                log.error('Invalid ban pattern {} for {}: {}'.format(
+                    email, 'global bans' if list_id is None else list_id,
+                    error.msg))
+            else:
+                patterns.append(email)
+        # Match all the patterns at once if possible, otherwise one by one.
+        combined = None
+        if len(patterns) > 1:
+            combined = combine_patterns(patterns, re.IGNORECASE)
+        if combined is None:
+            self._regexps = [
+                re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        else:
+            self._regexps = [combined]
+
+    def __contains__(self, email):
+        return email in self._emails or any(
+            cre.match(email) is not None for cre in self._regexps)
+
+
 @public
 @implementer(IBanManager)
 class BanManager:
@@ -62,6 +134,7 @@ class BanManager:
         if bans.count() == 0:
             ban = Ban(email, self._list_id)
             store.add(ban)
+            _bump_version(store, self._list_id)
 
     @dbconnection
     def unban(self, store, email):
@@ -70,44 +143,31 @@ class BanManager:
             email=email, list_id=self._list_id).first()
         if ban is not None:
             store.delete(ban)
+            _bump_version(store, self._list_id)
 
     @dbconnection
     def is_banned(self, store, email):
         """See `IBanManager`."""
-        list_id = self._list_id
-        if list_id is None:
-            # The client is asking for global bans.  Look up bans on the
-            # specific email address first.
-            bans = store.query(Ban).filter_by(email=email, list_id=None)
-            if bans.count() > 0:
-                return True
-            # And now look for global pattern bans.
-            bans = store.query(Ban).filter_by(list_id=None)
-            for ban in bans:
-                if (ban.email.startswith('^') and
-                        re.match(ban.email, email, re.IGNORECASE) is not None):
-                    return True
-        else:
-            # This is a list-specific ban.
-            bans = store.query(Ban).filter_by(email=email, list_id=list_id)
-            if bans.count() > 0:
+        # Look up the versions of both the list's bans and the global bans at
+        # once, and rebuild any index which is out of date.
+        list_ids = [None] if self._list_id is None else [self._list_id, None]
+        versions = {list_id: [] for list_id in list_ids}
+        for list_id, version in store.query(
+                BanVersion.list_id, BanVersion.version).filter(or_(
+                    BanVersion.list_id == self._list_id,
+                    BanVersion.list_id.is_(None))):
+            versions[list_id].append(version)
+        for list_id in list_ids:
+            version = tuple(sorted(versions[list_id]))
+            cached = _indexes.get(list_id)
+            if cached is None or cached[1] != version:
+                # A list or the site without a version has never had a ban.
+                index = (None if len(version) == 0
+                         else _BanIndex(store, list_id))
+                cached = _indexes[list_id] = (index, version)
+            index = cached[0]
+            if index is not None and email in index:
                 return True
-            # Try global bans next.
-            bans = store.query(Ban).filter_by(email=email, list_id=None)
-            if bans.count() > 0:
-                return True
-            # Now try specific mailing list bans, but with a pattern.
-            bans = store.query(Ban).filter_by(list_id=list_id)
-            for ban in bans:
-                if (ban.email.startswith('^') and
-                        re.match(ban.email, email, re.IGNORECASE) is not None):
-                    return True
-            # And now try global pattern bans.
-            bans = store.query(Ban).filter_by(list_id=None)
-            for ban in bans:
-                if (ban.email.startswith('^') and
-                        re.match(ban.email, email, re.IGNORECASE) is not None):
-                    return True
         return False
 
     @property
@@ -118,6 +178,14 @@ class BanManager:
             list_id=self._list_id).order_by(Ban.email)
         return QuerySequence(query)
 
+    @property
+    @dbconnection
+    def version(self, store):
+        """See `IBanManager`."""
+        return tuple(sorted(
+            version for version, in store.query(BanVersion.version).filter_by(
+                list_id=self._list_id)))
+
     @dbconnection
     def __iter__(self, store):
         """See `IBanManager`."""
@@ -45,9 +45,15 @@ from mailman.interfaces.bounce import (
     InvalidBounceEvent,
 )
 from mailman.interfaces.listmanager import IListManager
-from mailman.interfaces.member import DeliveryStatus, IMembershipManager
+from mailman.interfaces.member import (
+    DeliveryStatus,
+    IMembershipManager,
+    MemberRole,
+)
 from mailman.interfaces.messages import IMessageStore
 from mailman.interfaces.pending import IPendings
+from mailman.model.address import Address
+from mailman.model.member import Member
 from mailman.utilities.datetime import now
 from public import public
 from sqlalchemy import Boolean, Column, DateTime, Integer
@@ -56,6 +62,7 @@ from zope.interface import implementer
 
 
 log = logging.getLogger('mailman.bounce')
+elog = logging.getLogger('mailman.error')
 
 
 @public
@@ -167,7 +174,98 @@ class BounceProcessor:
             raise InvalidBounceEvent(
                 'Email {} is not a subcriber of {}'.format(
                     event.email, mlist.list_id))
+        self._score(mlist, member, event)
+
+    @dbconnection
+    def process_events(self, store, batch_size=None):
+        """See `IBounceProcessor`."""
+        if batch_size is None:
+            batch_size = int(config.bounces.batch_size)
+        last_id = None
+        while True:
+            query = store.query(BounceEvent).filter_by(processed=False)
+            if last_id is not None:
+                query = query.filter(BounceEvent.id > last_id)
+            events = query.order_by(BounceEvent.id).limit(batch_size).all()
+            if len(events) == 0:
+                break
+            last_id = events[-1].id
+            self._process_batch(store, events)
+            config.db.commit()
+
+    def _process_batch(self, store, events):
+        list_manager = getUtility(IListManager)
+        by_list = {}
+        for event in events:
+            by_list.setdefault(event.list_id, []).append(event)
+        invalid = []
+        for list_id, list_events in by_list.items():
+            mlist = list_manager.get(list_id)
+            if mlist is None:
+                # List was removed before the bounces are processed.
+                for event in list_events:
+                    log.info('Bounce message for a non subscriber: '
+                             'Bounce for non-existent list {}'.format(list_id))
+                invalid.extend(list_events)
+                continue
+            members = self._get_members(
+                store, list_id, {event.email for event in list_events})
+            for event in list_events:
+                member = members.get(event.email.lower())
+                if member is None:
+                    log.info('Bounce message for a non subscriber: '
+                             'Email {} is not a subcriber of {}'.format(
+                                 event.email, list_id))
+                    invalid.append(event)
+                    continue
+                # Each event gets its own savepoint, so that a failure only
+                # throws away its own changes.  The event is left unprocessed
+                # to be retried later.
+                savepoint = config.db.savepoint()
+                try:
+                    self._score(mlist, member, event)
+                except Exception:
+                    elog.exception(
+                        'Failed to process bounce event %s for %s on list %s',
+                        event.id, event.email, list_id)
+                    savepoint.rollback()
+                else:
+                    savepoint.commit()
+        if len(invalid) > 0:
+            store.query(BounceEvent).filter(
+                BounceEvent.id.in_([event.id for event in invalid])
+                ).update(dict(processed=True), synchronize_session=False)
+            for event in invalid:
+                # Keep the loaded events in sync with the database.
+                event.processed = True
+
+    def _get_members(self, store, list_id, emails):
+        # Resolve all the bouncing addresses with two queries, the way
+        # `IRoster.get_member()` does for a single one.  Return a dictionary
+        # mapping the email addresses to their regular memberships.
+        # Avoid circular imports.
+        from mailman.model.user import User
+        members_a = store.query(Address.email, Member).filter(
+            Member.list_id == list_id,
+            Member.role == MemberRole.member,
+            Address.email.in_(emails),
+            Member.address_id == Address.id)
+        members_u = store.query(Address.email, Member).filter(
+            Member.list_id == list_id,
+            Member.role == MemberRole.member,
+            Address.email.in_(emails),
+            Member.user_id == User.id,
+            User._preferred_address_id == Address.id)
+        members = {}
+        for email, member in members_a.union(members_u):
+            # An address subscribed both explicitly and through its user's
+            # preferred address bounces for the explicit membership.
+            email = email.lower()
+            if email not in members or member._address is not None:
+                members[email] = member
+        return members
 
+    def _score(self, mlist, member, event):
         # If this is a probe bounce, that we are sent before to check for this
         # Mailbox, we just disable the delivery for this member.
         if event.context == BounceContext.probe:
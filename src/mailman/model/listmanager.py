@@ -17,7 +17,10 @@
 
 """A mailing list manager."""
 
+from itertools import chain
+from mailman.database.model import Model
 from mailman.database.transaction import dbconnection
+from mailman.database.types import UUID
 from mailman.interfaces.address import InvalidEmailAddressError
 from mailman.interfaces.listmanager import (
     IListManager,
@@ -29,7 +32,7 @@ from mailman.interfaces.listmanager import (
 )
 from mailman.interfaces.requests import IListRequests
 from mailman.model.autorespond import AutoResponseRecord
-from mailman.model.bans import Ban
+from mailman.model.bans import Ban, BanVersion
 from mailman.model.mailinglist import (
     IAcceptableAliasSet,
     ListArchiver,
@@ -39,10 +42,29 @@ from mailman.model.mime import ContentFilter
 from mailman.utilities.datetime import now
 from mailman.utilities.queries import QuerySequence
 from public import public
+from sqlalchemy import Column, inspect, Integer
+from sqlalchemy.event import listen
+from sqlalchemy.orm import Session
+from uuid import uuid4
 from zope.event import notify
 from zope.interface import implementer
 
 
+@public
+class ListDirectoryVersion(Model):
+    """The version of the directory of mailing lists and domains.
+
+    The version changes whenever a mailing list or a domain is created,
+    deleted, or renamed, or a domain's alias changes, so that processes
+    caching the directory can tell when it is out of date.
+    """
+
+    __tablename__ = 'list_directory_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(UUID, nullable=False)
+
+
 @public
 @implementer(IListManager)
 class ListManager:
@@ -97,6 +119,7 @@ class ListManager:
         store.query(ContentFilter).filter_by(mailing_list=mlist).delete()
         store.query(ListArchiver).filter_by(mailing_list=mlist).delete()
         store.query(Ban).filter_by(list_id=mlist.list_id).delete()
+        store.query(BanVersion).filter_by(list_id=mlist.list_id).delete()
         store.delete(mlist)
         notify(ListDeletedEvent(fqdn_listname))
 
@@ -122,6 +145,24 @@ class ListManager:
                                                       MailingList.list_name):
             yield '{}@{}'.format(list_name, mail_host)
 
+    @property
+    @dbconnection
+    def list_ids_by_name(self, store):
+        """See `IListManager`."""
+        return {
+            '{}@{}'.format(list_name, mail_host): list_id
+            for list_name, mail_host, list_id in store.query(
+                MailingList.list_name, MailingList.mail_host,
+                MailingList._list_id)
+            }
+
+    @property
+    @dbconnection
+    def directory_version(self, store):
+        """See `IListManager`."""
+        return tuple(sorted(version for version, in store.query(
+            ListDirectoryVersion.version)))
+
     @property
     @dbconnection
     def list_ids(self, store):
@@ -149,3 +190,36 @@ class ListManager:
             query = query.filter_by(mail_host=mail_host)
         query = query.order_by(MailingList._list_id)
         return QuerySequence(query)
+
+
+def _has_changes(obj, *names):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+def _bump_directory_version(session, flush_context, instances):
+    # Give the list directory a new version when this flush adds, removes,
+    # or renames a mailing list or a domain.
+    #
+    # Avoid circular imports.
+    from mailman.model.domain import Domain
+    changed = any(
+        isinstance(obj, (MailingList, Domain))
+        for obj in chain(session.new, session.deleted))
+    if not changed:
+        for obj in session.dirty:
+            if isinstance(obj, MailingList):
+                changed = _has_changes(obj, 'list_name', 'mail_host')
+            elif isinstance(obj, Domain):
+                changed = _has_changes(obj, 'mail_host', 'alias_domain')
+            if changed:
+                break
+    if not changed:
+        return
+    table = ListDirectoryVersion.__table__
+    result = session.execute(table.update().values(version=uuid4()))
+    if result.rowcount == 0:
+        session.execute(table.insert().values(version=uuid4()))
+
+
+listen(Session, 'before_flush', _bump_directory_version)
@@ -28,6 +28,7 @@ from mailman.database.types import (
     SAUnicode,
     SAUnicode4Byte,
     SAUnicodeLarge,
+    UUID,
 )
 from mailman.interfaces.action import Action, FilterAction
 from mailman.interfaces.address import IAddress, InvalidEmailAddressError
@@ -86,6 +87,7 @@ from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm.exc import NoResultFound
+from uuid import uuid4
 from zope.component import getUtility
 from zope.event import notify
 from zope.interface import implementer
@@ -117,6 +119,9 @@ class MailingList(Model):
     anonymous_list = Column(Boolean)
     # Attributes not directly modifiable via the web u/i
     created_at = Column(DateTime)
+    # This is changed whenever the list's recipients may have changed, so
+    # that cached copies of them can be invalidated.
+    _roster_version = Column('roster_version', UUID)
     # Attributes which are directly modifiable via the web u/i.  The more
     # complicated attributes are currently stored as pickles, though that
     # will change as the schema and implementation is developed.
@@ -232,6 +237,7 @@ class MailingList(Model):
         self._list_id = '{0}.{1}'.format(listname, hostname)
         # For the pending database
         self.next_request_id = 1
+        self._roster_version = uuid4()
         # We need to set up the rosters.  Normally, this method will get called
         # when the MailingList object is loaded from the database, but when the
         # constructor is called, SQLAlchemy's `load` event isn't triggered.
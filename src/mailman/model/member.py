@@ -17,13 +17,16 @@
 
 """Model for members."""
 
+from collections import namedtuple
 from datetime import datetime
 from mailman.core.constants import system_preferences
+from mailman.database.helpers import add_interval
 from mailman.database.model import Model
 from mailman.database.transaction import dbconnection
 from mailman.database.types import Enum, SAUnicode, UUID
 from mailman.interfaces.action import Action
 from mailman.interfaces.address import IAddress
+from mailman.interfaces.languages import ILanguageManager
 from mailman.interfaces.listmanager import IListManager
 from mailman.interfaces.member import (
     DeliveryStatus,
@@ -36,11 +39,13 @@ from mailman.interfaces.member import (
 )
 from mailman.interfaces.user import IUser, UnverifiedAddressError
 from mailman.interfaces.usermanager import IUserManager
+from mailman.model.address import Address
+from mailman.model.preferences import Preferences
 from mailman.utilities.datetime import now
 from mailman.utilities.uid import UIDFactory
 from public import public
-from sqlalchemy import and_, Column, DateTime, ForeignKey, Integer
-from sqlalchemy.orm import relationship
+from sqlalchemy import and_, Column, DateTime, ForeignKey, func, Integer, or_
+from sqlalchemy.orm import aliased, relationship
 from zope.component import getUtility
 from zope.event import notify
 from zope.interface import implementer
@@ -48,6 +53,22 @@ from zope.interface import implementer
 
 uid_factory = UIDFactory(context='members')
 
+# The preferences which can be resolved for many members at once.
+PREFERENCES = (
+    'acknowledge_posts',
+    'hide_address',
+    'preferred_language',
+    'receive_list_copy',
+    'receive_own_postings',
+    'delivery_mode',
+    'delivery_status',
+    )
+# The number of members to resolve preferences for in a single query.
+PREFERENCES_CHUNK_SIZE = 500
+
+EffectivePreferences = namedtuple('EffectivePreferences', PREFERENCES)
+public(EffectivePreferences=EffectivePreferences)
+
 
 @public
 @implementer(IMember)
@@ -173,6 +194,7 @@ class Member(Model):
             return ''
 
     def _lookup(self, preference, default=None):
+        # Keep this in sync with join_preferences().
         pref = getattr(self.preferences, preference)
         if pref is not None:
             return pref
@@ -230,6 +252,103 @@ class Member(Model):
         store.delete(self)
 
 
+@public
+def join_preferences(query):
+    """Join a query on members with their addresses and preferences.
+
+    This is the SQL equivalent of `Member._lookup()`.  The delivery address
+    of each member, i.e. the subscribed address or the subscribed user's
+    preferred address, is outer joined as `Address`, along with the
+    membership, address and user preferences.
+
+    :param query: A query on `Member`.
+    :return: The joined query, and a dictionary mapping the names in
+        `PREFERENCES` to SQL expressions for the effective preference, which
+        are NULL when the system or list default applies.
+    """
+    # Avoid circular imports.
+    from mailman.model.user import User
+    member_prefs = aliased(Preferences)
+    address_prefs = aliased(Preferences)
+    user_prefs = aliased(Preferences)
+    subscribed_user = aliased(User)
+    address_user = aliased(User)
+    query = query.outerjoin(
+        member_prefs, Member.preferences_id == member_prefs.id
+        ).outerjoin(
+        subscribed_user, Member.user_id == subscribed_user.id
+        ).outerjoin(
+        Address, Address.id == func.coalesce(
+            Member.address_id, subscribed_user._preferred_address_id)
+        ).outerjoin(
+        address_prefs, Address.preferences_id == address_prefs.id
+        ).outerjoin(
+        address_user, Address.user_id == address_user.id
+        ).outerjoin(
+        user_prefs, address_user.preferences_id == user_prefs.id)
+    columns = {}
+    for name in PREFERENCES:
+        if name == 'preferred_language':
+            name = '_preferred_language'
+        columns[name.lstrip('_')] = func.coalesce(
+            getattr(member_prefs, name),
+            getattr(address_prefs, name),
+            getattr(user_prefs, name))
+    return query, columns
+
+
+@public
+def preference_in(column, name, values):
+    """A filter on an effective preference from `join_preferences()`.
+
+    :param column: The SQL expression for the effective preference.
+    :param name: The name of the preference.
+    :param values: The preference values to select.
+    :return: The SQL filter criterion.
+    """
+    values = list(values)
+    criterion = column.in_(values)
+    if getattr(system_preferences, name) in values:
+        criterion = or_(criterion, column.is_(None))
+    return criterion
+
+
+@public
+def with_preferences(query, columns=None):
+    """Iterate over members along with their effective preferences.
+
+    :param query: A query on `Member`.
+    :param columns: If given, the query has already been passed through
+        `join_preferences()`, and these are the preference expressions it
+        returned.
+    :return: An iterator over (member, `EffectivePreferences`) pairs.
+    """
+    if columns is None:
+        query, columns = join_preferences(query)
+    # Loading the delivery address along with the member means that
+    # `member.address` won't need another query.
+    query = query.add_entity(Address).add_columns(*columns.values())
+    language_manager = getUtility(ILanguageManager)
+    list_languages = {}
+    for member, address, *values in query:
+        preferences = dict(zip(columns, values))
+        for name, value in preferences.items():
+            if name == 'preferred_language':
+                if value is not None:
+                    value = language_manager[value]
+                else:
+                    # Like `Member.preferred_language`, fall back to the
+                    # mailing list's preferred language.
+                    value = list_languages.get(member.list_id)
+                    if value is None:
+                        value = member.mailing_list.preferred_language
+                        list_languages[member.list_id] = value
+            elif value is None:
+                value = getattr(system_preferences, name)
+            preferences[name] = value
+        yield member, EffectivePreferences(**preferences)
+
+
 @public
 @implementer(IMembershipManager)
 class MembershipManager:
@@ -245,31 +364,18 @@ class MembershipManager:
         # could have been reset due to bounce info getting stale. We will send
         # warnings to people who have been disabled already, regardless of
         # their bounce score. Same is true below for removal.
-        query = store.query(
-            Member,
-            MailingList.bounce_you_are_disabled_warnings_interval).join(
+        query = store.query(Member).join(
             MailingList, Member.list_id == MailingList._list_id).join(
             Member.preferences).filter(and_(
                 Member.role == MemberRole.member,
                 MailingList.process_bounces == True,       # noqa: E712
                 Member.total_warnings_sent < MailingList.bounce_you_are_disabled_warnings,  # noqa: E501
-                Preferences.delivery_status == DeliveryStatus.by_bounces))
-
-        # XXX(maxking): This is IMO a query that *should* work, but I haven't
-        # been able to get it to work in my tests. It could be due to lack of
-        # native datetime type in SQLite, which we use for tests. Hence, we are
-        # going to do some filtering in Python, which is inefficient, but
-        # works. We do filter as much as possible in SQL, so hopefully the
-        # output of the above query won't be *too* many.
-        # TODO: Port the Python loop below to SQLAlchemy.
-
-        # (func.DATETIME(Member.last_warning_sent) +
-        # func.DATETIME(MailingList.bounce_you_are_disabled_warnings_interval))
-        # < func.DATETIME(now())))
-
-        for member, interval in query.all():
-            if (member.last_warning_sent + interval) <= now():
-                yield member
+                Preferences.delivery_status == DeliveryStatus.by_bounces,
+                add_interval(
+                    Member.last_warning_sent,
+                    MailingList.bounce_you_are_disabled_warnings_interval
+                    ) <= now()))
+        yield from query.order_by(Member.id).all()
 
     @dbconnection
     def memberships_pending_removal(self, store):
@@ -277,17 +383,30 @@ class MembershipManager:
         from mailman.model.mailinglist import MailingList
         from mailman.model.preferences import Preferences
 
-        query = store.query(
-            Member,
-            MailingList.bounce_you_are_disabled_warnings_interval,
-            MailingList.bounce_you_are_disabled_warnings).join(
+        query = store.query(Member).join(
             MailingList, Member.list_id == MailingList._list_id).join(
             Member.preferences).filter(and_(
                 Member.role == MemberRole.member,
                 MailingList.process_bounces == True,    # noqa: E712
                 Member.total_warnings_sent >= MailingList.bounce_you_are_disabled_warnings,     # noqa: E501
-                Preferences.delivery_status == DeliveryStatus.by_bounces))
+                Preferences.delivery_status == DeliveryStatus.by_bounces,
+                or_(add_interval(
+                        Member.last_warning_sent,
+                        MailingList.bounce_you_are_disabled_warnings_interval
+                        ) <= now(),
+                    MailingList.bounce_you_are_disabled_warnings == 0)))
+        yield from query.order_by(Member.id).all()
 
-        for member, interval, warnings in query.all():
-            if (member.last_warning_sent + interval) <= now() or warnings == 0:
-                yield member
+    @dbconnection
+    def get_preferences(self, store, members):
+        """See `IMembershipManager`."""
+        members = list(members)
+        preferences = {}
+        for start in range(0, len(members), PREFERENCES_CHUNK_SIZE):
+            member_ids = [
+                member.id
+                for member in members[start:start + PREFERENCES_CHUNK_SIZE]
+                ]
+            preferences.update(with_preferences(
+                store.query(Member).filter(Member.id.in_(member_ids))))
+        return preferences
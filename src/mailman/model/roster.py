@@ -23,16 +23,31 @@ moderator, and administrator roster filters.
 """
 
 from enum import Enum
+from itertools import chain
 from mailman.database.transaction import dbconnection
-from mailman.interfaces.member import DeliveryMode, MemberRole
+from mailman.interfaces.member import DeliveryMode, DeliveryStatus, MemberRole
 from mailman.interfaces.roster import IRoster
 from mailman.model.address import Address
-from mailman.model.member import Member
+from mailman.model.member import (
+    join_preferences,
+    Member,
+    preference_in,
+    with_preferences,
+)
+from mailman.model.preferences import Preferences
 from public import public
-from sqlalchemy import or_
+from sqlalchemy import inspect, or_
+from sqlalchemy.event import listen
+from sqlalchemy.orm import Session
+from uuid import uuid4
 from zope.interface import implementer
 
 
+# A per-process cache of each list's regular delivery recipients, keyed by
+# list id.  The values are (roster version, recipients) tuples.
+_recipients_cache = {}
+
+
 @public
 class RosterVisibility(Enum):
     # The member roster is entirely public.
@@ -76,6 +91,10 @@ class AbstractRoster:
         """See `IRoster`."""
         return self._query().count()
 
+    def with_preferences(self):
+        """See `IRoster`."""
+        yield from with_preferences(self._query())
+
     @property
     def users(self):
         """See `IRoster`."""
@@ -209,30 +228,23 @@ class DeliveryMemberRoster(AbstractRoster):
     """Return all the members having a particular kind of delivery."""
 
     role = MemberRole.member
+    # The delivery modes of the members in this roster.
+    delivery_modes = ()
 
-    @property
-    def member_count(self):
-        """See `IRoster`."""
-        # XXX 2012-03-15 BAW: It would be nice to make this more efficient.
-        # The problem is that you'd have to change the loop in _get_members()
-        # checking the delivery mode to a query parameter.
-        return len(tuple(self.members))
+    def _preferences_query(self):
+        # Our members, joined with their effective preferences.
+        query, columns = join_preferences(AbstractRoster._query(self))
+        query = query.filter(preference_in(
+            columns['delivery_mode'], 'delivery_mode', self.delivery_modes))
+        return query, columns
 
-    @dbconnection
-    def _get_members(self, store, *delivery_modes):
-        """The set of members for a mailing list, filter by delivery mode.
+    def _query(self):
+        query, columns = self._preferences_query()
+        return query
 
-        :param delivery_modes: The modes to filter on.
-        :type delivery_modes: sequence of `DeliveryMode`.
-        :return: A generator of members.
-        :rtype: generator
-        """
-        results = store.query(Member).filter_by(
-            list_id=self._mlist.list_id,
-            role=MemberRole.member)
-        for member in results:
-            if member.delivery_mode in delivery_modes:
-                yield member
+    def with_preferences(self):
+        """See `IRoster`."""
+        yield from with_preferences(*self._preferences_query())
 
 
 @public
@@ -240,11 +252,44 @@ class RegularMemberRoster(DeliveryMemberRoster):
     """Return all the regular delivery members of a list."""
 
     name = 'regular_members'
+    delivery_modes = (DeliveryMode.regular,)
 
     @property
-    def members(self):
-        """See `IRoster`."""
-        yield from self._get_members(DeliveryMode.regular)
+    def recipients(self):
+        """The email addresses of the members to deliver postings to.
+
+        These are the regular delivery members whose delivery is enabled.
+        They are calculated with a single query, and cached until the list's
+        roster version changes.
+
+        :rtype: frozenset of str
+        """
+        list_id = self._mlist.list_id
+        # Read the version first, so that a concurrent change can only make
+        # the cached entry look older than it is.
+        version = self._get_version()
+        cached = _recipients_cache.get(list_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        recipients = frozenset(self._get_recipients())
+        _recipients_cache[list_id] = (version, recipients)
+        return recipients
+
+    @dbconnection
+    def _get_version(self, store):
+        # Avoid circular imports.
+        from mailman.model.mailinglist import MailingList
+        return store.query(MailingList._roster_version).filter(
+            MailingList._list_id == self._mlist.list_id).scalar()
+
+    def _get_recipients(self):
+        query, columns = self._preferences_query()
+        query = query.with_entities(Address.email).filter(
+            preference_in(columns['delivery_status'], 'delivery_status',
+                          (DeliveryStatus.enabled,)),
+            Address.email.isnot(None))
+        for email, in query:
+            yield email
 
 
 @public
@@ -252,14 +297,11 @@ class DigestMemberRoster(DeliveryMemberRoster):
     """Return all the regular delivery members of a list."""
 
     name = 'digest_members'
-
-    @property
-    def members(self):
-        """See `IRoster`."""
-        yield from self._get_members(
-            DeliveryMode.plaintext_digests,
-            DeliveryMode.mime_digests,
-            DeliveryMode.summary_digests)
+    delivery_modes = (
+        DeliveryMode.plaintext_digests,
+        DeliveryMode.mime_digests,
+        DeliveryMode.summary_digests,
+        )
 
 
 @public
@@ -303,6 +345,12 @@ class Memberships:
         """See `IRoster`."""
         yield from self._query()
 
+    @dbconnection
+    def with_preferences(self, store):
+        """See `IRoster`."""
+        yield from with_preferences(store.query(Member).filter(
+            Member.id.in_(self._query().with_entities(Member.id))))
+
     @property
     def users(self):
         """See `IRoster`."""
@@ -322,3 +370,95 @@ class Memberships:
     def get_memberships(self, store, address):
         """See `IRoster`."""
         raise NotImplementedError
+
+
+def _has_changes(obj, *names):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+def _bump_roster_versions(session, flush_context, instances):
+    # Give every mailing list whose recipients may be changed by this flush a
+    # new roster version.  Changes to membership rows affect their own list.
+    # Changes to address and user level preferences or links affect the lists
+    # those addresses and users are subscribed to.  Only moving a membership
+    # to another list bumps every list, since the old list is not known.
+    #
+    # Avoid circular imports.
+    from mailman.model.mailinglist import MailingList
+    from mailman.model.user import User
+    list_ids = set()
+    address_ids = set()
+    user_ids = set()
+    preferences_ids = set()
+    everything = False
+    for obj in chain(session.new, session.deleted):
+        if isinstance(obj, Member):
+            list_ids.add(obj.list_id)
+    for obj in session.dirty:
+        if isinstance(obj, Member):
+            if _has_changes(obj, 'list_id'):
+                everything = True
+            elif _has_changes(obj, 'role', '_address', 'address_id', '_user',
+                              'user_id', 'preferences', 'preferences_id'):
+                list_ids.add(obj.list_id)
+        elif isinstance(obj, Preferences):
+            if _has_changes(obj, 'delivery_mode', 'delivery_status'):
+                preferences_ids.add(obj.id)
+        elif isinstance(obj, Address):
+            if _has_changes(obj, 'user', 'user_id', 'preferences'):
+                address_ids.add(obj.id)
+        elif isinstance(obj, User):
+            if _has_changes(obj, 'preferences', '_preferred_address'):
+                user_ids.add(obj.id)
+    if not everything:
+        if address_ids or user_ids or preferences_ids:
+            with session.no_autoflush:
+                list_ids.update(_affected_lists(
+                    session, address_ids, user_ids, preferences_ids))
+        if not list_ids:
+            return
+    table = MailingList.__table__
+    update = table.update().values(roster_version=uuid4())
+    if not everything:
+        update = update.where(table.c.list_id.in_(list_ids))
+    session.execute(update)
+
+
+def _affected_lists(session, address_ids, user_ids, preferences_ids):
+    # Return the list ids of the memberships whose delivery preferences or
+    # delivery address may depend on the given rows, as resolved by
+    # join_preferences().
+    #
+    # Avoid circular imports.
+    from mailman.model.user import User
+    list_ids = set()
+    if preferences_ids:
+        list_ids.update(list_id for list_id, in session.query(
+            Member.list_id).filter(
+                Member.preferences_id.in_(preferences_ids)))
+        address_ids = address_ids | set(address_id for address_id, in (
+            session.query(Address.id).filter(
+                Address.preferences_id.in_(preferences_ids))))
+        user_ids = user_ids | set(user_id for user_id, in (
+            session.query(User.id).filter(
+                User.preferences_id.in_(preferences_ids))))
+    if address_ids:
+        # Members subscribed with the address, or through a user whose
+        # preferred address it is.
+        list_ids.update(list_id for list_id, in session.query(
+            Member.list_id).outerjoin(
+                User, Member.user_id == User.id).filter(or_(
+                    Member.address_id.in_(address_ids),
+                    User._preferred_address_id.in_(address_ids))))
+    if user_ids:
+        # Members subscribed through the user, or with one of its addresses.
+        list_ids.update(list_id for list_id, in session.query(
+            Member.list_id).outerjoin(
+                Address, Member.address_id == Address.id).filter(or_(
+                    Member.user_id.in_(user_ids),
+                    Address.user_id.in_(user_ids))))
+    return list_ids
+
+
+listen(Session, 'before_flush', _bump_roster_versions)
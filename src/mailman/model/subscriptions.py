@@ -25,14 +25,13 @@ from mailman.interfaces.subscriptions import (
     ISubscriptionService,
     TooManyMembersError,
 )
-from mailman.interfaces.usermanager import IUserManager
 from mailman.model.address import Address
-from mailman.model.member import Member
+from mailman.model.member import join_preferences, Member, preference_in
 from mailman.model.user import User
 from mailman.utilities.queries import QuerySequence
-from operator import attrgetter
 from public import public
-from sqlalchemy import or_
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import aliased
 from zope.component import getUtility
 from zope.interface import implementer
 
@@ -47,27 +46,26 @@ class SubscriptionService:
 
     __name__ = 'members'
 
-    def get_members(self):
+    @dbconnection
+    def get_members(self, store):
         """See `ISubscriptionService`."""
-        # {list_id -> {role -> [members]}}
-        by_list = {}
-        user_manager = getUtility(IUserManager)
-        for member in user_manager.members:
-            by_role = by_list.setdefault(member.list_id, {})
-            members = by_role.setdefault(member.role.name, [])
-            members.append(member)
-        # Flatten into single list sorted as per the interface.
-        all_members = []
-        address_of_member = attrgetter('address.email')
-        for list_id in sorted(by_list):
-            by_role = by_list[list_id]
-            all_members.extend(
-                sorted(by_role.get('owner', []), key=address_of_member))
-            all_members.extend(
-                sorted(by_role.get('moderator', []), key=address_of_member))
-            all_members.extend(
-                sorted(by_role.get('member', []), key=address_of_member))
-        return all_members
+        # Members subscribed as a user are sorted by the user's preferred
+        # address.
+        subscribed_user = aliased(User)
+        role_order = case([
+            (Member.role == MemberRole.owner, 0),
+            (Member.role == MemberRole.moderator, 1),
+            ], else_=2)
+        query = store.query(Member).outerjoin(
+            subscribed_user, Member.user_id == subscribed_user.id
+            ).join(
+            Address, Address.id == func.coalesce(
+                Member.address_id, subscribed_user._preferred_address_id)
+            ).filter(
+            Member.role.in_(
+                (MemberRole.owner, MemberRole.moderator, MemberRole.member))
+            ).order_by(Member.list_id, role_order, Address.email, Member.id)
+        return QuerySequence(query)
 
     @dbconnection
     def get_member(self, store, member_id):
@@ -137,22 +135,26 @@ class SubscriptionService:
                 Member.moderation_action == moderation_action)
             q_user = q_user.filter(
                 Member.moderation_action == moderation_action)
+        # The delivery mode and status are preferences, which fall back from
+        # the membership to the address, the user and the system defaults.
+        # Resolve them in the database, so that the results can still be
+        # counted and paginated without loading every member.
+        if delivery_mode is not None or delivery_status is not None:
+            q_prefs, columns = join_preferences(store.query(Member.id))
+            if delivery_mode is not None:
+                q_prefs = q_prefs.filter(preference_in(
+                    columns['delivery_mode'], 'delivery_mode',
+                    [delivery_mode]))
+            if delivery_status is not None:
+                q_prefs = q_prefs.filter(preference_in(
+                    columns['delivery_status'], 'delivery_status',
+                    [delivery_status]))
+            q_prefs = q_prefs.subquery()
+            q_address = q_address.filter(Member.id.in_(q_prefs))
+            q_user = q_user.filter(Member.id.in_(q_prefs))
         # Do a UNION of the two queries, sort the result and generate Members.
-        query = QuerySequence(
+        return QuerySequence(
             q_address.union(q_user).order_by(*order).from_self(Member))
-        # These are python attributes and not actual table colukmsn and hence
-        # their filtering can only be done in Python.
-        if delivery_status or delivery_mode:
-            return self._filter(query, delivery_mode, delivery_status)
-        return query
-
-    def _filter(self, query, delivery_mode, delivery_status):
-        if delivery_mode is not None:
-            query = filter(lambda m: m.delivery_mode == delivery_mode, query)
-        if delivery_status is not None:
-            query = filter(
-                lambda m: m.delivery_status == delivery_status, query)
-        return list(query)
 
     def find_members(self, subscriber=None, list_id=None, role=None,
                      delivery_mode=None, moderation_action=EMPTY,
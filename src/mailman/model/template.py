@@ -17,13 +17,17 @@
 
 """Template management."""
 
+import os
 import logging
 
+from collections import OrderedDict
+from lazr.config import as_timedelta
 from mailman.config import config
 from mailman.database.model import Model
 from mailman.database.transaction import dbconnection
-from mailman.database.types import SAUnicode
+from mailman.database.types import SAUnicode, UUID
 from mailman.interfaces.cache import ICacheManager
+from mailman.interfaces.configuration import ConfigurationUpdatedEvent
 from mailman.interfaces.domain import IDomain
 from mailman.interfaces.mailinglist import IMailingList
 from mailman.interfaces.template import (
@@ -33,6 +37,7 @@ from mailman.interfaces.template import (
     ITemplateManager,
 )
 from mailman.utilities import protocols
+from mailman.utilities.datetime import now
 from mailman.utilities.i18n import find, TemplateNotFoundError
 from mailman.utilities.string import expand
 from public import public
@@ -40,11 +45,13 @@ from requests import HTTPError
 from sqlalchemy import Column, Integer
 from urllib.error import URLError
 from urllib.parse import urlparse
+from uuid import uuid4
 from zope.component import getUtility
 from zope.interface import implementer
 
 
 COMMASPACE = ', '
+MISSING = object()
 log = logging.getLogger('mailman.http')
 
 
@@ -70,6 +77,178 @@ class Template(Model):
         self.password = password
 
 
+class TemplateVersion(Model):
+    """The version of the template settings.
+
+    The version changes whenever a template is set or deleted, so that every
+    process can tell when its template cache is out of date.
+    """
+
+    __tablename__ = 'template_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(UUID, nullable=False)
+
+
+def _bump_version(store):
+    table = TemplateVersion.__table__
+    result = store.execute(table.update().values(version=uuid4()))
+    if result.rowcount == 0:
+        store.execute(table.insert().values(version=uuid4()))
+
+
+@public
+class TemplateCache:
+    """A bounded, in-process cache of template lookups.
+
+    This caches both which template, if any, is set for a name and context,
+    and the contents found at a template's expanded URI or in the file
+    system.  Entries expire after the `[mailman]cache_life`, or the given
+    lifetime, and the least recently used entries are dropped once there are
+    more than
+    `[mailman]template_cache_size` of them.  The whole cache is cleared when
+    the template version in the database changes.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._entries = OrderedDict()
+
+    @dbconnection
+    def validate(self, store):
+        """Clear the cache if any template was set or deleted since."""
+        version = tuple(sorted(
+            version for version, in store.query(TemplateVersion.version)))
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key):
+        """Return the cached value, or `MISSING`."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        expires_on, value = entry
+        if expires_on <= now():
+            del self._entries[key]
+            return MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def add(self, key, value, lifetime=None):
+        """Cache a value.
+
+        :param lifetime: How long to keep the value, as a `cache_life` like
+            string.  The default is the `[mailman]cache_life`.
+        """
+        size = int(config.mailman.template_cache_size)
+        if size <= 0:
+            return
+        if lifetime is None:
+            lifetime = config.mailman.cache_life
+        expires_on = now() + as_timedelta(lifetime)
+        self._entries[key] = (expires_on, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Clear the cache."""
+        self._entries.clear()
+        self._version = None
+
+    @dbconnection
+    def invalidate(self, store):
+        """Invalidate the template caches of all processes.
+
+        Call this after adding or removing template files.
+        """
+        _bump_version(store)
+
+
+template_cache = TemplateCache()
+public(template_cache=template_cache)
+
+
+def _fetch(actual_uri, username, password):
+    # Return the contents at the expanded uri of a template.
+    cache_mgr = getUtility(ICacheManager)
+    contents = cache_mgr.get(actual_uri)
+    if contents is None:
+        # It's likely that the cached contents have expired.
+        auth = {}
+        if username is not None:
+            auth['auth'] = (username, password)
+        try:
+            contents = protocols.get(actual_uri, **auth)
+        except HTTPError as error:
+            # 404/NotFound errors are interpreted as missing templates,
+            # for which we'll return the default (i.e. the empty string).
+            # All other exceptions get passed up the chain.
+            if error.response.status_code != 404:
+                raise
+            log.exception('Cannot retrieve template at {} ({})'.format(
+                actual_uri, auth.get('auth', '<no authorization>')))
+            return None
+        # We don't need to cache mailman: contents since those are already
+        # on the file system.
+        if urlparse(actual_uri).scheme != 'mailman':
+            cache_mgr.add(actual_uri, contents)
+    return contents
+
+
+def _get(store, name, context, kws):
+    # Look up the template, and fetch its contents, through the template
+    # cache, which must be valid.
+    key = ('template', name, context)
+    settings = template_cache.get(key)
+    if settings is MISSING:
+        settings = store.query(
+            Template.uri, Template.username, Template.password).filter(
+                Template.name == name,
+                Template.context == context).one_or_none()
+        if settings is not None:
+            settings = tuple(settings)
+        template_cache.add(key, settings)
+    if settings is None:
+        return None
+    uri, username, password = settings
+    actual_uri = expand(uri, None, kws)
+    # Like the file cache, don't keep the contents of mailman: urls, which
+    # are read from the file system, so that changes to these files are seen
+    # right away.
+    if urlparse(actual_uri).scheme == 'mailman':
+        contents = _fetch(actual_uri, username, password)
+        return '' if contents is None else contents
+    key = ('uri', actual_uri, username, password)
+    contents = template_cache.get(key)
+    if contents is MISSING:
+        contents = _fetch(actual_uri, username, password)
+        if contents is None:
+            # Try again next time, the template may be back by then.
+            return ''
+        template_cache.add(key, contents)
+    return contents
+
+
+def _signature(path):
+    # This changes when the file is changed, replaced, or removed.
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+@public
+def handle_ConfigurationUpdatedEvent(event):
+    if isinstance(event, ConfigurationUpdatedEvent):
+        # The template directories or the cache settings may have changed.
+        template_cache.clear()
+
+
 @public
 @implementer(ITemplateManager)
 class TemplateManager:
@@ -93,39 +272,14 @@ class TemplateManager:
             cache_mgr = getUtility(ICacheManager)
             actual_uri = expand(uri, None)
             cache_mgr.evict(actual_uri)
+        # Invalidate the template cache of every process.
+        _bump_version(store)
 
     @dbconnection
     def get(self, store, name, context, **kws):
         """See `ITemplateManager`."""
-        template = store.query(Template).filter(
-            Template.name == name,
-            Template.context == context).one_or_none()
-        if template is None:
-            return None
-        actual_uri = expand(template.uri, None, kws)
-        cache_mgr = getUtility(ICacheManager)
-        contents = cache_mgr.get(actual_uri)
-        if contents is None:
-            # It's likely that the cached contents have expired.
-            auth = {}
-            if template.username is not None:
-                auth['auth'] = (template.username, template.password)
-            try:
-                contents = protocols.get(actual_uri, **auth)
-            except HTTPError as error:
-                # 404/NotFound errors are interpreted as missing templates,
-                # for which we'll return the default (i.e. the empty string).
-                # All other exceptions get passed up the chain.
-                if error.response.status_code != 404:
-                    raise
-                log.exception('Cannot retrieve template at {} ({})'.format(
-                    actual_uri, auth.get('auth', '<no authorization>')))
-                return ''
-            # We don't need to cache mailman: contents since those are already
-            # on the file system.
-            if urlparse(actual_uri).scheme != 'mailman':
-                cache_mgr.add(actual_uri, contents)
-        return contents
+        template_cache.validate()
+        return _get(store, name, context, kws)
 
     @dbconnection
     def raw(self, store, name, context):
@@ -142,7 +296,8 @@ class TemplateManager:
             Template.context == context).one_or_none()
         if template is not None:
             store.delete(template)
-        # We don't clear the cache entry, we just let it expire.
+            _bump_version(store)
+        # We don't clear the file cache entry, we just let it expire.
 
 
 @public
@@ -150,7 +305,8 @@ class TemplateManager:
 class TemplateLoader:
     """Loader of templates."""
 
-    def get(self, name, context=None, **kws):
+    @dbconnection
+    def get(self, store, name, context=None, **kws):
         """See `ITemplateLoader`."""
         # Gather some additional information based on the context.
         substitutions = {}
@@ -187,10 +343,10 @@ class TemplateLoader:
         # See if there's a cached template registered for this name and
         # context, passing in the url substitutions.  This handles http:,
         # https:, and file: urls.
+        template_cache.validate()
         for lookup_context in lookup_contexts:
             try:
-                contents = getUtility(ITemplateManager).get(
-                    name, lookup_context, **substitutions)
+                contents = _get(store, name, lookup_context, substitutions)
             except (HTTPError, URLError):
                 pass
             else:
@@ -198,13 +354,30 @@ class TemplateLoader:
                     return contents
         # Fallback to searching within the source code.
         code = substitutions.get('language', config.mailman.default_language)
+        # The file found is cached, but checked for changes every time.  A new
+        # file which would take precedence is found once the cache is
+        # invalidated, or after the short `template_search_life`.
+        key = ('file', name, code,
+               None if mlist is None else mlist.list_id,
+               None if mlist is None else mlist.fqdn_listname)
+        entry = template_cache.get(key)
+        if entry is not MISSING:
+            path, signature, contents = entry
+            if _signature(path) == signature:
+                return contents
+        path, contents = self._find(name, mlist, code)
+        template_cache.add(key, (path, _signature(path), contents),
+                           config.mailman.template_search_life)
+        return contents
+
+    def _find(self, name, mlist, code):
         # Find the template, mutating any missing template exception.
         missing = object()
         default_uri = ALL_TEMPLATES.get(name, missing)
         if default_uri is None:
             # Currently default_uri is never None, but leave this in case
             # of a future change.
-            return ''                                       # pragma: nocover
+            return None, ''                                 # pragma: nocover
         elif default_uri is missing:
             raise URLError('No such file')
         try:
@@ -216,6 +389,6 @@ class TemplateLoader:
                 raise                                       # pragma: nocover
             path, fp = find(default_uri, mlist, code)
         try:
-            return fp.read()
+            return path, fp.read()
         finally:
             fp.close()
@@ -20,9 +20,14 @@
 import unittest
 
 from mailman.app.lifecycle import create_list
+from mailman.config import config
 from mailman.interfaces.bans import IBanManager
 from mailman.interfaces.listmanager import IListManager
+from mailman.model.bans import Ban, BanVersion
+from mailman.testing.helpers import LogFileMark
 from mailman.testing.layers import ConfigLayer
+from unittest.mock import patch
+from uuid import uuid4
 from zope.component import getUtility
 
 
@@ -63,3 +68,87 @@ class TestMailingListBans(unittest.TestCase):
         self.assertEqual(
             [self._manager.bans[i].email for i in range(count)],
             ['ant@example.com', 'bee@example.com', 'cat@example.com'])
+
+
+class TestBanIndex(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._mlist = create_list('ant@example.com')
+        self._manager = IBanManager(self._mlist)
+        self._global = IBanManager(None)
+
+    def test_exact_and_pattern_bans(self):
+        self._manager.ban('anne@example.com')
+        self._manager.ban('^.*@example.org')
+        self._global.ban('^bart@')
+        self.assertTrue(self._manager.is_banned('anne@example.com'))
+        self.assertTrue(self._manager.is_banned('cris@EXAMPLE.ORG'))
+        self.assertTrue(self._manager.is_banned('bart@example.net'))
+        self.assertFalse(self._manager.is_banned('dave@example.com'))
+        self.assertFalse(self._global.is_banned('anne@example.com'))
+        self.assertTrue(self._global.is_banned('bart@example.net'))
+
+    def test_version(self):
+        self.assertEqual(self._manager.version, ())
+        self._manager.ban('anne@example.com')
+        version = self._manager.version
+        self.assertEqual(len(version), 1)
+        # Global bans have their own version.
+        self._global.ban('anne@example.com')
+        self.assertEqual(self._manager.version, version)
+        self._manager.unban('anne@example.com')
+        self.assertNotEqual(self._manager.version, version)
+
+    def test_index_is_cached(self):
+        self._manager.ban('^anne@')
+        self._manager.ban('^bart@')
+        self.assertTrue(self._manager.is_banned('anne@example.com'))
+        with patch('mailman.model.bans.combine_patterns') as combine:
+            self.assertTrue(self._manager.is_banned('bart@example.com'))
+            self.assertFalse(self._manager.is_banned('cris@example.com'))
+        combine.assert_not_called()
+
+    def test_unban(self):
+        self._manager.ban('^anne@')
+        self.assertTrue(self._manager.is_banned('anne@example.com'))
+        self._manager.unban('^anne@')
+        self.assertFalse(self._manager.is_banned('anne@example.com'))
+
+    def test_other_process_changes(self):
+        # Another process changing the bans changes their version, which is
+        # all this process sees.
+        self._manager.ban('^anne@')
+        self.assertFalse(self._manager.is_banned('bart@example.com'))
+        config.db.store.add(Ban('^bart@', self._mlist.list_id))
+        self.assertFalse(self._manager.is_banned('bart@example.com'))
+        version = config.db.store.query(BanVersion).filter_by(
+            list_id=self._mlist.list_id).one()
+        version.version = uuid4()
+        self.assertTrue(self._manager.is_banned('bart@example.com'))
+
+    def test_delete_list(self):
+        self._manager.ban('^anne@')
+        self.assertTrue(self._manager.is_banned('anne@example.com'))
+        getUtility(IListManager).delete(self._mlist)
+        self.assertEqual(
+            config.db.store.query(BanVersion).filter_by(
+                list_id='ant.example.com').count(), 0)
+        self.assertFalse(self._manager.is_banned('anne@example.com'))
+
+    def test_uncombinable_patterns(self):
+        # Patterns which can't be combined are matched one by one.
+        self._manager.ban('^(a)\\1@')
+        self._manager.ban('^bart@')
+        self.assertTrue(self._manager.is_banned('aa@example.com'))
+        self.assertTrue(self._manager.is_banned('bart@example.com'))
+        self.assertFalse(self._manager.is_banned('a@example.com'))
+
+    def test_invalid_pattern(self):
+        self._manager.ban('^anne@(')
+        self._manager.ban('^bart@')
+        mark = LogFileMark('mailman.error')
+        self.assertTrue(self._manager.is_banned('bart@example.com'))
+        self.assertFalse(self._manager.is_banned('anne@example.com'))
+        self.assertIn('Invalid ban pattern ^anne@( for ant.example.com',
+                      mark.readline())
@@ -21,6 +21,7 @@ import unittest
 
 from datetime import datetime, timedelta
 from mailman.app.lifecycle import create_list, remove_list
+from mailman.config import config
 from mailman.database.transaction import transaction
 from mailman.interfaces.bounce import (
     BounceContext,
@@ -37,6 +38,7 @@ from mailman.testing.helpers import (
 )
 from mailman.testing.layers import ConfigLayer
 from mailman.utilities.datetime import now
+from unittest.mock import patch
 from zope.component import getUtility
 
 
@@ -344,3 +346,143 @@ Message-Id: <first>
             owner_notif.msg['subject'],
             'anne@example.com unsubscribed from Test mailing list due '
             'to bounces')
+
+
+class TestProcessEvents(unittest.TestCase):
+    """Test processing the bounce events in batches."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._processor = getUtility(IBounceProcessor)
+        self._user_manager = getUtility(IUserManager)
+        with transaction():
+            self._ant = create_list('ant@example.com')
+            self._bee = create_list('bee@example.com')
+            for mlist in (self._ant, self._bee):
+                mlist.send_welcome_message = False
+        self._msg = message_from_string("""\
+From: mail-daemon@example.com
+To: ant-bounces@example.com
+Message-Id: <first>
+
+""")
+
+    def _register(self, mlist, email, context=None):
+        with transaction():
+            self._processor.register(mlist, email, self._msg, context)
+
+    def _subscribe(self, mlist, email):
+        address = self._user_manager.get_address(email)
+        if address is None:
+            address = self._user_manager.create_address(email)
+        with transaction():
+            return mlist.subscribe(address)
+
+    def test_process_events(self):
+        anne = self._subscribe(self._ant, 'anne@example.com')
+        bart = self._subscribe(self._bee, 'bart@example.com')
+        cris = self._subscribe(self._ant, 'cris@example.com')
+        self._register(self._ant, 'anne@example.com')
+        self._register(self._bee, 'bart@example.com')
+        self._register(self._ant, 'cris@example.com', BounceContext.probe)
+        self._register(self._ant, 'dave@example.com')
+        mark = LogFileMark('mailman.bounce')
+        self._processor.process_events(batch_size=3)
+        self.assertEqual(list(self._processor.unprocessed), [])
+        self.assertEqual(anne.bounce_score, 1)
+        self.assertEqual(bart.bounce_score, 1)
+        self.assertEqual(
+            cris.preferences.delivery_status, DeliveryStatus.by_bounces)
+        self.assertIn('Bounce message for a non subscriber: Email '
+                      'dave@example.com is not a subcriber of ant.example.com',
+                      mark.read())
+
+    def test_one_commit_per_batch(self):
+        for email in ('anne@example.com', 'bart@example.com',
+                      'cris@example.com'):
+            self._subscribe(self._ant, email)
+            self._register(self._ant, email)
+        with patch.object(config.db, 'commit',
+                          wraps=config.db.commit) as commit:
+            self._processor.process_events(batch_size=2)
+        self.assertEqual(commit.call_count, 2)
+        self.assertEqual(list(self._processor.unprocessed), [])
+
+    def test_members_looked_up_together(self):
+        for email in ('anne@example.com', 'bart@example.com'):
+            self._subscribe(self._ant, email)
+            self._register(self._ant, email)
+        with patch('mailman.model.roster.AbstractRoster.get_member') as get:
+            self._processor.process_events()
+        get.assert_not_called()
+        self.assertEqual(list(self._processor.unprocessed), [])
+
+    def test_events_for_same_member(self):
+        # Several events for the same member in a batch are scored in order.
+        self._ant.bounce_score_threshold = 2
+        anne = self._subscribe(self._ant, 'anne@example.com')
+        anne.last_bounce_received = now() - timedelta(days=1)
+        anne.bounce_score = 1
+        self._register(self._ant, 'anne@example.com')
+        self._register(self._ant, 'anne@example.com')
+        mark = LogFileMark('mailman.bounce')
+        self._processor.process_events()
+        self.assertEqual(anne.bounce_score, 2)
+        self.assertEqual(
+            anne.preferences.delivery_status, DeliveryStatus.by_bounces)
+        self.assertIn('Residual bounce received for member anne@example.com '
+                      'on list ant.example.com.', mark.read())
+
+    def test_preferred_address_member(self):
+        # Members subscribed through their preferred address are found, and
+        # an explicit subscription of the same address wins.
+        user = self._user_manager.create_user('anne@example.com')
+        address = list(user.addresses)[0]
+        address.verified_on = now()
+        user.preferred_address = address
+        with transaction():
+            by_user = self._ant.subscribe(user)
+            bee_by_user = self._bee.subscribe(user)
+            explicit = self._bee.subscribe(address)
+        self._register(self._ant, 'anne@example.com')
+        self._register(self._bee, 'anne@example.com')
+        self._processor.process_events()
+        self.assertEqual(by_user.bounce_score, 1)
+        self.assertEqual(explicit.bounce_score, 1)
+        self.assertEqual(bee_by_user.bounce_score, 0)
+
+    def test_removed_list(self):
+        self._register(self._ant, 'anne@example.com')
+        self._register(self._ant, 'bart@example.com')
+        remove_list(self._ant)
+        mark = LogFileMark('mailman.bounce')
+        self._processor.process_events()
+        self.assertEqual(list(self._processor.unprocessed), [])
+        self.assertEqual(
+            mark.read().count('Bounce for non-existent list ant.example.com'),
+            2)
+
+    def test_failed_event(self):
+        # An event which can't be processed is logged and left for later,
+        # without losing the other events of its batch.
+        anne = self._subscribe(self._ant, 'anne@example.com')
+        self._subscribe(self._ant, 'bart@example.com')
+        self._register(self._ant, 'bart@example.com')
+        self._register(self._ant, 'anne@example.com')
+        score = self._processor._score
+
+        def failing_score(mlist, member, event):
+            score(mlist, member, event)
+            if event.email == 'bart@example.com':
+                raise RuntimeError('failing')
+
+        mark = LogFileMark('mailman.error')
+        with patch.object(self._processor, '_score', failing_score):
+            self._processor.process_events()
+        self.assertIn('Failed to process bounce event', mark.read())
+        [event] = list(self._processor.unprocessed)
+        self.assertEqual(event.email, 'bart@example.com')
+        bart = self._ant.members.get_member('bart@example.com')
+        self.assertEqual(bart.bounce_score, 0)
+        self.assertEqual(anne.bounce_score, 1)
@@ -274,3 +274,53 @@ class TestListCreation(unittest.TestCase):
         with self.assertRaises(InvalidEmailAddressError) as cm:
             self._manager.create('foo')
         self.assertEqual(cm.exception.email, 'foo')
+
+
+class TestListDirectoryVersion(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._list_manager = getUtility(IListManager)
+        self._ant = create_list('ant@example.com')
+        config.db.store.flush()
+        self._version = self._list_manager.directory_version
+
+    def _assert_changed(self, changed=True):
+        config.db.store.flush()
+        version = self._list_manager.directory_version
+        if changed:
+            self.assertNotEqual(version, self._version)
+        else:
+            self.assertEqual(version, self._version)
+        self._version = version
+
+    def test_list_ids_by_name(self):
+        create_list('bee@example.com')
+        self.assertEqual(self._list_manager.list_ids_by_name, {
+            'ant@example.com': 'ant.example.com',
+            'bee@example.com': 'bee.example.com',
+            })
+
+    def test_list_created_and_deleted(self):
+        self.assertEqual(len(self._version), 1)
+        bee = create_list('bee@example.com')
+        self._assert_changed()
+        self._list_manager.delete(bee)
+        self._assert_changed()
+
+    def test_list_changed(self):
+        self._ant.display_name = 'Ants'
+        self._assert_changed(False)
+        self._ant.mail_host = 'example.org'
+        self._assert_changed()
+
+    def test_domains(self):
+        domain_manager = getUtility(IDomainManager)
+        domain = domain_manager.add('example.net')
+        self._assert_changed()
+        domain.description = 'Nets'
+        self._assert_changed(False)
+        domain.alias_domain = 'x.example.net'
+        self._assert_changed()
+        domain_manager.remove('example.net')
+        self._assert_changed()
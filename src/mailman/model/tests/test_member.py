@@ -19,7 +19,7 @@
 
 import unittest
 
-from datetime import timedelta
+from datetime import datetime, timedelta
 from mailman.app.lifecycle import create_list
 from mailman.interfaces.action import Action
 from mailman.interfaces.member import (
@@ -359,3 +359,34 @@ class TestMembershipManager(unittest.TestCase):
             6, 1, 0, 6, 4, 0,
             4, 0, 0, 4, 0, 0,
             1, [self.bart_member.id])
+
+    def test_warning_interval_boundary(self):
+        # A warning is due exactly one interval after the last one.
+        self._disable_delivery(self.anne_member)
+        self._disable_delivery(self.bart_member)
+        self.anne_member.last_warning_sent = now() - timedelta(days=2)
+        self.bart_member.last_warning_sent = now() - timedelta(
+            days=2) + timedelta(seconds=1)
+        self.assertEqual(
+            [member.id
+             for member in self._mmanager.memberships_pending_warning()],
+            [self.anne_member.id])
+
+    def test_first_warning_is_due(self):
+        # Disabling delivery resets the last warning to the minimal date.
+        self._disable_delivery(self.anne_member)
+        self.anne_member.last_warning_sent = datetime.min
+        self.assertEqual(
+            [member.id
+             for member in self._mmanager.memberships_pending_warning()],
+            [self.anne_member.id])
+
+    def test_removal_without_warnings(self):
+        # Lists which send no warnings remove members right away.
+        self._bestlist.bounce_you_are_disabled_warnings = 0
+        self._disable_delivery(self.anne_member_best)
+        self.anne_member_best.last_warning_sent = now()
+        self.assertEqual(
+            [member.id
+             for member in self._mmanager.memberships_pending_removal()],
+            [self.anne_member_best.id])
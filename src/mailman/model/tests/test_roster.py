@@ -20,12 +20,22 @@
 import unittest
 
 from mailman.app.lifecycle import create_list
+from mailman.config import config
 from mailman.interfaces.address import IAddress
-from mailman.interfaces.member import DeliveryMode, MemberRole
+from mailman.interfaces.member import (
+    DeliveryMode,
+    DeliveryStatus,
+    IMembershipManager,
+    MemberRole,
+)
 from mailman.interfaces.user import IUser
 from mailman.interfaces.usermanager import IUserManager
+from mailman.model.mailinglist import MailingList
 from mailman.testing.helpers import set_preferred
 from mailman.testing.layers import ConfigLayer
+from mailman.utilities.datetime import now
+from unittest.mock import patch
+from uuid import uuid4
 from zope.component import getUtility
 
 
@@ -245,3 +255,242 @@ class TestUserRoster(unittest.TestCase):
         self._mlist.subscribe(self._dave)
         member = self._mlist.members.get_member('bart@example.com')
         self.assertEqual(member.user, self._bart)
+
+
+class TestRecipients(unittest.TestCase):
+    """Test the cached recipients of the regular delivery roster."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._mlist = create_list('ant@example.com')
+        self._user_manager = getUtility(IUserManager)
+        self._anne = self._user_manager.create_address('anne@example.com')
+        self._bart = self._user_manager.create_user('bart@example.com')
+        set_preferred(self._bart)
+        self._cris = self._user_manager.create_address('cris@example.com')
+        self._dave = self._user_manager.create_user('dave@example.com')
+        self._dave.link(self._user_manager.create_address(
+            'dave@example.org'))
+
+    def _expected(self):
+        # The recipients as calculated by the slow, per-member API.
+        return set(
+            member.address.email
+            for member in self._mlist.regular_members.members
+            if member.delivery_status == DeliveryStatus.enabled)
+
+    def test_preference_fallback(self):
+        self._mlist.subscribe(self._anne)
+        self._mlist.subscribe(self._bart)
+        self._mlist.subscribe(self._cris)
+        self._mlist.subscribe(self._dave.addresses[1])
+        self.assertEqual(self._mlist.regular_members.recipients, {
+            'anne@example.com', 'bart@example.com', 'cris@example.com',
+            'dave@example.org'})
+        # A member level preference.
+        self._mlist.members.get_member(
+            'anne@example.com').preferences.delivery_mode = (
+                DeliveryMode.mime_digests)
+        # An address level preference.
+        self._cris.preferences.delivery_status = DeliveryStatus.by_user
+        # A user level preference.
+        self._dave.preferences.delivery_status = DeliveryStatus.by_moderator
+        self.assertEqual(self._mlist.regular_members.recipients,
+                         {'bart@example.com'})
+        self.assertEqual(self._mlist.regular_members.recipients,
+                         self._expected())
+        # The member level preference overrides the user's.
+        self._mlist.members.get_member(
+            'dave@example.org').preferences.delivery_status = (
+                DeliveryStatus.enabled)
+        self.assertEqual(self._mlist.regular_members.recipients,
+                         {'bart@example.com', 'dave@example.org'})
+        self.assertEqual(self._mlist.regular_members.recipients,
+                         self._expected())
+
+    def test_nonmembers_and_owners(self):
+        self._mlist.subscribe(self._anne)
+        self._mlist.subscribe(self._bart, MemberRole.owner)
+        self._mlist.subscribe(self._cris, MemberRole.nonmember)
+        self.assertEqual(self._mlist.regular_members.recipients,
+                         {'anne@example.com'})
+
+    def test_cached(self):
+        self._mlist.subscribe(self._anne)
+        roster = self._mlist.regular_members
+        self.assertEqual(roster.recipients, {'anne@example.com'})
+        with patch.object(roster, '_get_recipients',
+                          side_effect=AssertionError('not cached')):
+            self.assertEqual(roster.recipients, {'anne@example.com'})
+            # Changes which don't affect the recipients keep the cache.
+            self._anne.display_name = 'Anne Person'
+            self._mlist.members.get_member(
+                'anne@example.com').bounce_score = 3
+            self.assertEqual(roster.recipients, {'anne@example.com'})
+
+    def test_other_lists_stay_cached(self):
+        bee = create_list('bee@example.com')
+        self._mlist.subscribe(self._anne)
+        roster = self._mlist.regular_members
+        self.assertEqual(roster.recipients, {'anne@example.com'})
+        bee.subscribe(self._cris)
+        with patch.object(roster, '_get_recipients',
+                          side_effect=AssertionError('not cached')):
+            self.assertEqual(roster.recipients, {'anne@example.com'})
+
+    def test_user_changes_keep_other_lists(self):
+        # User and address level changes only invalidate the lists that the
+        # user or address is subscribed to.
+        bee = create_list('bee@example.com')
+        self._mlist.subscribe(self._anne)
+        bee.subscribe(self._dave.addresses[1])
+        roster = self._mlist.regular_members
+        bee_roster = bee.regular_members
+        version = roster._get_version()
+        bee_version = bee_roster._get_version()
+        self._dave.preferences.delivery_mode = DeliveryMode.mime_digests
+        self.assertEqual(roster._get_version(), version)
+        self.assertNotEqual(bee_roster._get_version(), bee_version)
+        bee_version = bee_roster._get_version()
+        self._dave.link(self._cris)
+        self._bart.preferences.delivery_status = DeliveryStatus.by_user
+        self.assertEqual(roster._get_version(), version)
+        self.assertEqual(bee_roster._get_version(), bee_version)
+
+    def test_invalidated_by_preferred_address_preferences(self):
+        # Members subscribed as a user get the preferences of the user's
+        # preferred address.
+        self._mlist.subscribe(self._bart)
+        roster = self._mlist.regular_members
+        self.assertEqual(roster.recipients, {'bart@example.com'})
+        self._bart.preferred_address.preferences.delivery_status = (
+            DeliveryStatus.by_user)
+        self.assertEqual(roster.recipients, set())
+        self.assertEqual(roster.recipients, self._expected())
+
+    def test_invalidated_by_membership_changes(self):
+        roster = self._mlist.regular_members
+        self.assertEqual(roster.recipients, set())
+        member = self._mlist.subscribe(self._anne)
+        self.assertEqual(roster.recipients, {'anne@example.com'})
+        self._mlist.subscribe(self._bart)
+        self.assertEqual(roster.recipients,
+                         {'anne@example.com', 'bart@example.com'})
+        member.unsubscribe()
+        self.assertEqual(roster.recipients, {'bart@example.com'})
+
+    def test_invalidated_by_preferred_address_change(self):
+        set_preferred(self._dave)
+        self._mlist.subscribe(self._dave)
+        roster = self._mlist.regular_members
+        self.assertEqual(roster.recipients, {'dave@example.com'})
+        address = self._dave.addresses[1]
+        address.verified_on = now()
+        self._dave.preferred_address = address
+        self.assertEqual(roster.recipients, {'dave@example.org'})
+
+    def test_invalidated_by_address_linking(self):
+        self._mlist.subscribe(self._cris)
+        roster = self._mlist.regular_members
+        self.assertEqual(roster.recipients, {'cris@example.com'})
+        self._dave.preferences.delivery_status = DeliveryStatus.by_user
+        self.assertEqual(roster.recipients, {'cris@example.com'})
+        self._dave.link(self._cris)
+        self.assertEqual(roster.recipients, set())
+        self._dave.unlink(self._cris)
+        self.assertEqual(roster.recipients, {'cris@example.com'})
+
+    def test_invalidated_by_other_processes(self):
+        self._mlist.subscribe(self._anne)
+        roster = self._mlist.regular_members
+        self.assertEqual(roster.recipients, {'anne@example.com'})
+        # Simulate another process changing the membership behind our back,
+        # without flushing anything through this session.
+        config.db.store.execute(
+            'UPDATE member SET role = {}'.format(MemberRole.owner.value))
+        self.assertEqual(roster.recipients, {'anne@example.com'})
+        config.db.store.execute(
+            MailingList.__table__.update().values(roster_version=uuid4()))
+        self.assertEqual(roster.recipients, set())
+
+
+class TestWithPreferences(unittest.TestCase):
+    """Test resolving the preferences of a whole roster at once."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._mlist = create_list('ant@example.com')
+        self._mlist.preferred_language = 'fr'
+        user_manager = getUtility(IUserManager)
+        anne = user_manager.create_address('anne@example.com')
+        bart = user_manager.create_user('bart@example.com')
+        set_preferred(bart)
+        cris = user_manager.create_address('cris@example.com')
+        dave = user_manager.create_user('dave@example.com')
+        dave.link(cris)
+        self._members = [
+            self._mlist.subscribe(anne),
+            self._mlist.subscribe(bart),
+            self._mlist.subscribe(cris),
+            self._mlist.subscribe(anne, MemberRole.owner),
+            ]
+        self._members[0].preferences.delivery_mode = DeliveryMode.mime_digests
+        self._members[0].preferences.preferred_language = 'ja'
+        anne.preferences.acknowledge_posts = True
+        anne.preferences.receive_own_postings = True
+        bart.preferences.delivery_status = DeliveryStatus.by_user
+        bart.preferences.preferred_language = 'it'
+        dave.preferences.delivery_mode = DeliveryMode.plaintext_digests
+        dave.preferences.hide_address = False
+        self._members[2].preferences.receive_list_copy = False
+
+    def _check(self, pairs, expected_members):
+        pairs = list(pairs)
+        self.assertEqual(
+            sorted(member.id for member, preferences in pairs),
+            sorted(member.id for member in expected_members))
+        for member, preferences in pairs:
+            for name in preferences._fields:
+                # Not every preference is exposed as a member attribute.
+                expected = (getattr(member, name)
+                            if hasattr(type(member), name)
+                            else member._lookup(name))
+                self.assertEqual(getattr(preferences, name), expected,
+                                 '{} of {}'.format(name, member))
+
+    def test_members(self):
+        self._check(self._mlist.members.with_preferences(),
+                    self._members[:3])
+
+    def test_subscribers(self):
+        self._check(self._mlist.subscribers.with_preferences(),
+                    self._members)
+
+    def test_delivery_rosters(self):
+        self._check(self._mlist.regular_members.with_preferences(),
+                    [self._members[1]])
+        self._check(self._mlist.digest_members.with_preferences(),
+                    [self._members[0], self._members[2]])
+        self.assertEqual(self._mlist.regular_members.member_count, 1)
+        self.assertEqual(self._mlist.digest_members.member_count, 2)
+
+    def test_memberships(self):
+        bee = create_list('bee@example.com')
+        user = getUtility(IUserManager).get_user('dave@example.com')
+        member = bee.subscribe(user.addresses[0])
+        self._check(user.memberships.with_preferences(),
+                    [self._members[2], member])
+
+    def test_list_language_fallback(self):
+        preferences = dict(self._mlist.members.with_preferences())
+        self.assertEqual(
+            preferences[self._members[2]].preferred_language.code, 'fr')
+
+    def test_get_preferences(self):
+        manager = getUtility(IMembershipManager)
+        with patch('mailman.model.member.PREFERENCES_CHUNK_SIZE', 2):
+            preferences = manager.get_preferences(self._members)
+        self.assertEqual(len(preferences), 4)
+        self._check(preferences.items(), self._members)
@@ -43,6 +43,36 @@ class TestSubscriptionService(unittest.TestCase):
         self._user_manager = getUtility(IUserManager)
         self._service = getUtility(ISubscriptionService)
 
+    def test_get_members(self):
+        # Members are sorted by list, role and address, where members
+        # subscribed as a user are sorted by the user's preferred address.
+        # Nonmembers are not included.
+        bee = create_list('bee@example.com')
+        anne = self._user_manager.create_user('anne@example.com')
+        set_preferred(anne)
+        bart = self._user_manager.create_address('bart@example.com')
+        cris = self._user_manager.create_address('cris@example.com')
+        bee.subscribe(cris)
+        self._mlist.subscribe(cris)
+        self._mlist.subscribe(anne)
+        self._mlist.subscribe(bart, MemberRole.owner)
+        self._mlist.subscribe(cris, MemberRole.moderator)
+        self._mlist.subscribe(bart, MemberRole.nonmember)
+        members = self._service.get_members()
+        self.assertEqual(len(members), 5)
+        self.assertEqual(
+            [(member.list_id, member.role, member.address.email)
+             for member in members],
+            [('bee.example.com', MemberRole.member, 'cris@example.com'),
+             ('test.example.com', MemberRole.owner, 'bart@example.com'),
+             ('test.example.com', MemberRole.moderator, 'cris@example.com'),
+             ('test.example.com', MemberRole.member, 'anne@example.com'),
+             ('test.example.com', MemberRole.member, 'cris@example.com'),
+             ])
+        self.assertEqual(
+            [member.address.email for member in members[3:]],
+            ['anne@example.com', 'cris@example.com'])
+
     def test_find_member_address_no_user(self):
         # Find address-based memberships when no user is linked to the address.
         address = self._user_manager.create_address(
@@ -617,3 +647,51 @@ class TestSubscriptionService(unittest.TestCase):
             delivery_status=DeliveryStatus.by_user)
         self.assertEqual(len(members), 1)
         self.assertEqual(members[0].address, anne)
+
+    def test_find_members_by_user_preferences(self):
+        # The delivery preferences of users fall back to the user's own
+        # preferences, whether the user or one of its addresses is subscribed.
+        anne = self._user_manager.create_user('anne@example.com')
+        set_preferred(anne)
+        anne.preferences.delivery_mode = DeliveryMode.mime_digests
+        bart = self._user_manager.create_user('bart@example.com')
+        bart_address = set_preferred(bart)
+        bart.preferences.delivery_mode = DeliveryMode.mime_digests
+        self._mlist.subscribe(anne)
+        self._mlist.subscribe(bart_address)
+        self._mlist.subscribe(bart_address, MemberRole.moderator)
+        self._mlist.subscribe(
+            self._user_manager.create_address('cris@example.com'))
+        members = self._service.find_members(
+            delivery_mode=DeliveryMode.mime_digests)
+        self.assertEqual(
+            [(member.address.email, member.role) for member in members],
+            [('anne@example.com', MemberRole.member),
+             ('bart@example.com', MemberRole.member),
+             ('bart@example.com', MemberRole.moderator)])
+        members = self._service.find_members(
+            role=MemberRole.member, delivery_mode=DeliveryMode.mime_digests)
+        self.assertEqual(
+            [member.address.email for member in members],
+            ['anne@example.com', 'bart@example.com'])
+        members = self._service.find_members(
+            delivery_mode=DeliveryMode.regular,
+            delivery_status=DeliveryStatus.enabled)
+        self.assertEqual(
+            [member.address.email for member in members],
+            ['cris@example.com'])
+
+    def test_find_members_by_preferences_paginated(self):
+        # Filtering on preferences still lets the results be counted and
+        # sliced in the database.
+        for name in ('anne', 'bart', 'cris', 'dave'):
+            member = self._mlist.subscribe(
+                self._user_manager.create_address(
+                    '{}@example.com'.format(name)))
+            member.preferences.delivery_status = DeliveryStatus.by_bounces
+        members = self._service.find_members(
+            delivery_status=DeliveryStatus.by_bounces)
+        self.assertEqual(len(members), 4)
+        self.assertEqual(
+            [member.address.email for member in members[1:3]],
+            ['bart@example.com', 'cris@example.com'])
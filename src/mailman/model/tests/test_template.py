@@ -17,6 +17,7 @@
 
 """Test the template manager."""
 
+import os
 import unittest
 import threading
 
@@ -24,10 +25,13 @@ from contextlib import ExitStack
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from mailman.app.lifecycle import create_list
 from mailman.config import config
+from mailman.interfaces.cache import ICacheManager
 from mailman.interfaces.domain import IDomainManager
 from mailman.interfaces.template import ITemplateLoader, ITemplateManager
-from mailman.testing.helpers import wait_for_webservice
+from mailman.model.template import template_cache
+from mailman.testing.helpers import configuration, wait_for_webservice
 from mailman.testing.layers import ConfigLayer
+from mailman.utilities.datetime import factory
 from mailman.utilities.i18n import find
 from requests import HTTPError
 from tempfile import TemporaryDirectory
@@ -308,6 +312,140 @@ class TestTemplateLoader(unittest.TestCase):
         self.assertRaises(URLError, self._loader.get, 'forbidden', self._mlist)
 
 
+class TestInProcessCache(unittest.TestCase):
+    """Test the in-process cache of template lookups."""
+
+    layer = HTTPLayer
+
+    def setUp(self):
+        self._mlist = create_list('test@example.com')
+        self._loader = getUtility(ITemplateLoader)
+        self._manager = getUtility(ITemplateManager)
+        self._manager.set(
+            'list:user:notice:welcome', 'test.example.com',
+            'http://localhost:8180/welcome_${number}.txt')
+
+    def _get(self, number='1'):
+        return self._loader.get(
+            'list:user:notice:welcome', self._mlist, number=number)
+
+    def test_cached(self):
+        self.assertEqual(self._get(), WELCOME_1)
+        with mock.patch('mailman.model.template.protocols.get') as get:
+            self.assertEqual(self._get(), WELCOME_1)
+            # Different substitutions expand to a different uri.
+            get.return_value = 'Another welcome'
+            self.assertEqual(self._get('2'), 'Another welcome')
+        self.assertEqual(get.call_count, 1)
+
+    def test_file_system_fallback(self):
+        content = self._loader.get('list:member:regular:footer', self._mlist)
+        with mock.patch('mailman.model.template.find', wraps=find) as finder:
+            self.assertEqual(
+                self._loader.get('list:member:regular:footer', self._mlist),
+                content)
+        finder.assert_not_called()
+
+    def test_set_invalidates(self):
+        self.assertEqual(self._get(), WELCOME_1)
+        self._manager.set(
+            'list:user:notice:welcome', 'test.example.com',
+            'http://localhost:8180/welcome_2.txt')
+        self.assertEqual(self._get(), WELCOME_2)
+        self._manager.delete('list:user:notice:welcome', 'test.example.com')
+        content = self._get()
+        self.assertNotIn(content, (WELCOME_1, WELCOME_2))
+
+    def test_other_process(self):
+        # Another process setting a template, or adding template files, bumps
+        # the version in the database, which clears the cache.
+        self.assertEqual(self._get(), WELCOME_1)
+        template_cache.invalidate()
+        with mock.patch('mailman.model.template.find', wraps=find) as finder:
+            self._loader.get('list:member:regular:footer', self._mlist)
+        self.assertTrue(finder.called)
+
+    def test_file_changed(self):
+        # Changes to template files are seen right away.
+        tempdir = TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        site_dir = os.path.join(tempdir.name, 'site', 'en')
+        os.makedirs(site_dir)
+        footer_path = os.path.join(site_dir, 'list:member:regular:footer.txt')
+        with open(footer_path, 'w', encoding='utf-8') as fp:
+            fp.write('Old footer')
+        with configuration('paths.testing', template_dir=tempdir.name):
+            self.assertEqual(
+                self._loader.get('list:member:regular:footer', self._mlist),
+                'Old footer')
+            with open(footer_path, 'w', encoding='utf-8') as fp:
+                fp.write('The new footer')
+            self.assertEqual(
+                self._loader.get('list:member:regular:footer', self._mlist),
+                'The new footer')
+
+    def test_new_file(self):
+        # A new file overriding the cached one is found after a short while.
+        tempdir = TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.addCleanup(factory.reset)
+        site_dir = os.path.join(tempdir.name, 'site', 'en')
+        list_dir = os.path.join(
+            tempdir.name, 'lists', 'test.example.com', 'en')
+        os.makedirs(site_dir)
+        os.makedirs(list_dir)
+        name = 'list:member:regular:footer.txt'
+        with open(os.path.join(site_dir, name), 'w', encoding='utf-8') as fp:
+            fp.write('Site footer')
+        with configuration('paths.testing', template_dir=tempdir.name):
+            self.assertEqual(
+                self._loader.get('list:member:regular:footer', self._mlist),
+                'Site footer')
+            with open(os.path.join(list_dir, name), 'w',
+                      encoding='utf-8') as fp:
+                fp.write('List footer')
+            self.assertEqual(
+                self._loader.get('list:member:regular:footer', self._mlist),
+                'Site footer')
+            factory.fast_forward(days=1)
+            self.assertEqual(
+                self._loader.get('list:member:regular:footer', self._mlist),
+                'List footer')
+
+    def test_lifetime(self):
+        self.assertEqual(self._get(), WELCOME_1)
+        self.addCleanup(factory.reset)
+        with configuration('mailman', cache_life='1d'):
+            factory.fast_forward(days=2)
+            with mock.patch('mailman.model.template.protocols.get') as get:
+                get.return_value = 'Expired'
+                # The file cache doesn't expire its entries by itself.
+                getUtility(ICacheManager).clear()
+                self.assertEqual(self._get(), 'Expired')
+
+    @configuration('mailman', template_cache_size=4)
+    def test_bounded(self):
+        self.assertEqual(self._get('1'), WELCOME_1)
+        # Looking up the footer takes four entries: one for each of the three
+        # contexts, and one for the contents found in the file system.
+        self._loader.get('list:member:regular:footer', self._mlist)
+        with mock.patch('mailman.model.template.find', wraps=find) as finder:
+            self._loader.get('list:member:regular:footer', self._mlist)
+        finder.assert_not_called()
+        # So the welcome message was evicted.
+        getUtility(ICacheManager).clear()
+        with mock.patch('mailman.model.template.protocols.get') as get:
+            get.return_value = 'Evicted'
+            self.assertEqual(self._get('1'), 'Evicted')
+
+    @configuration('mailman', template_cache_size=0)
+    def test_disabled(self):
+        self._loader.get('list:member:regular:footer', self._mlist)
+        with mock.patch('mailman.model.template.find', wraps=find) as finder:
+            self._loader.get('list:member:regular:footer', self._mlist)
+        self.assertTrue(finder.called)
+
+
 # Response texts.
 WELCOME_1 = """\
 Welcome to the {fqdn_listname} mailing list!
@@ -136,3 +136,16 @@ class TestUserManager(unittest.TestCase):
         # search by display name again case insensitive.
         results = list(self._usermanager.find_users('pERSON'))
         self.assertEqual(len(results), 2)
+
+    def test_addresses_sorted_by_original_email(self):
+        self._usermanager.create_address('cris@example.com')
+        self._usermanager.create_address('Anne@example.com')
+        self._usermanager.create_address('bart@example.com')
+        addresses = self._usermanager.addresses
+        self.assertEqual(len(addresses), 3)
+        self.assertEqual(
+            [address.original_email for address in addresses],
+            ['Anne@example.com', 'bart@example.com', 'cris@example.com'])
+        self.assertEqual(
+            [address.original_email for address in addresses[1:]],
+            ['bart@example.com', 'cris@example.com'])
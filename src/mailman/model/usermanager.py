@@ -28,7 +28,7 @@ from mailman.model.preferences import Preferences
 from mailman.model.user import User
 from mailman.utilities.queries import QuerySequence
 from public import public
-from sqlalchemy import or_
+from sqlalchemy import func, or_
 from zope.interface import implementer
 
 
@@ -147,7 +147,8 @@ class UserManager:
     @dbconnection
     def addresses(self, store):
         """See `IUserManager`."""
-        yield from store.query(Address).all()
+        return QuerySequence(store.query(Address).order_by(
+            func.coalesce(Address._original, Address.email), Address.id))
 
     @property
     @dbconnection
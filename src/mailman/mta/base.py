@@ -17,22 +17,167 @@
 
 """Base delivery class."""
 
-import copy
 import socket
 import logging
 import smtplib
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.generator import Generator
+from email.utils import _sanitize
+from io import StringIO
 from lazr.config import as_boolean
 from mailman.config import config
 from mailman.interfaces.mta import IMailTransportAgentDelivery
 from mailman.mta.connection import as_SecureMode, Connection
 from public import public
+from queue import Queue
+from threading import Lock
 from zope.interface import implementer
 
 
 log = logging.getLogger('mailman.smtp')
 
 
+class SharedPartsGenerator(Generator):
+    """A generator which flattens shared message parts only once.
+
+    The parts whose ids are in `shared` are assumed not to change while the
+    cache is in use, so their flattened text is remembered in `cache` and
+    reused verbatim the next time they are seen, possibly inside another
+    message.
+    """
+
+    def __init__(self, outfp, *args, shared, cache, **kws):
+        super().__init__(outfp, *args, **kws)
+        self._shared = shared
+        self._cache = cache
+
+    def clone(self, fp):
+        return self.__class__(
+            fp, self._mangle_from_, None,
+            policy=self.policy, shared=self._shared, cache=self._cache)
+
+    def flatten(self, msg, unixfrom=False, linesep=None):
+        if id(msg) not in self._shared:
+            super().flatten(msg, unixfrom, linesep)
+            return
+        key = (id(msg), unixfrom, linesep)
+        text = self._cache.get(key)
+        if text is None:
+            fp = self._fp
+            self._fp = buffer = self._new_buffer()
+            try:
+                super().flatten(msg, unixfrom, linesep)
+            finally:
+                self._fp = fp
+            text = self._cache[key] = buffer.getvalue()
+        self.write(text)
+
+
+def copy_on_write(msg):
+    """Return a copy of the message which shares its subparts.
+
+    The copy has its own list of headers and its own list of subparts, so
+    headers can be changed, and subparts added or removed, without affecting
+    the original.  The subparts themselves are shared and must not be
+    changed in place.
+    """
+    # Don't use copy.copy() since Message.__setstate__() would make the copy
+    # share the original's __dict__.
+    message_copy = msg.__class__.__new__(msg.__class__)
+    message_copy.__dict__ = msg.__dict__.copy()
+    message_copy._headers = list(msg._headers)
+    if isinstance(msg._payload, list):
+        message_copy._payload = list(msg._payload)
+    return message_copy
+
+
+@public
+class DeliveryPool:
+    """The delivery threads of a process, and their connections to the MTA.
+
+    They are created on first use, and shared by all the parallel deliveries
+    of the process, so that the connections, and their TLS and
+    authentication, are reused from one message to the next.  Each
+    connection reconnects by itself after `max_sessions_per_connection`
+    sessions or an SMTP error.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._executor = None
+        self._threads = 0
+        self._connections = []
+        # The connections which are not being used by a worker thread.
+        self._idle = None
+
+    def start(self, threads, make_connection):
+        """Make sure the pool is running with the given number of threads.
+
+        :param threads: The number of threads and connections.
+        :type threads: int
+        :param make_connection: Called to create each connection.
+        :type make_connection: callable
+        """
+        with self._lock:
+            if self._executor is not None and self._threads == threads:
+                return
+        self.close()
+        with self._lock:
+            self._connections = [make_connection() for i in range(threads)]
+            self._idle = Queue()
+            for connection in self._connections:
+                self._idle.put(connection)
+            self._threads = threads
+            self._executor = ThreadPoolExecutor(
+                max_workers=threads, thread_name_prefix='smtp-delivery')
+
+    def submit(self, function, *args):
+        """Call the function in a worker thread, with a connection.
+
+        :param function: Called with a connection to the MTA and `args`.
+        :type function: callable
+        :return: The future of the call.
+        :rtype: `concurrent.futures.Future`
+        """
+        return self._executor.submit(self._call, function, args)
+
+    def _call(self, function, args):
+        connection = self._idle.get()
+        try:
+            return function(connection, *args)
+        finally:
+            self._idle.put(connection)
+
+    def disconnect(self):
+        """Close the connections, which reconnect when they are used again.
+
+        This must not be called while a delivery is in progress.
+        """
+        with self._lock:
+            for connection in self._connections:
+                connection.quit()
+
+    def close(self):
+        """Stop the threads and close the connections."""
+        with self._lock:
+            if self._executor is None:
+                return
+            self._executor.shutdown()
+            for connection in self._connections:
+                connection.quit()
+            self._executor = None
+            self._threads = 0
+            self._connections = []
+            self._idle = None
+
+
+delivery_pool = DeliveryPool()
+public(delivery_pool=delivery_pool)
+
+
 @public
 @implementer(IMailTransportAgentDelivery)
 class BaseDelivery:
@@ -40,7 +185,16 @@ class BaseDelivery:
 
     def __init__(self):
         """Create a basic deliverer."""
-        self._connection = Connection(
+        self._connection = self._make_connection()
+        self._max_threads = int(config.mta.max_delivery_threads)
+        # While delivering in parallel, these hold the futures of the SMTP
+        # transactions submitted to the delivery pool, and the refusals
+        # collected so far.
+        self._futures = None
+        self._refused = None
+
+    def _make_connection(self):
+        return Connection(
             config.mta.smtp_host, int(config.mta.smtp_port),
             int(config.mta.max_sessions_per_connection),
             config.mta.smtp_user if config.mta.smtp_user else None,
@@ -50,6 +204,38 @@ class BaseDelivery:
             as_boolean(config.mta.smtp_verify_hostname),
             )
 
+    @contextmanager
+    def _parallel_delivery(self, refused):
+        """Send the SMTP transactions started in this context in parallel.
+
+        When `max_delivery_threads` is greater than one, the SMTP
+        transactions of `_deliver_to_recipients()` calls made inside this
+        context are handed off to the process's `delivery_pool` of that many
+        threads, each with its own connection to the MTA.  The message is
+        still prepared in the calling thread, so that no database access
+        happens in the workers.  On exit, all transactions have completed
+        and their refusals have been added to `refused`.  The pool's
+        connections stay open for the next delivery.
+
+        :param refused: The dictionary of refused recipients to update.
+        :type refused: dictionary
+        """
+        if self._max_threads <= 1 or self._futures is not None:
+            yield
+            return
+        delivery_pool.start(self._max_threads, self._make_connection)
+        self._futures = deque()
+        self._refused = refused
+        try:
+            yield
+        finally:
+            try:
+                for future in self._futures:
+                    refused.update(future.result())
+            finally:
+                self._futures = None
+                self._refused = None
+
     def _deliver_to_recipients(self, mlist, msg, msgdata, recipients):
         """Low-level delivery to a set of recipients.
 
@@ -61,7 +247,9 @@ class BaseDelivery:
         :type msgdata: dictionary
         :param recipients: The recipients of this message.
         :type recipients: sequence
-        :return: delivery failures as defined by `smtplib.SMTP.sendmail`
+        :return: delivery failures as defined by `smtplib.SMTP.sendmail`.
+            When delivering in parallel, the failures are collected by
+            `_parallel_delivery()` instead and this is always empty.
         :rtype: dictionary
         """
         # Do the actual sending.
@@ -69,9 +257,26 @@ class BaseDelivery:
         message_id = msg['message-id']
         # Since the recipients can be a set or a list, sort the recipients by
         # email address for predictability and testability.
+        recipients = sorted(recipients)
+        msgtext = self._flatten(msg)
+        if self._futures is not None:
+            # Don't let the prepared messages pile up in memory faster than
+            # the worker threads can send them.
+            while len(self._futures) >= 2 * self._max_threads:
+                self._refused.update(self._futures.popleft().result())
+            self._futures.append(delivery_pool.submit(
+                self._sendmail, message_id, sender, recipients, msgtext))
+            return {}
+        return self._sendmail(
+            self._connection, message_id, sender, recipients, msgtext)
+
+    def _flatten(self, msg):
+        """Return the message text to send."""
+        return msg.as_string()
+
+    def _sendmail(self, connection, message_id, sender, recipients, msgtext):
         try:
-            refused = self._connection.sendmail(
-                sender, sorted(recipients), msg.as_string())
+            refused = connection.sendmail(sender, recipients, msgtext)
         except smtplib.SMTPRecipientsRefused as error:
             log.error('%s recipients refused: %s', message_id, error)
             refused = error.recipients
@@ -131,12 +336,38 @@ class IndividualDelivery(BaseDelivery):
     The core concept here is that for each recipient, the deliver() method
     iterates over the list of registered callbacks, each of which have a
     chance to modify the message before final delivery.
+
+    The callbacks get a copy of the message which shares its subparts with
+    the original message, and the shared subparts are only flattened once for
+    all the recipients.  The callbacks may change the copy's headers and
+    replace or extend its payload, but they must not change the subparts in
+    place.
     """
 
     def __init__(self):
         """See `BaseDelivery`."""
         super().__init__()
         self.callbacks = []
+        # While delivering, the ids of the original message's subparts and
+        # their flattened texts.
+        self._shared = None
+        self._cache = None
+
+    def _flatten(self, msg):
+        """See `BaseDelivery`."""
+        if self._shared is None:
+            return super()._flatten(msg)
+        # Do what Message.as_string() does, but with the caching generator.
+        fp = StringIO()
+        generator = SharedPartsGenerator(
+            fp, mangle_from_=False, maxheaderlen=0, policy=msg.policy,
+            shared=self._shared, cache=self._cache)
+        try:
+            generator.flatten(msg)
+        except (KeyError, LookupError, UnicodeEncodeError):
+            # Let the Message class deal with these.
+            return super()._flatten(msg)
+        return _sanitize(fp.getvalue())
 
     def deliver(self, mlist, msg, msgdata):
         """See `IMailTransportAgentDelivery`.
@@ -146,26 +377,36 @@ class IndividualDelivery(BaseDelivery):
         in bounce processing.
         """
         refused = {}
-        recipients = msgdata.get('recipients', set())
-        for recipient in recipients:
-            log.debug('IndividualDelivery to: %s', recipient)
-            # Make a copy of the original messages and operator on it, since
-            # we're going to munge it repeatedly for each recipient.
-            message_copy = copy.deepcopy(msg)
-            msgdata_copy = msgdata.copy()
-            # Squirrel the current recipient away in the message metadata.
-            # That way the subclass's _get_sender() override can encode the
-            # recipient address in the sender, e.g. for VERP.
-            msgdata_copy['recipient'] = recipient
-            # See if the recipient is a member of the mailing list, and if so,
-            # squirrel this information away for use by other modules, such as
-            # the header/footer decorator.  XXX 2012-03-05 this is probably
-            # highly inefficient on the database.
-            member = mlist.members.get_member(recipient)
-            msgdata_copy['member'] = member
-            for callback in self.callbacks:
-                callback(mlist, message_copy, msgdata_copy)
-            status = self._deliver_to_recipients(
-                mlist, message_copy, msgdata_copy, [recipient])
-            refused.update(status)
+        self._shared = set(id(part) for part in msg.walk() if part is not msg)
+        self._cache = {}
+        try:
+            self._deliver_individually(mlist, msg, msgdata, refused)
+        finally:
+            self._shared = None
+            self._cache = None
         return refused
+
+    def _deliver_individually(self, mlist, msg, msgdata, refused):
+        recipients = msgdata.get('recipients', set())
+        with self._parallel_delivery(refused):
+            for recipient in recipients:
+                log.debug('IndividualDelivery to: %s', recipient)
+                # Make a copy of the original messages and operator on it,
+                # since we're going to munge it repeatedly for each recipient.
+                message_copy = copy_on_write(msg)
+                msgdata_copy = msgdata.copy()
+                # Squirrel the current recipient away in the message metadata.
+                # That way the subclass's _get_sender() override can encode
+                # the recipient address in the sender, e.g. for VERP.
+                msgdata_copy['recipient'] = recipient
+                # See if the recipient is a member of the mailing list, and if
+                # so, squirrel this information away for use by other modules,
+                # such as the header/footer decorator.  XXX 2012-03-05 this is
+                # probably highly inefficient on the database.
+                member = mlist.members.get_member(recipient)
+                msgdata_copy['member'] = member
+                for callback in self.callbacks:
+                    callback(mlist, message_copy, msgdata_copy)
+                status = self._deliver_to_recipients(
+                    mlist, message_copy, msgdata_copy, [recipient])
+                refused.update(status)
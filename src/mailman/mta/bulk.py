@@ -101,8 +101,9 @@ class BulkDelivery(BaseDelivery, DecoratingMixin, ARCSigningMixin):
         self.decorate(mlist, msg, msgdata)
         self.arc_sign(mlist, msg, msgdata)
         refused = {}
-        for recipients in self.chunkify(msgdata.get('recipients', set())):
-            chunk_refused = self._deliver_to_recipients(
-                mlist, msg, msgdata, recipients)
-            refused.update(chunk_refused)
+        with self._parallel_delivery(refused):
+            for recipients in self.chunkify(msgdata.get('recipients', set())):
+                chunk_refused = self._deliver_to_recipients(
+                    mlist, msg, msgdata, recipients)
+                refused.update(chunk_refused)
         return refused
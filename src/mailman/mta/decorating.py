@@ -18,6 +18,7 @@
 """Individualized delivery with header/footer decorations."""
 
 from mailman.config import config
+from mailman.handlers.decorate import Decorations
 from mailman.mta.verp import VERPDelivery
 from public import public
 
@@ -26,8 +27,23 @@ from public import public
 class DecoratingMixin:
     """Decorate a message with recipient-specific headers and footers."""
 
+    # While delivering a message individually, its decorations.
+    _decorations = None
+
+    def deliver(self, mlist, msg, msgdata):
+        """See `IMailTransportAgentDelivery`."""
+        # The parts of the decorations which are the same for every recipient
+        # are only calculated once.
+        self._decorations = Decorations(mlist, msg, msgdata)
+        try:
+            return super().deliver(mlist, msg, msgdata)
+        finally:
+            self._decorations = None
+
     def decorate(self, mlist, msg, msgdata):
         """Add recipient-specific headers and footers."""
+        if self._decorations is not None:
+            msgdata['decorations'] = self._decorations
         decorator = config.handlers['decorate']
         decorator.process(mlist, msg, msgdata)
         # Do not decorate a message more than once.
@@ -18,6 +18,7 @@
 """Test various aspects of email delivery."""
 
 import os
+import copy
 import shutil
 import tempfile
 import unittest
@@ -25,8 +26,10 @@ import unittest
 from email.header import make_header
 from mailman.app.lifecycle import create_list
 from mailman.config import config
+from mailman.handlers.decorate import _list_substitutions
 from mailman.interfaces.mailinglist import Personalization
 from mailman.interfaces.template import ITemplateManager
+from mailman.mta.base import delivery_pool
 from mailman.mta.bulk import BulkDelivery
 from mailman.mta.deliver import Deliver
 from mailman.testing.helpers import (
@@ -36,6 +39,7 @@ from mailman.testing.helpers import (
 )
 from mailman.testing.layers import ConfigLayer, SMTPLayer
 from mailman.utilities.modules import find_name
+from smtplib import SMTPRecipientsRefused
 from unittest.mock import patch
 from zope.component import getUtility
 
@@ -55,6 +59,14 @@ class DeliverTester(Deliver):
         return []
 
 
+# This one captures the flattened text which would be sent to the MTA.
+class FlatteningDeliverTester(Deliver):
+    def _sendmail(self, connection, message_id, sender, recipients, msgtext):
+        _deliveries.append((recipients, msgtext))
+        # Nothing gets refused.
+        return {}
+
+
 # We also need to test that BulkDeliver does decoration.
 class BulkDeliverTester(BulkDelivery):
     def _deliver_to_recipients(self, mlist, msg, msgdata, recipients):
@@ -178,6 +190,80 @@ name     : Anne Person
 
 """)
 
+    def test_decoration_shared(self):
+        # The substitutions which are the same for all recipients are only
+        # calculated once per message.
+        subscribe(self._mlist, 'Bart', email='bart@example.org')
+        msgdata = dict(recipients=['anne@example.org', 'bart@example.org'])
+        with patch('mailman.handlers.decorate._list_substitutions',
+                   wraps=_list_substitutions) as substitutions:
+            DeliverTester().deliver(self._mlist, self._msg, msgdata)
+        substitutions.assert_called_once_with(self._mlist)
+        footers = sorted(
+            _msg.get_payload().splitlines()[1]
+            for _mlist, _msg, _msgdata, _recipients in _deliveries)
+        self.assertEqual(footers, [
+            'address  : anne@example.org',
+            'address  : bart@example.org',
+            ])
+        # The decorations are forgotten after the delivery.
+        DeliverTester().deliver(self._mlist, self._msg, msgdata)
+        self.assertEqual(len(_deliveries), 4)
+
+    def _flattened(self, msg, recipients):
+        del _deliveries[:]
+        msgdata = dict(recipients=recipients)
+        refused = FlatteningDeliverTester().deliver(self._mlist, msg, msgdata)
+        self.assertEqual(len(refused), 0)
+        return sorted(_deliveries)
+
+    def _check_rendering(self, msg):
+        recipients = ['anne@example.org', 'bart@example.org']
+        self._mlist.personalize = Personalization.full
+        # Sharing the original message's subparts between the recipients'
+        # messages gives exactly the same text as deep copying the original
+        # message for every recipient.
+        shared = self._flattened(msg, recipients)
+        with patch('mailman.mta.base.copy_on_write', copy.deepcopy), \
+                patch.object(FlatteningDeliverTester, '_flatten',
+                             BulkDelivery._flatten):
+            copied = self._flattened(msg, recipients)
+        self.assertEqual(len(shared), 2)
+        self.assertEqual(shared, copied)
+        return shared
+
+    def test_rendering_text(self):
+        shared = self._check_rendering(self._msg)
+        self.assertIn('name     : Anne Person', shared[0][1])
+        self.assertNotIn('Anne Person', shared[1][1])
+
+    def test_rendering_multipart(self):
+        msg = mfs("""\
+From: anne@example.org
+To: test@example.com
+Subject: test
+MIME-Version: 1.0
+Content-Type: multipart/mixed; boundary="AAA"
+
+--AAA
+Content-Type: text/plain; charset="utf-8"
+Content-Transfer-Encoding: 8bit
+
+Caf\xe9
+--AAA
+Content-Type: application/octet-stream
+Content-Transfer-Encoding: base64
+
+AAECAwQ=
+--AAA--
+""")
+        shared = self._check_rendering(msg)
+        self.assertIn('To: Anne Person <anne@example.org>', shared[0][1])
+        self.assertIn('To: bart@example.org', shared[1][1])
+        # The original message was not changed.
+        self.assertEqual(len(msg.get_payload()), 2)
+        self.assertEqual(msg['to'], 'test@example.com')
+
     def test_full_personalization(self):
         self._mlist.personalize = Personalization.full
         msgdata = dict(recipients=['anne@example.org'])
@@ -434,6 +520,97 @@ Subject: test
         self.assertEqual(SMTPLayer.smtpd.get_connection_count(), 2)
 
 
+class TestParallelDelivery(unittest.TestCase):
+    """Test delivery over several concurrent SMTP connections."""
+
+    layer = SMTPLayer
+
+    def setUp(self):
+        self._mlist = create_list('test@example.com')
+        self._msg = mfs("""\
+From: anne@example.org
+To: test@example.com
+Subject: test
+
+""")
+        config.push('threads', """
+        [mta]
+        max_delivery_threads: 2
+        """)
+        self.addCleanup(config.pop, 'threads')
+        self.addCleanup(delivery_pool.close)
+        self._recipients = [
+            'anne@example.org',
+            'bart@example.org',
+            'cate@example.com',
+            'dave@example.com',
+            'elle@example.net',
+            ]
+
+    def test_bulk_chunks(self):
+        agent = BulkDelivery(1)
+        refused = agent.deliver(
+            self._mlist, self._msg, dict(recipients=self._recipients))
+        self.assertEqual(refused, {})
+        messages = list(SMTPLayer.smtpd.messages)
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(
+            sorted(message['x-rcptto'] for message in messages),
+            self._recipients)
+        # The chunks were sent over at most the two pooled connections.
+        self.assertLessEqual(SMTPLayer.smtpd.get_connection_count(), 2)
+
+    def test_individual_messages(self):
+        self._mlist.personalize = Personalization.individual
+        agent = Deliver()
+        refused = agent.deliver(
+            self._mlist, self._msg, dict(recipients=self._recipients))
+        self.assertEqual(refused, {})
+        self.assertEqual(len(list(SMTPLayer.smtpd.messages)), 5)
+        self.assertLessEqual(SMTPLayer.smtpd.get_connection_count(), 2)
+
+    def test_connections_reused(self):
+        # The pooled connections stay open from one delivery to the next.
+        agent = BulkDelivery(1)
+        agent.deliver(
+            self._mlist, self._msg, dict(recipients=self._recipients))
+        agent = BulkDelivery(1)
+        agent.deliver(
+            self._mlist, self._msg, dict(recipients=self._recipients))
+        self.assertEqual(len(list(SMTPLayer.smtpd.messages)), 10)
+        self.assertLessEqual(SMTPLayer.smtpd.get_connection_count(), 2)
+
+    def test_disconnect(self):
+        # Disconnected pooled connections reconnect when they are used.
+        agent = BulkDelivery(1)
+        agent.deliver(
+            self._mlist, self._msg, dict(recipients=self._recipients))
+        count = SMTPLayer.smtpd.get_connection_count()
+        delivery_pool.disconnect()
+        agent.deliver(
+            self._mlist, self._msg, dict(recipients=self._recipients))
+        self.assertEqual(len(list(SMTPLayer.smtpd.messages)), 10)
+        self.assertGreater(SMTPLayer.smtpd.get_connection_count(), count)
+
+    def test_refusals(self):
+        # Refusals from the worker threads are collected just like the
+        # refusals from sequential delivery.
+        agent = BulkDelivery(1)
+
+        def sendmail(envsender, recipients, msgtext):
+            if recipients == ['cate@example.com']:
+                raise SMTPRecipientsRefused(
+                    {'cate@example.com': (550, b'Unknown user')})
+            return {}
+
+        with patch('mailman.mta.connection.Connection.sendmail',
+                   side_effect=sendmail):
+            refused = agent.deliver(
+                self._mlist, self._msg, dict(recipients=self._recipients))
+        self.assertEqual(refused,
+                         {'cate@example.com': (550, b'Unknown user')})
+
+
 class TestDeliveryLogging(unittest.TestCase):
     """Test that logging doesn't split on folded Message-IDs."""
 
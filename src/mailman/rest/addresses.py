@@ -71,8 +71,7 @@ class _AddressBase(CollectionMixin):
 
     def _get_collection(self, request):
         """See `CollectionMixin`."""
-        return sorted(getUtility(IUserManager).addresses,
-                      key=attrgetter('original_email'))
+        return getUtility(IUserManager).addresses
 
 
 @public
@@ -26,6 +26,7 @@ from mailman.rest.helpers import (
     etag,
     no_content,
     not_found,
+    not_modified,
     okay,
 )
 from mailman.rest.validator import email_or_regexp_validator, Validator
@@ -60,16 +61,24 @@ class BannedEmail(_BannedBase):
 
     def on_get(self, request, response):
         """Get a banned email."""
-        if self.ban_manager.is_banned(self._email):
-            resource = dict(
-                email=self._email,
-                self_link=self._location(self._email),
-                )
-            if self._mlist is not None:
-                resource['list_id'] = self._mlist.list_id
-            okay(response, etag(resource))
-        else:
+        # Check this first, since If-None-Match: * only matches an existing
+        # resource.
+        if not self.ban_manager.is_banned(self._email):
             not_found(response, 'Email is not banned: {}'.format(self._email))
+            return
+        # The email may be banned globally as well as for the list.
+        versions = [self.ban_manager.version]
+        if self._mlist is not None:
+            versions.append(IBanManager(None).version)
+        if not_modified(request, response, *versions):
+            return
+        resource = dict(
+            email=self._email,
+            self_link=self._location(self._email),
+            )
+        if self._mlist is not None:
+            resource['list_id'] = self._mlist.list_id
+        okay(response, etag(resource))
 
     def on_delete(self, request, response):
         """Remove an email from the ban list."""
@@ -100,6 +109,8 @@ class BannedEmails(_BannedBase, CollectionMixin):
 
     def on_get(self, request, response):
         """/bans"""
+        if not_modified(request, response, self.ban_manager.version):
+            return
         resource = self._make_collection(request)
         okay(response, etag(resource))
 
@@ -30,7 +30,6 @@ from enum import Enum
 from functools import partial
 from lazr.config import as_boolean
 from mailman.config import config
-from pprint import pformat
 from public import public
 
 
@@ -73,34 +72,95 @@ def bytes_to_str(value):
             return value.decode(encoding)
 
 
+def _add_etag(resource):
+    assert 'http_etag' not in resource, 'Resource already etagged'
+    # Calculate the tag from a predictable (i.e. key-sorted) representation
+    # of the dictionary.  The actual details aren't so important, but the
+    # JSON encoder is much faster than pretty-printing.
+    hashfood = json.dumps(resource, cls=ExtendedEncoder, sort_keys=True)
+    etag = hashlib.sha1(hashfood.encode('utf-8')).hexdigest()
+    resource['http_etag'] = '"{}"'.format(etag)
+
+
 @public
 def etag(resource):
     """Calculate the etag and return a JSON representation.
 
     The input is a dictionary representing the resource.  This
     dictionary must not contain an `http_etag` key.  This function
-    calculates the etag by using the sha1 hexdigest of the
-    pretty-printed (and thus key-sorted and predictable) representation
-    of the dictionary.  It then inserts this value under the `http_etag`
-    key, and returns the JSON representation of the modified dictionary.
+    calculates the etag by using the sha1 hexdigest of the key-sorted
+    JSON representation of the dictionary.  It then inserts this value
+    under the `http_etag` key, and returns the JSON representation of
+    the modified dictionary.
 
     :param resource: The original resource representation.
     :type resource: dictionary
     :return: JSON representation of the modified dictionary.
     :rtype string
     """
-    assert 'http_etag' not in resource, 'Resource already etagged'
-    # Calculate the tag from a predictable (i.e. sorted) representation of the
-    # dictionary.  The actual details aren't so important.  pformat() is
-    # guaranteed to sort the keys, however it returns a str and the hash
-    # library requires a bytes.  Use the safest possible encoding.
-    hashfood = pformat(resource).encode('raw-unicode-escape')
-    etag = hashlib.sha1(hashfood).hexdigest()
-    resource['http_etag'] = '"{}"'.format(etag)
+    _add_etag(resource)
     return json.dumps(resource, cls=ExtendedEncoder,
                       sort_keys=as_boolean(config.devmode.enabled))
 
 
+def _etag_matches(request, tag):
+    # Clients may send several etags, or a wildcard.  Weak etags are compared
+    # like strong ones, as RFC 7232 requires for If-None-Match.
+    if_none_match = request.if_none_match
+    if if_none_match is None:
+        return False
+    return any(value == '*' or value == tag for value in if_none_match)
+
+
+@public
+def not_modified(request, response, *versions):
+    """Answer a conditional GET from the versions of a resource.
+
+    Resources whose representation only changes when some version kept in
+    the database changes can tag their response with these versions, and
+    skip building the body when the client's copy is current.  The request's
+    URI is part of the tag, so each page of a collection is tagged
+    differently.
+
+    :param request: The GET request.
+    :param response: The response, whose ETag header is set.
+    :param versions: The versions the representation depends on.
+    :return: True if the client's copy is current, in which case the
+        response has been turned into a 304 Not Modified, otherwise False.
+    :rtype: bool
+    """
+    hashfood = repr((request.uri, versions)).encode('utf-8')
+    tag = hashlib.sha1(hashfood).hexdigest()
+    response.etag = tag
+    if _etag_matches(request, tag):
+        response.status = falcon.HTTP_304
+        return True
+    return False
+
+
+@public
+def conditional_get(request, response):
+    """Tag a successful GET response, and answer 304 if it's unchanged.
+
+    Responses which are not already tagged, e.g. by `not_modified()`, are
+    tagged with a hash of their body.  Clients sending a matching
+    If-None-Match header get a 304 Not Modified instead of the body.
+    """
+    if request.method != 'GET' or response.status != falcon.HTTP_200:
+        return
+    tag = response.etag
+    if tag is None:
+        if response.text is None:
+            return
+        tag = hashlib.sha1(response.text.encode('utf-8')).hexdigest()
+        response.etag = tag
+    else:
+        tag = tag.strip('"')
+    if _etag_matches(request, tag):
+        response.status = falcon.HTTP_304
+        response.text = None
+
+
 @public
 class CollectionMixin:
     """Mixin class for common collection-ish things."""
@@ -182,7 +242,8 @@ class CollectionMixin:
             entries = [as_dict(resource) for resource in collection]
             assert None not in entries, entries
             # Create the collection resource
-            [etag(resource) for resource in entries]
+            for resource in entries:
+                _add_etag(resource)
             result['entries'] = entries
         return result
 
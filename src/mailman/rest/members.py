@@ -26,6 +26,7 @@ from mailman.interfaces.member import (
     AlreadySubscribedError,
     DeliveryMode,
     DeliveryStatus,
+    IMembershipManager,
     MemberRole,
     MembershipError,
     MembershipIsBannedError,
@@ -69,6 +70,10 @@ from zope.component import getUtility
 class _MemberBase(CollectionMixin):
     """Shared base class for member representations."""
 
+    # Effective preferences of the members in the current page of the
+    # collection, resolved all at once by _paginate().
+    _preferences = {}
+
     @property
     def all_fields(self):
         """Get a mapping of all the supported fields for a Member resource.
@@ -89,7 +94,7 @@ class _MemberBase(CollectionMixin):
             'last_bounce_received': attrgetter('last_bounce_received'),
             'last_warning_sent': attrgetter('last_warning_sent'),
             'total_warnings_sent': attrgetter('total_warnings_sent'),
-            'delivery_mode': attrgetter('delivery_mode'),
+            'delivery_mode': self._get_delivery_mode,
             'email': attrgetter('address.email'),
             'list_id': attrgetter('list_id'),
             'subscription_mode': attrgetter('subscription_mode'),
@@ -101,6 +106,20 @@ class _MemberBase(CollectionMixin):
             'member_id': self._get_member_id,
             }
 
+    def _paginate(self, request, collection):
+        """See `CollectionMixin`."""
+        start, total_size, page = super()._paginate(request, collection)
+        self._preferences = getUtility(IMembershipManager).get_preferences(
+            page)
+        return start, total_size, page
+
+    def _get_delivery_mode(self, member):
+        """Get the member's effective delivery mode."""
+        preferences = self._preferences.get(member)
+        if preferences is None:
+            return member.delivery_mode
+        return preferences.delivery_mode
+
     def _get_member_id(self, member):
         """Get member_id."""
         return self.api.from_uuid(member.member_id)
@@ -143,7 +162,7 @@ class _MemberBase(CollectionMixin):
 
     def _get_collection(self, request):
         """See `CollectionMixin`."""
-        return list(getUtility(ISubscriptionService))
+        return getUtility(ISubscriptionService).get_members()
 
     def on_get(self, request, response):
         """/members"""
@@ -0,0 +1,238 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""<api>/metrics."""
+
+import time
+
+from mailman.config import config
+from mailman.rest.helpers import (
+    CollectionMixin,
+    CONTENT_TYPE_TEXT_PLAIN,
+    etag,
+    no_content,
+    okay,
+)
+from public import public
+
+
+# The counters kept by switchboards and runners for each queue.
+QUEUE_COUNTERS = ('enqueued', 'finished', 'preserved', 'shunted')
+# The timings kept by switchboards and runners; their name is the queue's.
+QUEUE_TIMINGS = ('queue-wait', 'runner')
+
+
+def _bound(value):
+    # JSON has no infinity, so the catch-all bucket is named after its bound.
+    return '+Inf' if value == float('inf') else value
+
+
+def _histogram(stats):
+    if stats is None:
+        return dict(count=0, errors=0, seconds=0.0, max_seconds=0.0)
+    return dict(
+        count=stats['count'],
+        errors=stats['errors'],
+        seconds=stats['seconds'],
+        max_seconds=stats['max_seconds'],
+        buckets=[dict(le=_bound(bound), count=count)
+                 for bound, count in sorted(stats['buckets'].items())],
+        )
+
+
+def _queue_state(name):
+    # Return the number of entries in the queue, and the age in seconds of
+    # the oldest one, which is encoded in its file name.
+    files = config.switchboards[name].files
+    if len(files) == 0:
+        return 0, 0.0
+    when, digest = files[0].split('+', 1)
+    return len(files), max(time.time() - float(when), 0.0)
+
+
+@public
+class Timings(CollectionMixin):
+    """Handler, rule, and chain timings, merged across all processes.
+
+    The collection can be filtered with the `kind`, `name`, and `list_id`
+    query parameters.
+    """
+
+    def _resource_as_dict(self, stats):
+        """See `CollectionMixin`."""
+        return dict(
+            kind=stats['kind'],
+            name=stats['name'],
+            list_id=stats['list_id'],
+            count=stats['count'],
+            errors=stats['errors'],
+            seconds=stats['seconds'],
+            max_seconds=stats['max_seconds'],
+            buckets=[dict(le=_bound(bound), count=count)
+                     for bound, count in sorted(stats['buckets'].items())],
+            )
+
+    def _get_collection(self, request):
+        """See `CollectionMixin`."""
+        filters = {}
+        for key in ('kind', 'name', 'list_id'):
+            value = request.get_param(key)
+            if value is not None:
+                filters[key] = value
+        return [stats for stats in config.stats.collect()
+                if all(stats[key] == value
+                       for key, value in filters.items())]
+
+    def on_get(self, request, response):
+        """/<api>/metrics/timings"""
+        resource = self._make_collection(request)
+        resource['enabled'] = config.stats.enabled
+        resource['self_link'] = self.api.path_to('metrics/timings')
+        okay(response, etag(resource))
+
+    def on_delete(self, request, response):
+        """Reset all timings."""
+        config.stats.reset()
+        no_content(response)
+
+
+@public
+class QueueMetrics(CollectionMixin):
+    """Depth, age, throughput, and latency of every queue."""
+
+    def _resource_as_dict(self, name):
+        """See `CollectionMixin`."""
+        depth, oldest_age = _queue_state(name)
+        resource = dict(
+            name=name,
+            depth=depth,
+            oldest_age=oldest_age,
+            wait=_histogram(self._timings.get(('queue-wait', name))),
+            processing=_histogram(self._timings.get(('runner', name))),
+            self_link=self.api.path_to('queues/{}'.format(name)),
+            )
+        for kind in QUEUE_COUNTERS:
+            resource[kind] = self._counters.get((kind, name), 0)
+        return resource
+
+    def _get_collection(self, request):
+        """See `CollectionMixin`."""
+        stats = config.stats
+        self._counters = stats.counters()
+        self._timings = {
+            (entry['kind'], entry['name']): entry
+            for entry in stats.collect()
+            if entry['kind'] in QUEUE_TIMINGS
+            }
+        return sorted(config.switchboards)
+
+    def on_get(self, request, response):
+        """/<api>/metrics/queues"""
+        resource = self._make_collection(request)
+        resource['enabled'] = config.stats.enabled
+        resource['self_link'] = self.api.path_to('metrics/queues')
+        okay(response, etag(resource))
+
+
+def _labels(**labels):
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in sorted(labels.items())
+        if value is not None) + '}'
+
+
+def _entry_labels(entry):
+    if entry['kind'] in QUEUE_TIMINGS:
+        return dict(queue=entry['name'])
+    return dict(kind=entry['kind'], name=entry['name'],
+                list_id=entry['list_id'])
+
+
+def _prometheus_histogram(lines, metric, stats, **labels):
+    cumulative = 0
+    for bound, count in sorted(stats['buckets'].items()):
+        cumulative += count
+        lines.append('{}_bucket{} {}'.format(
+            metric, _labels(le=_bound(bound), **labels), cumulative))
+    lines.append('{}_sum{} {!r}'.format(
+        metric, _labels(**labels), stats['seconds']))
+    lines.append('{}_count{} {}'.format(
+        metric, _labels(**labels), stats['count']))
+
+
+@public
+class Prometheus:
+    """All metrics, in the Prometheus text exposition format."""
+
+    def on_get(self, request, response):
+        """/<api>/metrics/prometheus"""
+        stats = config.stats
+        counters = stats.counters()
+        timings = stats.collect()
+        names = sorted(config.switchboards)
+        lines = []
+        states = {name: _queue_state(name) for name in names}
+        for metric, kind, help_text in (
+                ('mailman_queue_depth', 0,
+                 'Number of entries in the queue.'),
+                ('mailman_queue_oldest_age_seconds', 1,
+                 'Age of the oldest entry in the queue.')):
+            lines.append('# HELP {} {}'.format(metric, help_text))
+            lines.append('# TYPE {} gauge'.format(metric))
+            for name in names:
+                lines.append('{}{} {!r}'.format(
+                    metric, _labels(queue=name), states[name][kind]))
+        for kind in QUEUE_COUNTERS:
+            metric = 'mailman_queue_{}_total'.format(kind)
+            lines.append('# HELP {} Number of queue entries {}.'.format(
+                metric, kind))
+            lines.append('# TYPE {} counter'.format(metric))
+            for name in names:
+                lines.append('{}{} {}'.format(
+                    metric, _labels(queue=name),
+                    counters.get((kind, name), 0)))
+        for metric, kinds, help_text in (
+                ('mailman_queue_wait_seconds', ('queue-wait',),
+                 'Time entries spent in the queue before being dequeued.'),
+                ('mailman_runner_processing_seconds', ('runner',),
+                 'Time runners spent processing a queue entry.'),
+                ('mailman_processing_seconds', ('handler', 'rule', 'chain'),
+                 'Time spent in pipeline handlers, chain rules, and chain '
+                 'actions.')):
+            lines.append('# HELP {} {}'.format(metric, help_text))
+            lines.append('# TYPE {} histogram'.format(metric))
+            for entry in timings:
+                if entry['kind'] in kinds:
+                    _prometheus_histogram(
+                        lines, metric, entry, **_entry_labels(entry))
+        for metric, kinds, help_text in (
+                ('mailman_runner_errors_total', ('runner',),
+                 'Queue entries whose processing raised an exception.'),
+                ('mailman_processing_errors_total',
+                 ('handler', 'rule', 'chain'),
+                 'Unexpected exceptions raised by pipeline handlers, chain '
+                 'rules, and chain actions.')):
+            lines.append('# HELP {} {}'.format(metric, help_text))
+            lines.append('# TYPE {} counter'.format(metric))
+            for entry in timings:
+                if entry['kind'] in kinds:
+                    lines.append('{}{} {}'.format(
+                        metric, _labels(**_entry_labels(entry)),
+                        entry['errors']))
+        response.content_type = CONTENT_TYPE_TEXT_PLAIN + '; version=0.0.4'
+        okay(response, '\n'.join(lines) + '\n')
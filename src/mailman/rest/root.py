@@ -37,6 +37,7 @@ from mailman.rest.helpers import (
 )
 from mailman.rest.lists import AList, AllLists, FindLists, Styles
 from mailman.rest.members import AllMembers, AMember, FindMembers
+from mailman.rest.metrics import Prometheus, QueueMetrics, Timings
 from mailman.rest.plugins import AllPlugins, APlugin
 from mailman.rest.preferences import ReadOnlyPreferences
 from mailman.rest.queues import AllQueues, AQueue, AQueueFile
@@ -321,6 +322,20 @@ class TopLevel:
         else:
             return BadRequest(), []
 
+    @child()
+    def metrics(self, context, segments):
+        """/<api>/metrics/{timings,queues,prometheus}"""
+        if len(segments) != 1:
+            return NotFound(), []
+        elif segments[0] == 'timings':
+            return Timings(), []
+        elif segments[0] == 'queues':
+            return QueueMetrics(), []
+        elif segments[0] == 'prometheus':
+            return Prometheus(), []
+        else:
+            return NotFound(), []
+
     @child()
     def plugins(self, context, segments):
         """/<api>/plugins
@@ -189,6 +189,7 @@ class SubscriptionRequests(_ModerationBase, CollectionMixin):
             pendings = getUtility(IPendings).find(
                 mlist=self._mlist,
                 pend_type=pend_type.name,
+                confirm=False,
                 token_owner=token_owner)
             resource = _SubscriptionRequestsFound(
                 [token for token, pendable in pendings])
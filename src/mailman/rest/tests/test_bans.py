@@ -17,9 +17,11 @@
 
 """Test address bans."""
 
+import requests
 import unittest
 
 from mailman.app.lifecycle import create_list
+from mailman.config import config
 from mailman.database.transaction import transaction
 from mailman.interfaces.bans import IBanManager
 from mailman.testing.helpers import call_api
@@ -121,3 +123,63 @@ class TestBans(unittest.TestCase):
         self.assertEqual(json['self_link'],
                          'http://localhost:9001/3.0/lists/ant.example.com'
                          '/bans/%5E%5B%5E%40%5D%2B')
+
+
+class TestConditionalGet(unittest.TestCase):
+    layer = RESTLayer
+
+    def setUp(self):
+        with transaction():
+            self._mlist = create_list('ant@example.com')
+            IBanManager(self._mlist).ban('anne@example.com')
+
+    def _get(self, url, etag=None):
+        headers = {} if etag is None else {'If-None-Match': etag}
+        return requests.get(
+            url, headers=headers,
+            auth=(config.webservice.admin_user, config.webservice.admin_pass))
+
+    def _check(self, url, change):
+        response = self._get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['etag']
+        response = self._get(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        with transaction():
+            change()
+        response = self._get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['etag'], etag)
+
+    def test_list_bans(self):
+        self._check(
+            'http://localhost:9001/3.1/lists/ant.example.com/bans',
+            lambda: IBanManager(self._mlist).ban('bart@example.com'))
+
+    def test_pages(self):
+        url = 'http://localhost:9001/3.1/lists/ant.example.com/bans'
+        etag = self._get(url + '?count=1&page=1').headers['etag']
+        response = self._get(url + '?count=1&page=2', etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_global_bans(self):
+        self._check(
+            'http://localhost:9001/3.1/bans',
+            lambda: IBanManager(None).ban('bart@example.com'))
+
+    def test_list_ban_global_change(self):
+        # A single banned email also depends on the global bans.
+        self._check(
+            'http://localhost:9001/3.1/lists/ant.example.com'
+            '/bans/anne@example.com',
+            lambda: IBanManager(None).ban('^.*@example.com'))
+
+    def test_wildcard_not_banned(self):
+        # A wildcard only matches an existing resource.
+        url = ('http://localhost:9001/3.1/lists/ant.example.com'
+               '/bans/bart@example.com')
+        self.assertEqual(self._get(url, '*').status_code, 404)
+        url = ('http://localhost:9001/3.1/lists/ant.example.com'
+               '/bans/anne@example.com')
+        self.assertEqual(self._get(url, '*').status_code, 304)
@@ -304,7 +304,7 @@ class TestDomainTemplates(unittest.TestCase):
             resource['self_link'],
             'http://localhost:9001/3.1/domains/example.com/uris')
         self.assertEqual(resource['entries'], [
-            {'http_etag': '"e877ff896db0f2e280660ac16b9401f7925a53b9"',
+            {'http_etag': '"594bfd4405d9ec970f025807dcf331761b8d0f4b"',
              'name': 'list:user:notice:goodbye',
              'password': 'the password',
              'self_link': ('http://localhost:9001/3.1/domains/example.com'
@@ -312,7 +312,7 @@ class TestDomainTemplates(unittest.TestCase):
              'uri': 'http://example.com/goodbye',
              'username': 'a user',
              },
-            {'http_etag': '"8dac25601c3419e98e2c05df1d962a2252b67ce6"',
+            {'http_etag': '"cb93a983893a94ab90080140b862a387c34c181d"',
              'name': 'list:user:notice:welcome',
              'self_link': ('http://localhost:9001/3.1/domains/example.com'
                            '/uris/list:user:notice:welcome'),
@@ -452,7 +452,7 @@ class TestDomainTemplates(unittest.TestCase):
             '/list:user:notice:welcome')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(resource, {
-            'http_etag': '"8884a0b3d675b4cb9899a7825daac9db88b70bed"',
+            'http_etag': '"b74b7efe3ca284e50b4135ca90d636ed2615893c"',
             'self_link': ('http://localhost:9001/3.1/domains/example.com'
                           '/uris/list:user:notice:welcome'),
             'uri': 'http://example.com/welcome',
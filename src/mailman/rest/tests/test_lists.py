@@ -792,7 +792,7 @@ class TestListTemplates(unittest.TestCase):
             json['self_link'],
             'http://localhost:9001/3.1/lists/ant.example.com/uris')
         self.assertEqual(json['entries'], [
-            {'http_etag': '"6612187ed6604ce54a57405fd66742557391ed4a"',
+            {'http_etag': '"35b92f364666eacd43c460a909e25ff608417903"',
              'name': 'list:user:notice:goodbye',
              'password': 'the password',
              'self_link': ('http://localhost:9001/3.1/lists/ant.example.com'
@@ -800,7 +800,7 @@ class TestListTemplates(unittest.TestCase):
              'uri': 'http://example.com/goodbye',
              'username': 'a user',
              },
-            {'http_etag': '"cb1ab5eee2242143d2984edd0487532915ad3a8e"',
+            {'http_etag': '"b78c96f70a0541f2640c1dbb22388458a339619e"',
              'name': 'list:user:notice:welcome',
              'self_link': ('http://localhost:9001/3.1/lists/ant.example.com'
                            '/uris/list:user:notice:welcome'),
@@ -939,7 +939,7 @@ class TestListTemplates(unittest.TestCase):
             '/list:user:notice:welcome')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(json, {
-            'http_etag': '"36f8bef800cfd278f097c61c5892a34c0650f4aa"',
+            'http_etag': '"989da73b97438a1e54352d8030edcf461def0f30"',
             'self_link': ('http://localhost:9001/3.1/lists/ant.example.com'
                           '/uris/list:user:notice:welcome'),
             'uri': 'http://example.com/welcome',
@@ -0,0 +1,153 @@
+# Copyright (C) 2022 by the Free Software Foundation, Inc.
+#
+# This file is part of GNU Mailman.
+#
+# GNU Mailman is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# GNU Mailman is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# GNU Mailman.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test the `metrics` resource."""
+
+import os
+import requests
+import unittest
+
+from mailman.config import config
+from mailman.testing.helpers import (
+    call_api,
+    specialized_message_from_string as mfs,
+)
+from mailman.testing.layers import RESTLayer
+from urllib.error import HTTPError
+
+
+class TestTimings(unittest.TestCase):
+    layer = RESTLayer
+
+    def setUp(self):
+        # The REST server runs in its own process, so it only sees the
+        # statistics this process saves to its snapshot.
+        stats = config.stats
+        self.addCleanup(stats.reset)
+        stats.record('handler', 'decorate', 'ant.example.com', 0.002)
+        stats.record('handler', 'decorate', 'ant.example.com', 2, error=True)
+        stats.record('rule', 'approved', 'bee.example.com', 0.0005)
+        stats.save()
+
+    def test_timings(self):
+        content, response = call_api(
+            'http://localhost:9001/3.0/metrics/timings')
+        self.assertFalse(content['enabled'])
+        self.assertEqual(content['total_size'], 2)
+        decorate, approved = content['entries']
+        self.assertEqual(decorate['kind'], 'handler')
+        self.assertEqual(decorate['name'], 'decorate')
+        self.assertEqual(decorate['list_id'], 'ant.example.com')
+        self.assertEqual(decorate['count'], 2)
+        self.assertEqual(decorate['errors'], 1)
+        self.assertEqual(decorate['max_seconds'], 2)
+        self.assertEqual(decorate['buckets'][1], dict(le=0.005, count=1))
+        self.assertEqual(decorate['buckets'][-1], dict(le='+Inf', count=0))
+        self.assertEqual(decorate['buckets'][-2], dict(le=5, count=1))
+        self.assertEqual(approved['name'], 'approved')
+
+    def test_filter(self):
+        content, response = call_api(
+            'http://localhost:9001/3.0/metrics/timings'
+            '?list_id=bee.example.com')
+        self.assertEqual(content['total_size'], 1)
+        self.assertEqual(content['entries'][0]['name'], 'approved')
+        content, response = call_api(
+            'http://localhost:9001/3.0/metrics/timings?kind=handler'
+            '&name=decorate')
+        self.assertEqual(content['total_size'], 1)
+        self.assertEqual(content['entries'][0]['name'], 'decorate')
+
+    def test_reset(self):
+        content, response = call_api(
+            'http://localhost:9001/3.0/metrics/timings', method='DELETE')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(os.listdir(config.stats.directory), [])
+
+    def test_not_found(self):
+        with self.assertRaises(HTTPError) as cm:
+            call_api('http://localhost:9001/3.0/metrics/bogus')
+        self.assertEqual(cm.exception.code, 404)
+
+
+class TestQueueMetrics(unittest.TestCase):
+    layer = RESTLayer
+
+    def setUp(self):
+        stats = config.stats
+        self.addCleanup(stats.reset)
+        stats.enabled = True
+        self.addCleanup(setattr, stats, 'enabled', False)
+        self._msg = mfs("""\
+From: anne@example.com
+To: ant@example.com
+Message-ID: <ant>
+
+""")
+        switchboard = config.switchboards['bad']
+        filebase = switchboard.enqueue(self._msg)
+        switchboard.dequeue(filebase)
+        switchboard.finish(filebase)
+        # This one stays in the queue.
+        switchboard.enqueue(self._msg)
+        stats.record('handler', 'decorate', 'ant.example.com', 0.002)
+        stats.save()
+
+    def test_queues(self):
+        content, response = call_api(
+            'http://localhost:9001/3.0/metrics/queues')
+        entries = {entry['name']: entry for entry in content['entries']}
+        self.assertEqual(sorted(entries), sorted(config.switchboards))
+        bad = entries['bad']
+        self.assertEqual(bad['depth'], 1)
+        self.assertGreaterEqual(bad['oldest_age'], 0)
+        self.assertEqual(bad['enqueued'], 2)
+        self.assertEqual(bad['finished'], 1)
+        self.assertEqual(bad['preserved'], 0)
+        self.assertEqual(bad['shunted'], 0)
+        self.assertEqual(bad['wait']['count'], 1)
+        self.assertEqual(bad['processing']['count'], 0)
+        self.assertEqual(bad['self_link'],
+                         'http://localhost:9001/3.0/queues/bad')
+        self.assertEqual(entries['in']['depth'], 0)
+        self.assertEqual(entries['in']['oldest_age'], 0)
+
+    def test_prometheus(self):
+        response = requests.get(
+            'http://localhost:9001/3.0/metrics/prometheus',
+            auth=(config.webservice.admin_user, config.webservice.admin_pass))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response.headers['content-type'].startswith('text/plain'))
+        lines = response.text.splitlines()
+        self.assertIn('# TYPE mailman_queue_depth gauge', lines)
+        self.assertIn('mailman_queue_depth{queue="bad"} 1', lines)
+        self.assertIn('mailman_queue_depth{queue="in"} 0', lines)
+        self.assertIn('mailman_queue_enqueued_total{queue="bad"} 2', lines)
+        self.assertIn('mailman_queue_finished_total{queue="bad"} 1', lines)
+        self.assertIn('mailman_queue_wait_seconds_count{queue="bad"} 1',
+                      lines)
+        self.assertIn('mailman_queue_wait_seconds_bucket'
+                      '{le="+Inf",queue="bad"} 1', lines)
+        self.assertIn(
+            'mailman_processing_seconds_bucket{kind="handler",'
+            'le="0.005",list_id="ant.example.com",name="decorate"} 1',
+            lines)
+        self.assertIn(
+            'mailman_processing_errors_total{kind="handler",'
+            'list_id="ant.example.com",name="decorate"} 0',
+            lines)
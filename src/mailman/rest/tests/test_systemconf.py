@@ -57,10 +57,13 @@ class TestSystemConfiguration(unittest.TestCase):
             pending_request_life='3d',
             post_hook='',
             pre_hook='',
+            preload_runners='no',
             run_tasks_every='1h',
             self_link='http://localhost:9001/3.0/system/configuration/mailman',
             sender_headers='from from_ reply-to sender',
             site_owner='noreply@example.com',
+            template_cache_size='1000',
+            template_search_life='1m',
             ))
 
     def test_dmarc_system_configuration(self):
@@ -73,6 +76,8 @@ class TestSystemConfiguration(unittest.TestCase):
         self.assertEqual(json, dict(
             cache_lifetime='7d',
             org_domain_data_url='https://publicsuffix.org/list/public_suffix_list.dat',  # noqa: E501
+            policy_cache_lifetime='1h',
+            policy_negative_lifetime='1h',
             resolver_lifetime='5s',
             resolver_timeout='3s',
             self_link='http://localhost:9001/3.0/system/configuration/dmarc',
@@ -187,6 +192,7 @@ class TestSystemConfiguration(unittest.TestCase):
             'logging.task',
             'logging.vette',
             'mailman',
+            'metrics',
             'mta',
             'nntp',
             'passwords',
@@ -21,9 +21,11 @@ import requests
 import unittest
 
 from mailman.config import config
+from mailman.database.transaction import transaction
 from mailman.interfaces.domain import IDomainManager
+from mailman.rest.helpers import child
 from mailman.testing.helpers import call_api
-from mailman.testing.layers import RESTLayer
+from mailman.testing.layers import ConfigLayer, RESTLayer
 from zope.component import getUtility
 
 
@@ -118,3 +120,133 @@ class TestSupportedContentType(unittest.TestCase):
 
     def test_error_response_is_unformly_formatted(self):
         pass
+
+
+class TestConditionalGet(unittest.TestCase):
+    layer = RESTLayer
+
+    def _get(self, url, etag=None):
+        headers = {} if etag is None else {'If-None-Match': etag}
+        return requests.get(
+            url, headers=headers,
+            auth=(config.webservice.admin_user, config.webservice.admin_pass))
+
+    def test_not_modified(self):
+        # Responses are tagged with a hash of their body.
+        url = 'http://localhost:9001/3.1/domains/example.com'
+        response = self._get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['etag']
+        response = self._get(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        response = self._get(url, '"bogus", W/' + etag)
+        self.assertEqual(response.status_code, 304)
+        response = self._get(url, '*')
+        self.assertEqual(response.status_code, 304)
+        with transaction():
+            getUtility(IDomainManager).get(
+                'example.com').description = 'An example domain'
+        response = self._get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['description'], 'An example domain')
+
+    def test_errors_are_not_tagged(self):
+        response = self._get('http://localhost:9001/3.1/domains/bogus.com')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('etag', response.headers)
+
+
+class Leaf:
+    def __init__(self, *args, **kws):
+        self.args = args
+        self.kws = kws
+
+    def on_get(self, request, response):
+        pass  # pragma: nocover
+
+
+def _match_number(segments):
+    if segments[0].isdigit():
+        return (int(segments[0]),), {}, segments[1:]
+    return None
+
+
+class Branch:
+    @child()
+    def leaf(self, context, segments):
+        return Leaf('leaf'), []
+
+    @child(r'^(?P<name>[a-z]+)/(?P<part>[a-z]+)')
+    def named(self, context, segments, **kws):
+        return Leaf(**kws), []
+
+    @child(_match_number)
+    def numbered(self, context, segments, number):
+        return Leaf(number), segments
+
+    @child('skipped')
+    def none(self, context, segments):
+        return None
+
+
+class Proxy:
+    def __init__(self, resource):
+        self._resource = resource
+
+    def __getattr__(self, attrib):
+        return getattr(self._resource, attrib)
+
+    def __dir__(self):
+        return dir(self._resource)
+
+
+class TestObjectRouter(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        # The resources can only be imported once the configuration is set up.
+        from mailman.rest.wsgiapp import ObjectRouter
+        self._router = ObjectRouter(Branch())
+
+    def _find(self, uri):
+        resource, method_map, context = self._router.find(uri)
+        return resource
+
+    def test_exact(self):
+        self.assertEqual(self._find('/leaf').args, ('leaf',))
+
+    def test_regexp(self):
+        # The regular expression matches the rest of the path.
+        self.assertEqual(self._find('/ant/stem').kws,
+                         dict(name='ant', part='stem'))
+
+    def test_callable(self):
+        self.assertEqual(self._find('/7').args, (7,))
+
+    def test_order(self):
+        # Links are tried in the order of their names, so `leaf` wins over
+        # the regular expression of `named`, but `named` wins over `none`.
+        self.assertEqual(self._find('/leaf/stem').args, ('leaf',))
+        self.assertEqual(self._find('/skipped/x').kws,
+                         dict(name='skipped', part='x'))
+
+    def test_not_found(self):
+        self.assertIsNone(self._find('/skipped'))
+        self.assertIsNone(self._find('/bogus'))
+
+    def test_table_cached(self):
+        self._find('/leaf')
+        exact, others = self._router._tables[Branch]
+        self.assertEqual(sorted(exact), ['leaf', 'skipped'])
+        self.assertEqual([(name, kind) for index, name, kind, matcher
+                          in others],
+                         [('named', 'regexp'), ('numbered', 'callable')])
+        self.assertEqual(others[0][3].pattern,
+                         r'^(?P<name>[a-z]+)/(?P<part>[a-z]+)')
+
+    def test_proxy(self):
+        # Resources proxying their links to another object are not cached.
+        self._router._root = Proxy(Branch())
+        self.assertEqual(self._find('/leaf').args, ('leaf',))
+        self.assertNotIn(Proxy, self._router._tables)
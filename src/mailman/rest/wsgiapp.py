@@ -24,9 +24,10 @@ import logging
 from base64 import b64decode
 from falcon import App, HTTPUnauthorized
 from falcon.routing import map_http_methods, set_default_responders
+from heapq import merge
 from mailman.config import config
 from mailman.database.transaction import transactional
-from mailman.rest.helpers import bad_request
+from mailman.rest.helpers import bad_request, conditional_get
 from mailman.rest.root import Root
 from public import public
 
@@ -44,9 +45,9 @@ WILDCARD_ACCEPT_HEADER = '*/*'
 class Middleware:
     """Falcon middleware object for Mailman's REST API.
 
-    This does two things.  It sets the API version on the resource
-    object, and it verifies that the proper authentication has been
-    performed.
+    This does three things.  It sets the API version on the resource
+    object, it verifies that the proper authentication has been
+    performed, and it answers conditional GET requests.
     """
     def process_resource(self, request, response, resource, params):
         # Check the authorization credentials.
@@ -67,6 +68,10 @@ class Middleware:
                 'REST API authorization failed',
                 challenges=[realm])
 
+    def process_response(self, request, response, resource, req_succeeded):
+        if req_succeeded:
+            conditional_get(request, response)
+
 
 def handle_ValueError(exc, request, response, params):
     """Handle ValueErrors in API code to return HTTPBadRequest.
@@ -85,11 +90,59 @@ def handle_ValueError(exc, request, response, params):
 class ObjectRouter:
     def __init__(self, root):
         self._root = root
+        # Resource class -> dispatch table, see _dispatch_table().
+        self._tables = {}
 
     def add_route(self, uri_template, method_map, resource):
         # We don't need this method for object-based routing.
         raise NotImplementedError
 
+    def _dispatch_table(self, resource):
+        """Return the child links of a resource.
+
+        The table is a 2-tuple of a dictionary mapping exact path segments to
+        the links matching them, and a list of the links with a regular
+        expression or callable matcher.  Each link is a 4-tuple of the link's
+        position in the sorted attribute names, the attribute's name, the
+        kind of its matcher, i.e. 'string', 'regexp', or 'callable', and the
+        matcher, with regular expressions compiled.  The position keeps the
+        order in which the links are tried the same as the order of the
+        attribute names.
+
+        The table is computed once per resource class, except for resources
+        which proxy their attributes to another object, e.g. plugin
+        resources, which provide their own `__dir__()`.
+        """
+        cls = type(resource)
+        if cls.__dir__ is not object.__dir__:
+            return self._make_table(resource)
+        table = self._tables.get(cls)
+        if table is None:
+            table = self._tables[cls] = self._make_table(cls)
+        return table
+
+    def _make_table(self, obj):
+        exact = {}
+        others = []
+        for index, name in enumerate(dir(obj)):
+            if name.startswith('__') and name.endswith('__'):
+                continue
+            attribute = getattr(obj, name, MISSING)
+            assert attribute is not MISSING, name
+            matcher = getattr(attribute, '__matcher__', MISSING)
+            if matcher is MISSING:
+                continue
+            if not isinstance(matcher, str):
+                others.append((index, name, 'callable', matcher))
+            elif matcher.startswith('^'):
+                # If the matcher string starts with a caret, it's a regular
+                # expression, otherwise it's a plain string.
+                others.append((index, name, 'regexp', re.compile(matcher)))
+            else:
+                exact.setdefault(matcher, []).append(
+                    (index, name, 'string', None))
+        return exact, others
+
     def find(self, uri, req=None):
         segments = uri.split(SLASH)
         # Since the path is always rooted at /, skip the first segment, which
@@ -102,30 +155,23 @@ class ObjectRouter:
             # Plumb the API through to all child resources.
             api = getattr(resource, 'api', None)
             # See if any of the resource's child links match the next segment.
-            for name in dir(resource):
-                if name.startswith('__') and name.endswith('__'):
-                    continue
-                attribute = getattr(resource, name, MISSING)
-                assert attribute is not MISSING, name
-                matcher = getattr(attribute, '__matcher__', MISSING)
-                if matcher is MISSING:
-                    continue
+            exact, others = self._dispatch_table(resource)
+            for index, name, kind, matcher in merge(
+                    exact.get(this_segment, ()), others):
+                attribute = getattr(resource, name)
                 result = None
-                if isinstance(matcher, str):
-                    # Is the matcher string a regular expression or plain
-                    # string?  If it starts with a caret, it's a regexp.
-                    if matcher.startswith('^'):
-                        cre = re.compile(matcher)
-                        # Search against the entire remaining path.
-                        tmp_segments = segments[:]
-                        tmp_segments.insert(0, this_segment)
-                        remaining_path = SLASH.join(tmp_segments)
-                        mo = cre.match(remaining_path)
-                        if mo:
-                            result = attribute(
-                                context, segments, **mo.groupdict())
-                    elif matcher == this_segment:
-                        result = attribute(context, segments)
+                if kind == 'string':
+                    # The plain string matcher is this segment.
+                    result = attribute(context, segments)
+                elif kind == 'regexp':
+                    # Search against the entire remaining path.
+                    tmp_segments = segments[:]
+                    tmp_segments.insert(0, this_segment)
+                    remaining_path = SLASH.join(tmp_segments)
+                    mo = matcher.match(remaining_path)
+                    if mo:
+                        result = attribute(
+                            context, segments, **mo.groupdict())
                 else:
                     # The matcher is a callable.  It returns None if it
                     # doesn't match, and if it does, it returns a 3-tuple
@@ -19,9 +19,12 @@
 
 import os
 import re
+import json
+import atexit
 import logging
 import dns.resolver
 
+from contextlib import suppress
 from dns.exception import DNSException
 from email.utils import parseaddr
 from importlib_resources import read_binary
@@ -35,6 +38,7 @@ from mailman.utilities.protocols import get
 from mailman.utilities.string import wrap
 from public import public
 from requests.exceptions import HTTPError
+from time import monotonic
 from urllib.error import URLError
 from zope.interface import implementer
 
@@ -46,6 +50,10 @@ DOT = '.'
 EMPTYSTRING = ''
 KEEP_LOOKING = object()
 LOCAL_FILE_NAME = 'public_suffix_list.dat'
+POLICY_CACHE_FILE_NAME = 'dmarc_policies.json'
+# The minimum number of seconds between two saves of a process's new policy
+# cache entries.
+POLICY_CACHE_SAVE_INTERVAL = 10
 
 # Map organizational domain suffix rules to a boolean indicating whether the
 # rule is an exception or not.
@@ -166,6 +174,203 @@ def get_organizational_domain(domain):
     return get_domain(parts, label)
 
 
+def _query(dmarc_domain):
+    # Look up the TXT records of the _dmarc host name, returning a list of
+    # (name, type, value) records and the number of seconds they may be
+    # cached for, or None if DNS doesn't tell.
+    resolver = dns.resolver.Resolver()
+    resolver.timeout = as_timedelta(
+        config.dmarc.resolver_timeout).total_seconds()
+    resolver.lifetime = as_timedelta(
+        config.dmarc.resolver_lifetime).total_seconds()
+    txt_recs = resolver.query(dmarc_domain, dns.rdatatype.TXT)
+    records = []
+    ttls = []
+    # Keep track of the CNAMEs for checking later on.  Ignore any other
+    # non-TXT records.
+    for txt_rec in txt_recs.response.answer:
+        # Don't be fooled by an answer with uppercase in the name.
+        name = txt_rec.name.to_text().lower()
+        ttl = getattr(txt_rec, 'ttl', None)
+        if ttl is not None:
+            ttls.append(ttl)
+        if txt_rec.rdtype == dns.rdatatype.CNAME:
+            records.append((
+                name, 'CNAME', next(iter(txt_rec.items)).target.to_text()))
+        elif txt_rec.rdtype == dns.rdatatype.TXT:
+            records.append((name, 'TXT', EMPTYSTRING.join(
+                str(record, encoding='utf-8')
+                for record in next(iter(txt_rec.items)).strings)))
+    return records, (min(ttls) if len(ttls) > 0 else None)
+
+
+@public
+class PolicyCache:
+    """A cache of the DMARC policy records found in DNS.
+
+    The records of each _dmarc host name are cached for as long as their TTL
+    allows, but no longer than the configured lifetime.  Host names without
+    any records are cached for the configured negative lifetime.  The cache
+    is kept in memory, and on disk to share it with the other processes.
+    Each process saves its new entries at most every few seconds.  DNS errors
+    are not cached.
+    """
+
+    def __init__(self):
+        # {dmarc_domain -> (expires, records or None)}
+        self._entries = {}
+        # The entries this process looked up, but hasn't saved yet.
+        self._unsaved = {}
+        self._version = None
+        self._last_save = None
+        self._atexit = False
+
+    @property
+    def filename(self):
+        return os.path.join(config.VAR_DIR, POLICY_CACHE_FILE_NAME)
+
+    def _load(self):
+        # Every process merges its new entries into the file, so the file has
+        # the entries of all the processes.  It's replaced whenever it's
+        # written, so its inode tells when it changed.
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            if self._version is not None:
+                # The cache was flushed.
+                self._entries.clear()
+                self._unsaved.clear()
+                self._version = None
+            return
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version == self._version:
+            return
+        self._version = version
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as fp:
+                entries = json.load(fp)
+        except (OSError, ValueError):
+            elog.exception('Ignoring corrupt DMARC policy cache: %s',
+                           self.filename)
+            return
+        self._entries = {
+            dmarc_domain: (
+                expires,
+                None if records is None else [
+                    tuple(record) for record in records])
+            for dmarc_domain, (expires, records) in entries.items()
+            }
+        self._entries.update(self._unsaved)
+
+    def _save(self):
+        # Merge in what the other processes saved since the last time.
+        self._load()
+        self._last_save = monotonic()
+        right_now = now(strip_tzinfo=False).timestamp()
+        self._entries = {
+            dmarc_domain: (expires, records)
+            for dmarc_domain, (expires, records) in self._entries.items()
+            if expires > right_now
+            }
+        # Other processes may be saving at the same time, so each writes its
+        # own temporary file.
+        tmpfile = '{}.{}.tmp'.format(self.filename, os.getpid())
+        try:
+            with open(tmpfile, 'w', encoding='utf-8') as fp:
+                json.dump(self._entries, fp)
+            os.replace(tmpfile, self.filename)
+            stat = os.stat(self.filename)
+        except OSError:
+            # The in-memory cache still works.
+            elog.exception('Cannot save DMARC policy cache: %s',
+                           self.filename)
+        else:
+            self._version = (stat.st_ino, stat.st_mtime_ns)
+            self._unsaved.clear()
+
+    def _save_unsaved(self):
+        if len(self._unsaved) > 0:
+            self._save()
+
+    def lookup(self, dmarc_domain):
+        """Return the DMARC related DNS records of a _dmarc host name.
+
+        :param dmarc_domain: The _dmarc host name to look up.
+        :return: A list of (name, type, value) tuples for the TXT and CNAME
+            records in the answer, or None if the host name has no TXT
+            records.
+        :raises DNSException: when the records can't be looked up.
+        """
+        lifetime = as_timedelta(
+            config.dmarc.policy_cache_lifetime).total_seconds()
+        if lifetime <= 0:
+            try:
+                records, ttl = _query(dmarc_domain)
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+                return None
+            return records
+        right_now = now(strip_tzinfo=False).timestamp()
+        self._load()
+        cached = self._entries.get(dmarc_domain)
+        if cached is not None and cached[0] > right_now:
+            return cached[1]
+        try:
+            records, ttl = _query(dmarc_domain)
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            records = None
+            ttl = as_timedelta(
+                config.dmarc.policy_negative_lifetime).total_seconds()
+        if ttl is None or ttl > lifetime:
+            ttl = lifetime
+        entry = (right_now + ttl, records)
+        self._entries[dmarc_domain] = self._unsaved[dmarc_domain] = entry
+        if not self._atexit:
+            atexit.register(self._save_unsaved)
+            self._atexit = True
+        if (self._last_save is None or
+                monotonic() - self._last_save >= POLICY_CACHE_SAVE_INTERVAL):
+            self._save()
+        return records
+
+    def entries(self):
+        """The unexpired entries of the cache, from all processes.
+
+        :return: A sorted list of (dmarc_domain, expires, records) tuples,
+            where `expires` is the time in seconds since the epoch and
+            `records` is as returned by `lookup()`.
+        """
+        self._load()
+        right_now = now(strip_tzinfo=False).timestamp()
+        return [
+            (dmarc_domain, expires, records)
+            for dmarc_domain, (expires, records)
+            in sorted(self._entries.items())
+            if expires > right_now
+            ]
+
+    def flush(self, dmarc_domain=None):
+        """Forget cached policies, in all processes.
+
+        :param dmarc_domain: If given, only forget the policy of this _dmarc
+            host name.
+        """
+        if dmarc_domain is None:
+            self._entries.clear()
+            self._unsaved.clear()
+            self._version = None
+            self._last_save = None
+            with suppress(FileNotFoundError):
+                os.remove(self.filename)
+            return
+        self._load()
+        self._unsaved.pop(dmarc_domain, None)
+        if self._entries.pop(dmarc_domain, None) is not None:
+            self._save()
+
+
+policy_cache = PolicyCache()
+
+
 def is_reject_or_quarantine(mlist, email, dmarc_domain, org=False):
     # This takes a mailing list, an email address as in the From: header, the
     # _dmarc host name for the domain in question, and a flag stating whether
@@ -174,15 +379,8 @@ def is_reject_or_quarantine(mlist, email, dmarc_domain, org=False):
     # * True if the DMARC policy is reject or quarantine;
     # * False if is not;
     # * A special sentinel if we should continue looking
-    resolver = dns.resolver.Resolver()
-    resolver.timeout = as_timedelta(
-        config.dmarc.resolver_timeout).total_seconds()
-    resolver.lifetime = as_timedelta(
-        config.dmarc.resolver_lifetime).total_seconds()
     try:
-        txt_recs = resolver.query(dmarc_domain, dns.rdatatype.TXT)
-    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
-        return KEEP_LOOKING
+        records = policy_cache.lookup(dmarc_domain)
     except (dns.resolver.NoNameservers):
         elog.error(
             'DNSException: No Nameservers available for %s (%s).',
@@ -200,24 +398,18 @@ def is_reject_or_quarantine(mlist, email, dmarc_domain, org=False):
         # a DMARC policy record that we missed and that a receiver of the mail
         # might see.  Thus, we should err on the side of caution and mitigate.
         return True
+    if records is None:
+        return KEEP_LOOKING
     # Be as robust as possible in parsing the result.
     results_by_name = {}
     cnames = {}
     want_names = set([dmarc_domain + '.'])
-    # Check all the TXT records returned by DNS.  Keep track of the CNAMEs for
-    # checking later on.  Ignore any other non-TXT records.
-    for txt_rec in txt_recs.response.answer:
-        # Don't be fooled by an answer with uppercase in the name.
-        name = txt_rec.name.to_text().lower()
-        if txt_rec.rdtype == dns.rdatatype.CNAME:
-            cnames[name] = (
-                next(iter(txt_rec.items)).target.to_text())
-        if txt_rec.rdtype != dns.rdatatype.TXT:
-            continue
-        result = EMPTYSTRING.join(
-            str(record, encoding='utf-8')
-            for record in next(iter(txt_rec.items)).strings)
-        results_by_name.setdefault(name, []).append(result)
+    # Check all the TXT records returned by DNS, and follow the CNAMEs.
+    for name, rdtype, value in records:
+        if rdtype == 'CNAME':
+            cnames[name] = value
+        else:
+            results_by_name.setdefault(name, []).append(value)
     expands = list(want_names)
     seen = set(expands)
     while expands:
@@ -40,7 +40,7 @@ from mailman.testing.helpers import (
     wait_for_webservice,
 )
 from mailman.testing.layers import ConfigLayer
-from mailman.utilities.datetime import now
+from mailman.utilities.datetime import factory, now
 from public import public
 from unittest import TestCase
 from unittest.mock import patch
@@ -500,6 +500,148 @@ except ImportError:
 
 
 # We need a web server to vend non-mailman: urls.
+class TestPolicyCache(TestCase):
+    """Test the cache of DMARC policies."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        self._mlist = create_list('ant@example.com')
+        self._mlist.dmarc_mitigate_action = DMARCMitigateAction.reject
+        self._cache = dmarc.policy_cache
+        resources = ExitStack()
+        self.addCleanup(resources.close)
+        resources.enter_context(get_dns_resolver())
+        self._query = resources.enter_context(
+            patch('mailman.rules.dmarc._query', wraps=dmarc._query))
+        resources.enter_context(
+            patch('mailman.rules.dmarc.suffix_cache', {}))
+        use_test_organizational_data(resources)
+
+    def _check(self, sender):
+        msg = mfs("""\
+From: {}
+To: ant@example.com
+
+""".format(sender))
+        return dmarc.DMARCMitigation().check(self._mlist, msg, {})
+
+    def test_policy_is_cached(self):
+        self.assertTrue(self._check('anne@example.biz'))
+        self.assertTrue(self._check('bart@example.biz'))
+        self.assertEqual(self._query.call_count, 1)
+        [(dmarc_domain, expires, records)] = self._cache.entries()
+        self.assertEqual(dmarc_domain, '_dmarc.example.biz')
+        self.assertEqual(
+            records, [('_dmarc.example.biz.', 'TXT', 'v=DMARC1; p=reject;')])
+
+    def test_no_policy_is_cached(self):
+        # The lookup of example.org finds no such domain, and so does the
+        # lookup of its organizational domain.
+        self.assertFalse(self._check('anne@sub.example.org'))
+        self.assertEqual(self._query.call_count, 2)
+        self.assertFalse(self._check('anne@sub.example.org'))
+        self.assertEqual(self._query.call_count, 2)
+        self.assertEqual(
+            [(dmarc_domain, records)
+             for dmarc_domain, expires, records in self._cache.entries()],
+            [('_dmarc.example.org', None), ('_dmarc.sub.example.org', None)])
+
+    def test_errors_are_not_cached(self):
+        self.assertTrue(self._check('anne@example.info'))
+        self.assertTrue(self._check('anne@example.info'))
+        self.assertEqual(self._query.call_count, 2)
+        self.assertEqual(self._cache.entries(), [])
+
+    @configuration('dmarc', policy_cache_lifetime='0s')
+    def test_disabled(self):
+        self.assertTrue(self._check('anne@example.biz'))
+        self.assertTrue(self._check('bart@example.biz'))
+        self.assertEqual(self._query.call_count, 2)
+        self.assertEqual(self._cache.entries(), [])
+
+    def test_record_ttl(self):
+        # Policies are cached for as long as the TTL of their records says,
+        # but no longer than the configured lifetime.
+        records = [('_dmarc.example.biz.', 'TXT', 'v=DMARC1; p=reject;')]
+        self._query.side_effect = [(records, 60), (records, 86400)]
+        start = now(strip_tzinfo=False).timestamp()
+        self.assertTrue(self._check('anne@example.biz'))
+        [(dmarc_domain, expires, records)] = self._cache.entries()
+        self.assertEqual(expires, start + 60)
+        factory.fast_forward()
+        self.assertTrue(self._check('anne@example.biz'))
+        self.assertEqual(self._query.call_count, 2)
+        [(dmarc_domain, expires, records)] = self._cache.entries()
+        self.assertEqual(expires, start + 86400 + 3600)
+
+    def test_shared_between_processes(self):
+        # The cache on disk is seen by other processes.
+        self.assertTrue(self._check('anne@example.biz'))
+        other_cache = dmarc.PolicyCache()
+        self.assertEqual(
+            other_cache.lookup('_dmarc.example.biz'),
+            [('_dmarc.example.biz.', 'TXT', 'v=DMARC1; p=reject;')])
+        self.assertEqual(self._query.call_count, 1)
+        # Flushing the cache in the other process works in this one too.
+        other_cache.flush()
+        self.assertTrue(self._check('anne@example.biz'))
+        self.assertEqual(self._query.call_count, 2)
+
+    def test_saves_are_throttled(self):
+        # The first new entry is saved straight away, but the next ones only
+        # after a while.
+        with patch('mailman.rules.dmarc.monotonic', return_value=0):
+            self.assertTrue(self._check('anne@example.biz'))
+            self.assertFalse(self._check('anne@example.org'))
+        other_cache = dmarc.PolicyCache()
+        self.assertEqual(
+            [dmarc_domain for dmarc_domain, expires, records
+             in other_cache.entries()],
+            ['_dmarc.example.biz'])
+        with patch('mailman.rules.dmarc.monotonic',
+                   return_value=dmarc.POLICY_CACHE_SAVE_INTERVAL):
+            self.assertFalse(self._check('anne@example.com'))
+        self.assertEqual(
+            [dmarc_domain for dmarc_domain, expires, records
+             in other_cache.entries()],
+            ['_dmarc.example.biz', '_dmarc.example.com', '_dmarc.example.org'])
+
+    def test_saves_are_merged(self):
+        # Each process adds its entries to those saved by the others.
+        other_cache = dmarc.PolicyCache()
+        self.assertEqual(
+            other_cache.lookup('_dmarc.example.biz'),
+            [('_dmarc.example.biz.', 'TXT', 'v=DMARC1; p=reject;')])
+        self.assertFalse(self._check('anne@example.org'))
+        self.assertEqual(
+            [dmarc_domain for dmarc_domain, expires, records
+             in dmarc.PolicyCache().entries()],
+            ['_dmarc.example.biz', '_dmarc.example.org'])
+        # The temporary files are gone.
+        self.assertEqual(
+            [filename for filename in os.listdir(config.VAR_DIR)
+             if filename.endswith('.tmp')],
+            [])
+
+    def test_flush_one(self):
+        self.assertTrue(self._check('anne@example.biz'))
+        self.assertFalse(self._check('anne@example.org'))
+        self._cache.flush('_dmarc.example.biz')
+        self.assertEqual(
+            [dmarc_domain for dmarc_domain, expires, records
+             in self._cache.entries()],
+            ['_dmarc.example.org'])
+
+    def test_corrupt_cache_file(self):
+        with open(self._cache.filename, 'w') as fp:
+            fp.write('{')
+        mark = LogFileMark('mailman.error')
+        self.assertTrue(self._check('anne@example.biz'))
+        self.assertIn('Ignoring corrupt DMARC policy cache', mark.read())
+        self.assertEqual(len(self._cache.entries()), 1)
+
+
 class TestableHandler(BaseHTTPRequestHandler):
     # Be quiet.
     def log_request(*args, **kws):
@@ -19,14 +19,13 @@
 
 import logging
 
+from datetime import datetime
 from flufl.bounce import all_failures
+from lazr.config import as_timedelta
 from mailman.app.bounces import maybe_forward, ProbeVERP, StandardVERP
+from mailman.config import config
 from mailman.core.runner import Runner
-from mailman.interfaces.bounce import (
-    BounceContext,
-    IBounceProcessor,
-    InvalidBounceEvent,
-)
+from mailman.interfaces.bounce import BounceContext, IBounceProcessor
 from public import public
 from zope.component import getUtility
 
@@ -44,6 +43,9 @@ class BounceRunner(Runner):
     def __init__(self, name, slice=None):
         super().__init__(name, slice)
         self._processor = getUtility(IBounceProcessor)
+        self._last_warnings = datetime.min
+        self._warnings_delay = as_timedelta(
+            config.bounces.send_warnings_every)
 
     def _dispose(self, mlist, msg, msgdata):
         # List isn't doing bounce processing?
@@ -110,15 +112,12 @@ class BounceRunner(Runner):
     def _process_events(self):
         """Process all the pending bounce events."""
         log.debug('Processing bounce events.')
-        for bounce_event in self._processor.unprocessed:
-            try:
-                self._processor.process_event(bounce_event)
-            except InvalidBounceEvent as e:
-                # This member is either unsubscribed or this is a very stale
-                # event.
-                log.info('Bounce message for a non subscriber: {}'.format(e))
+        self._processor.process_events()
 
     def _send_warnings(self):
         """Send warnings to disabled users and remove them if needed."""
+        if self._last_warnings + self._warnings_delay > datetime.now():
+            return
+        self._last_warnings = datetime.now()
         log.debug('Sending warnings to members with disabled delivery.')
         self._processor.send_warnings_and_remove()
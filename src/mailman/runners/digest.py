@@ -21,7 +21,7 @@ import os
 import re
 import logging
 
-from copy import deepcopy
+from email import message_from_bytes
 from email.header import Header
 from email.mime.message import MIMEMessage
 from email.mime.text import MIMEText
@@ -30,7 +30,7 @@ from io import StringIO
 from mailman.config import config
 from mailman.core.i18n import _
 from mailman.core.runner import Runner
-from mailman.email.message import Message, MultipartDigestMessage
+from mailman.email.message import LazyMessage, Message, MultipartDigestMessage
 from mailman.handlers.decorate import decorate
 from mailman.interfaces.member import DeliveryMode, DeliveryStatus
 from mailman.interfaces.template import ITemplateLoader
@@ -174,10 +174,12 @@ class MIMEDigester(Digester):
         self._message.attach(toc_part)
 
     def add_message(self, msg, count):
-        """Add the message to the digest."""
-        # Make a copy of the message object, since the RFC 1153 processing
-        # scrubs out attachments.
-        digest_msg = MIMEMessage(deepcopy(msg))
+        """Add the message to the digest.
+
+        The message object becomes part of the digest, so it must not be
+        shared with the RFC 1153 digester, which scrubs out attachments.
+        """
+        digest_msg = MIMEMessage(msg)
         digest_msg_content = digest_msg.get_payload(0)
         # It would be nice to add Message: n near the beginning, but there's no
         # method for that.  MUAs mostly don't display it anyway, so it doesn't
@@ -211,6 +213,9 @@ class RFC1153Digester(Digester):
         self._separator70 = '-' * 70
         self._separator30 = '-' * 30
         self._text = StringIO()
+        # The table of contents is only complete after all the messages have
+        # been added, so their text goes to a separate buffer.
+        self._bodies = StringIO()
         print(self._masthead, file=self._text)
         print(file=self._text)
         # Add the optional digest header.
@@ -237,26 +242,26 @@ class RFC1153Digester(Digester):
     def add_message(self, msg, count):
         """Add the message to the digest."""
         if count > 1:
-            print(self._separator30, file=self._text)
-            print(file=self._text)
+            print(self._separator30, file=self._bodies)
+            print(file=self._bodies)
         # Each message section contains a few headers.
         # add the Message: n header first.
-        print('Message: {}'.format(count), file=self._text)
+        print('Message: {}'.format(count), file=self._bodies)
         # Then the others.
         for header in config.digests.plain_digest_keep_headers.split():
             if header in msg:
                 value = oneline(msg[header], in_unicode=True)
                 value = wrap('{}: {}'.format(header, value))
                 value = '\n\t'.join(value.split('\n'))
-                print(value, file=self._text)
-        print(file=self._text)
+                print(value, file=self._bodies)
+        print(file=self._bodies)
         # Get the scrubbed payload.  This is the original payload with all
         # non text/plain parts replaced by notes that they've been removed.
         payload = scrub(msg)
         # Add the payload.
-        print(payload, file=self._text)
+        print(payload, file=self._bodies)
         if not payload.endswith('\n'):
-            print(file=self._text)
+            print(file=self._bodies)
 
     def finish(self):
         """Finish up the digest, producing the email-ready copy."""
@@ -265,21 +270,21 @@ class RFC1153Digester(Digester):
             # MAS: There is no real place for the digest_footer in an RFC 1153
             # compliant digest, so add it as an additional message with
             # Subject: Digest Footer
-            print(self._separator30, file=self._text)
-            print(file=self._text)
-            print('Subject: ' + _('Digest Footer'), file=self._text)
-            print(file=self._text)
-            print(footer_text, file=self._text)
-            print(file=self._text)
-            print(self._separator30, file=self._text)
-            print(file=self._text)
+            print(self._separator30, file=self._bodies)
+            print(file=self._bodies)
+            print('Subject: ' + _('Digest Footer'), file=self._bodies)
+            print(file=self._bodies)
+            print(footer_text, file=self._bodies)
+            print(file=self._bodies)
+            print(self._separator30, file=self._bodies)
+            print(file=self._bodies)
         # Add the sign-off.
         sign_off = _('End of ') + self._digest_id
-        print(sign_off, file=self._text)
-        print('*' * len(sign_off), file=self._text)
+        print(sign_off, file=self._bodies)
+        print('*' * len(sign_off), file=self._bodies)
         # If the digest message can't be encoded by the list character set,
         # fall back to utf-8 with error replacement.
-        text = self._text.getvalue()
+        text = self._text.getvalue() + self._bodies.getvalue()
         try:
             self._message.set_payload(text.encode(self._charset),
                                       charset=self._charset)
@@ -303,25 +308,23 @@ class DigestRunner(Runner):
             # Create the digesters.
             mime_digest = MIMEDigester(mlist, volume, digest_number)
             rfc1153_digest = RFC1153Digester(mlist, volume, digest_number)
-            # Cruise through all the messages in the mailbox, first building
-            # the table of contents and accumulating Subject: headers and
-            # authors.  The question really is whether it's better from a1
-            # performance and memory footprint to go through the mailbox once
-            # and cache the messages in a list, or to cruise through the
-            # mailbox twice.  We'll do the latter, but it's a complete guess.
+            # Cruise through the mailbox once.  Every message is parsed once,
+            # for the table of contents and the RFC 1153 digest.  The MIME
+            # digest only keeps the raw bytes, which aren't parsed again
+            # until the digest is sent.
             count = None
-            for count, (key, message) in enumerate(mailbox.iteritems(), 1):
+            for count, key in enumerate(mailbox.iterkeys(), 1):
+                raw = mailbox.get_bytes(key)
+                message = message_from_bytes(raw, Message)
                 mime_digest.add_to_toc(message, count)
                 rfc1153_digest.add_to_toc(message, count)
+                mime_digest.add_message(LazyMessage(raw), count)
+                rfc1153_digest.add_message(message, count)
             assert count is not None, 'No digest messages?'
-            # Add the table of contents.
+            # Add the table of contents, which both digesters put in front
+            # of the messages.
             mime_digest.add_toc(count)
             rfc1153_digest.add_toc(count)
-            # Cruise through the set of messages a second time, adding them to
-            # the actual digest.
-            for count, (key, message) in enumerate(mailbox.iteritems(), 1):
-                mime_digest.add_message(message, count)
-                rfc1153_digest.add_message(message, count)
             # Finish up the digests.
             mime = mime_digest.finish()
             rfc1153 = rfc1153_digest.finish()
@@ -331,23 +334,23 @@ class DigestRunner(Runner):
         # When someone turns off digest delivery, they will get one last
         # digest to ensure that there will be no gaps in the messages they
         # receive.
-        digest_members = set(mlist.digest_members.members)
-        for member in digest_members:
-            if member.delivery_status is not DeliveryStatus.enabled:
+        for member, preferences in mlist.digest_members.with_preferences():
+            if preferences.delivery_status is not DeliveryStatus.enabled:
                 continue
             # Send the digest to the case-preserved address of the digest
             # members.
             email_address = member.address.original_email
-            if member.delivery_mode == DeliveryMode.plaintext_digests:
+            delivery_mode = preferences.delivery_mode
+            if delivery_mode == DeliveryMode.plaintext_digests:
                 rfc1153_recipients.add(email_address)
             # We currently treat summary_digests the same as mime_digests.
-            elif member.delivery_mode in (DeliveryMode.mime_digests,
-                                          DeliveryMode.summary_digests):
+            elif delivery_mode in (DeliveryMode.mime_digests,
+                                   DeliveryMode.summary_digests):
                 mime_recipients.add(email_address)
             else:
                 raise AssertionError(
                     'Digest member "{}" unexpected delivery mode: {}'.format(
-                        email_address, member.delivery_mode))
+                        email_address, delivery_mode))
         # Add also the folks who are receiving one last digest.
         for address, delivery_mode in mlist.last_digest_recipients:
             if delivery_mode == DeliveryMode.plaintext_digests:
@@ -40,6 +40,7 @@ import logging
 
 from aiosmtpd.controller import Controller
 from aiosmtpd.lmtp import LMTP
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
 from email.utils import parseaddr
 from mailman.config import config
@@ -88,12 +89,13 @@ SUBADDRESS_QUEUES = dict(
 DASH = '-'
 CRLF = '\r\n'
 ERR_451 = '451 Requested action aborted: error in processing'
+ERR_451_BUSY = '451 Requested action aborted: too many pending messages'
 ERR_501 = '501 Message has defects'
 ERR_502 = '502 Error: command HELO not implemented'
 ERR_550 = '550 Requested action not taken: mailbox unavailable'
 
 
-def split_recipient(address):
+def split_recipient(address, alias_domains=None):
     """Split an address into listname, subaddress and domain parts.
 
     For example:
@@ -105,6 +107,8 @@ def split_recipient(address):
     ('mylist', 'request', 'example.com')
 
     :param address: The destination address.
+    :param alias_domains: An optional dictionary mapping the alias domains to
+        their domain's mail_host.  If not given, the domains are looked up.
     :return: A 3-tuple of the form (list-shortname, subaddress, domain).
         subaddress may be None if this is the list's posting address.
 
@@ -112,11 +116,9 @@ def split_recipient(address):
     IDomain Domain, the domain is replaced by the Domain's mail_host.
     """
     localpart, domain = address.split('@', 1)
-    domain_manager = getUtility(IDomainManager)
-    for d in domain_manager:
-        if d.alias_domain is not None and domain == d.alias_domain:
-            domain = d.mail_host
-            break
+    if alias_domains is None:
+        alias_domains = _alias_domains()
+    domain = alias_domains.get(domain, domain)
     localpart = localpart.split(config.mta.verp_delimiter, 1)[0]
     listname, dash, subaddress = localpart.rpartition('-')
     if subaddress not in SUBADDRESS_NAMES or listname == '' or dash == '':
@@ -125,21 +127,95 @@ def split_recipient(address):
     return listname, subaddress, domain
 
 
+def _alias_domains():
+    return {
+        domain.alias_domain: domain.mail_host
+        for domain in getUtility(IDomainManager)
+        if domain.alias_domain is not None
+        }
+
+
+class ListDirectory:
+    """The mailing lists and domain aliases, cached in memory.
+
+    The directory is only reloaded from the database when the list manager's
+    directory version changes, so that validating the recipients of a
+    message needs no other database access.
+    """
+
+    def __init__(self):
+        self._version = None
+        self.list_ids = {}
+        self.alias_domains = {}
+
+    def refresh(self):
+        """Reload the directory if it is out of date."""
+        list_manager = getUtility(IListManager)
+        version = list_manager.directory_version
+        if version == self._version:
+            return
+        self.list_ids = list_manager.list_ids_by_name
+        self.alias_domains = _alias_domains()
+        self._version = version
+
+
 class LMTPHandler:
-    @asyncio.coroutine
+    """Accept messages over LMTP and put them into the right queues.
+
+    The blocking work of handling a message, i.e. parsing it, looking up its
+    recipients, and writing it to the queues, is done by a pool of worker
+    threads, so that a slow disk doesn't stall the other LMTP sessions.  The
+    database is only used from one thread of its own, since the process has
+    a single database session.  Once `max_pending` messages are being
+    handled, more messages are temporarily refused so that the MTA retries
+    them later, instead of piling up in memory.
+    """
+
+    def __init__(self, max_workers=4, max_pending=64):
+        self._directory = ListDirectory()
+        self._max_pending = max_pending
+        # Only touched from the event loop's thread.
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix='lmtp')
+        self._db_executor = ThreadPoolExecutor(
+            1, thread_name_prefix='lmtp-db')
+
+    def close(self):
+        """Finish handling the pending messages and stop the threads."""
+        self._executor.shutdown()
+        self._db_executor.shutdown()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self._pending >= self._max_pending:
+            slog.error('Too many pending messages, deferring message from %s',
+                       envelope.mail_from)
+            return CRLF.join(ERR_451_BUSY for to in envelope.rcpt_tos)
+        self._pending += 1
+        try:
+            return await asyncio.get_event_loop().run_in_executor(
+                self._executor, self._handle_message, envelope)
+        finally:
+            self._pending -= 1
+
     @transactional
-    def handle_DATA(self, server, session, envelope):
+    def _refresh_directory(self):
+        # Check whether the set of mailing lists changed every time we process
+        # a message.  This runs in the database thread.
+        directory = self._directory
+        directory.refresh()
+        return directory.list_ids, directory.alias_domains
+
+    def _handle_message(self, envelope):
         try:
-            # Refresh the list of list names every time we process a message
-            # since the set of mailing lists could have changed.
-            listnames = set(getUtility(IListManager).names)
+            list_ids, alias_domains = self._db_executor.submit(
+                self._refresh_directory).result()
             # Parse the message data.  If there are any defects in the
             # message, reject it right away; it's probably spam.
             msg = email.message_from_bytes(envelope.content, Message)
             msg.set_unixfrom(envelope.mail_from)
         except Exception:
             elog.exception('LMTP message parsing')
-            config.db.abort()
             return CRLF.join(ERR_451 for to in envelope.rcpt_tos)
         # Do basic post-processing of the message, checking it for defects or
         # other missing information.
@@ -167,25 +243,26 @@ class LMTPHandler:
         for to in envelope.rcpt_tos:
             try:
                 to = parseaddr(to)[1].lower()
-                local, subaddress, domain = split_recipient(to)
+                local, subaddress, domain = split_recipient(
+                    to, alias_domains)
                 if subaddress is not None:
                     # Check that local-subaddress is not an actual list name.
                     listname = '{}-{}@{}'.format(local, subaddress, domain)
-                    if listname in listnames:
+                    if listname in list_ids:
                         local = '{}-{}'.format(local, subaddress)
                         subaddress = None
                 slog.debug('%s to: %s, list: %s, sub: %s, dom: %s',
                            message_id, to, local, subaddress, domain)
                 listname = '{}@{}'.format(local, domain)
-                if listname not in listnames:
+                list_id = list_ids.get(listname)
+                if list_id is None:
                     status.append(ERR_550)
                     continue
-                mlist = getUtility(IListManager).get_by_fqdn(listname)
                 # The recipient is a valid mailing list.  Find the subaddress
                 # if there is one, and set things up to enqueue to the proper
                 # queue.
                 queue = None
-                msgdata = dict(listid=mlist.list_id,
+                msgdata = dict(listid=list_id,
                                original_size=msg.original_size,
                                received_time=received_time)
                 canonical_subaddress = SUBADDRESS_NAMES.get(subaddress)
@@ -220,7 +297,6 @@ class LMTPHandler:
                     status.append('250 Ok')
             except Exception:
                 slog.exception('Queue detection: %s', msg['message-id'])
-                config.db.abort()
                 status.append(ERR_550)
         # All done; returning this big status string should give the expected
         # response to the LMTP client.
@@ -246,7 +322,10 @@ class LMTPRunner(Runner):
         super().__init__(name, slice)
         hostname = config.mta.lmtp_host
         port = int(config.mta.lmtp_port)
-        self.lmtp = LMTPController(LMTPHandler(), hostname=hostname, port=port)
+        self._handler = LMTPHandler(
+            max_workers=int(config.mta.lmtp_max_workers),
+            max_pending=int(config.mta.lmtp_max_pending))
+        self.lmtp = LMTPController(self._handler, hostname=hostname, port=port)
         qlog.debug('LMTP server listening on %s:%s', hostname, port)
 
     def run(self):
@@ -256,3 +335,4 @@ class LMTPRunner(Runner):
             while not self._stop:
                 self._snooze(0)
             self.lmtp.stop()
+            self._handler.close()
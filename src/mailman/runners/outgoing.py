@@ -31,6 +31,7 @@ from mailman.interfaces.mailinglist import Personalization
 from mailman.interfaces.mta import SomeRecipientsFailed
 from mailman.interfaces.pending import IPendings
 from mailman.interfaces.subscriptions import ISubscriptionService
+from mailman.mta.base import delivery_pool
 from mailman.utilities.datetime import now
 from mailman.utilities.modules import find_name
 from public import public
@@ -183,3 +184,16 @@ Error message: {}
                     self._retryq.enqueue(msg, msgdata)
         # We've successfully completed handling of this message.
         return False
+
+    def _snooze(self, filecnt):
+        """See `IRunner`."""
+        if not filecnt:
+            # The queue is empty, so don't leave the pooled connections to
+            # the MTA open until they time out there.  They reconnect when
+            # there is something to deliver again.
+            delivery_pool.disconnect()
+        super()._snooze(filecnt)
+
+    def _clean_up(self):
+        """See `IRunner`."""
+        delivery_pool.close()
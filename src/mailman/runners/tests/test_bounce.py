@@ -36,6 +36,7 @@ from mailman.interfaces.styles import IStyle, IStyleManager
 from mailman.interfaces.usermanager import IUserManager
 from mailman.runners.bounce import BounceRunner
 from mailman.testing.helpers import (
+    configuration,
     get_queue_messages,
     LogFileMark,
     make_testable_runner,
@@ -43,6 +44,7 @@ from mailman.testing.helpers import (
 )
 from mailman.testing.layers import ConfigLayer
 from mailman.utilities.datetime import now
+from unittest.mock import patch
 from zope.component import getUtility
 from zope.interface import implementer
 
@@ -606,3 +608,21 @@ Message-Id: <first>
         # The membership should still exist.
         self.assertIsNotNone(
             self._mlist.members.get_member(self._anne.email))
+
+    def test_warnings_cadence(self):
+        # Members disabled by bounces are only looked for once in a while.
+        with patch.object(self._processor, 'send_warnings_and_remove') as send:
+            self._runner.run()
+            self._runner.run()
+            self.assertEqual(send.call_count, 1)
+            self._runner._last_warnings -= timedelta(hours=1)
+            self._runner.run()
+            self.assertEqual(send.call_count, 2)
+
+    @configuration('bounces', send_warnings_every='0s')
+    def test_warnings_every_iteration(self):
+        runner = make_testable_runner(BounceRunner, 'bounces')
+        with patch.object(self._processor, 'send_warnings_and_remove') as send:
+            runner.run()
+            runner.run()
+        self.assertEqual(send.call_count, 2)
@@ -28,7 +28,7 @@ from importlib_resources import open_binary
 from io import StringIO
 from mailman.app.lifecycle import create_list
 from mailman.config import config
-from mailman.email.message import Message
+from mailman.email.message import LazyMessage, Message
 from mailman.interfaces.member import DeliveryMode
 from mailman.interfaces.template import ITemplateManager
 from mailman.runners.digest import DigestRunner
@@ -315,6 +315,56 @@ text/plain
             mo = re.search('^Message: {}$'.format(i), body, re.MULTILINE)
             self.assertIsNotNone(mo)
 
+    def _fill_digest(self):
+        anne = subscribe(self._mlist, 'Anne')
+        anne.preferences.delivery_mode = DeliveryMode.mime_digests
+        bart = subscribe(self._mlist, 'Bart')
+        bart.preferences.delivery_mode = DeliveryMode.plaintext_digests
+        mbox = digest_mbox(self._mlist)
+        for i in range(1, 4):
+            msg = mfs("""\
+From: aperson@example.com
+To: test@example.com
+Subject: Test message {}
+
+Here is message {}
+""".format(i, i))
+            if i < 3:
+                mbox.add(msg.as_string())
+        make_digest_messages(self._mlist, msg)
+        items = get_queue_messages('virgin', expected_count=2)
+        return sorted((item.msg for item in items),
+                      key=lambda msg: msg.get_content_type())
+
+    def test_mime_digest_messages_are_not_parsed(self):
+        # The messages in the MIME digest are only kept as raw bytes, and
+        # aren't parsed again until the digest is flattened.
+        mime, plain = self._fill_digest()
+        digest_part = mime.get_payload(2)
+        self.assertEqual(digest_part.get_content_type(), 'multipart/digest')
+        messages = [part.get_payload(0)
+                    for part in digest_part.get_payload()]
+        self.assertEqual(len(messages), 3)
+        for message in messages:
+            self.assertIsInstance(message, LazyMessage)
+            self.assertNotIn('_payload', message.__dict__)
+        self.assertEqual(messages[2]['message'], '3')
+        self.assertEqual(messages[2].get_payload(), 'Here is message 3\n')
+
+    def test_plain_digest_order(self):
+        # The message bodies of the plain text digest are added before the
+        # table of contents is complete, but still come after it.
+        mime, plain = self._fill_digest()
+        body = plain.get_payload(decode=True).decode('us-ascii')
+        topics = body.index("Today's Topics:")
+        positions = [body.index('Message: {}\n'.format(i))
+                     for i in range(1, 4)]
+        self.assertEqual(sorted(positions), positions)
+        self.assertLess(topics, positions[0])
+        self.assertTrue(body.rstrip().endswith(
+            'End of Test Digest, Vol 1, Issue 1\n'
+            '**********************************'))
+
     def test_issue141(self):
         # Currently DigestMode.summary_digests are equivalent to mime_digests.
         # This also tests GL issue 234.
@@ -18,16 +18,26 @@
 """Tests for the LMTP server."""
 
 import os
+import asyncio
 import smtplib
 import unittest
+import threading
 
+from aiosmtpd.smtp import Envelope
 from datetime import datetime
-from mailman.app.lifecycle import create_list
+from mailman.app.lifecycle import create_list, remove_list
 from mailman.config import config
 from mailman.database.transaction import transaction
 from mailman.interfaces.domain import IDomainManager
+from mailman.runners.lmtp import (
+    ERR_451_BUSY,
+    ListDirectory,
+    LMTPHandler,
+    split_recipient,
+)
 from mailman.testing.helpers import get_lmtp_client, get_queue_messages
-from mailman.testing.layers import LMTPLayer
+from mailman.testing.layers import ConfigLayer, LMTPLayer
+from unittest.mock import patch
 from zope.component import getUtility
 
 
@@ -318,3 +328,145 @@ Message-ID: <alpha>
         items = get_queue_messages('command', expected_count=1)
         self.assertEqual(items[0].msgdata['listid'],
                          'longer_than_15_bytes.example.com')
+
+
+class TestListDirectory(unittest.TestCase):
+    """Test the LMTP server's cached directory of mailing lists."""
+
+    layer = LMTPLayer
+
+    def setUp(self):
+        with transaction():
+            self._mlist = create_list('ant@example.com')
+        self._lmtp = get_lmtp_client(quiet=True)
+        self._lmtp.lhlo('remote.example.org')
+        self.addCleanup(self._lmtp.close)
+
+    def _send(self, recipient):
+        self._lmtp.sendmail('anne@example.com', [recipient], """\
+From: anne@example.com
+To: {}
+Subject: My subject
+Message-ID: <alpha>
+
+""".format(recipient))
+
+    def test_deleted_list(self):
+        self._send('ant@example.com')
+        get_queue_messages('in', expected_count=1)
+        with transaction():
+            remove_list(self._mlist)
+        with self.assertRaises(smtplib.SMTPDataError) as cm:
+            self._send('ant@example.com')
+        self.assertEqual(cm.exception.smtp_code, 550)
+
+    def test_created_list(self):
+        self._send('ant@example.com')
+        get_queue_messages('in', expected_count=1)
+        with transaction():
+            create_list('bee@example.com')
+        self._send('bee@example.com')
+        items = get_queue_messages('in', expected_count=1)
+        self.assertEqual(items[0].msgdata['listid'], 'bee.example.com')
+
+    def test_changed_alias_domain(self):
+        self._send('ant@example.com')
+        get_queue_messages('in', expected_count=1)
+        with transaction():
+            getUtility(IDomainManager).get(
+                'example.com').alias_domain = 'x.example.com'
+        self._send('ant@x.example.com')
+        items = get_queue_messages('in', expected_count=1)
+        self.assertEqual(items[0].msgdata['listid'], 'ant.example.com')
+
+
+class TestListDirectoryRefresh(unittest.TestCase):
+    layer = ConfigLayer
+
+    def setUp(self):
+        create_list('ant@example.com')
+        self._directory = ListDirectory()
+
+    def test_refresh(self):
+        self._directory.refresh()
+        self.assertEqual(self._directory.list_ids,
+                         {'ant@example.com': 'ant.example.com'})
+        with patch('mailman.runners.lmtp._alias_domains') as alias_domains:
+            self._directory.refresh()
+        alias_domains.assert_not_called()
+        create_list('bee@example.com')
+        self._directory.refresh()
+        self.assertEqual(self._directory.list_ids, {
+            'ant@example.com': 'ant.example.com',
+            'bee@example.com': 'bee.example.com',
+            })
+
+    def test_split_recipient_alias_domains(self):
+        self.assertEqual(
+            split_recipient('ant-join@x.example.com',
+                            {'x.example.com': 'example.com'}),
+            ('ant', 'join', 'example.com'))
+
+
+class TestLMTPHandler(unittest.TestCase):
+    """Test the handling of messages off the event loop."""
+
+    layer = ConfigLayer
+
+    def setUp(self):
+        with transaction():
+            create_list('ant@example.com')
+        self._handler = LMTPHandler(max_workers=2, max_pending=1)
+        self.addCleanup(self._handler.close)
+        self._envelope = Envelope()
+        self._envelope.mail_from = 'anne@example.com'
+        self._envelope.rcpt_tos = ['ant@example.com', 'bee@example.com']
+        self._envelope.content = b"""\
+From: anne@example.com
+To: ant@example.com
+Subject: My subject
+Message-ID: <alpha>
+
+"""
+        self._loop = asyncio.new_event_loop()
+        self.addCleanup(self._loop.close)
+
+    def _handle(self):
+        return self._loop.run_until_complete(
+            self._handler.handle_DATA(None, None, self._envelope))
+
+    def test_handle(self):
+        threads = {}
+        refresh = ListDirectory.refresh
+        enqueue = config.switchboards['in'].enqueue
+
+        def record_refresh(directory):
+            threads['refresh'] = threading.current_thread().name
+            return refresh(directory)
+
+        def record_enqueue(*args, **kws):
+            threads['enqueue'] = threading.current_thread().name
+            return enqueue(*args, **kws)
+
+        with patch.object(ListDirectory, 'refresh', record_refresh), \
+                patch.object(config.switchboards['in'], 'enqueue',
+                             record_enqueue):
+            status = self._handle()
+        self.assertEqual(status.splitlines(), [
+            '250 Ok',
+            '550 Requested action not taken: mailbox unavailable',
+            ])
+        items = get_queue_messages('in', expected_count=1)
+        self.assertEqual(items[0].msgdata['listid'], 'ant.example.com')
+        # The database is only used from its own thread, and the message is
+        # queued by a worker thread, never by the event loop's.
+        self.assertTrue(threads['refresh'].startswith('lmtp-db'))
+        self.assertTrue(threads['enqueue'].startswith('lmtp'))
+        self.assertFalse(threads['enqueue'].startswith('lmtp-db'))
+        self.assertEqual(self._handler._pending, 0)
+
+    def test_too_many_pending(self):
+        self._handler._pending = 1
+        status = self._handle()
+        self.assertEqual(status.splitlines(), [ERR_451_BUSY, ERR_451_BUSY])
+        get_queue_messages('in', expected_count=0)
@@ -503,11 +503,15 @@ def reset_the_world():
     getUtility(IStyleManager).populate()
     # Remove all dynamic header-match rules.
     config.chains['header-match'].flush()
-    # Remove cached organizational domain suffix file.
-    from mailman.rules.dmarc import LOCAL_FILE_NAME
+    # Remove cached organizational domain suffix file and DMARC policies.
+    from mailman.rules.dmarc import LOCAL_FILE_NAME, policy_cache
     suffix_file = os.path.join(config.VAR_DIR, LOCAL_FILE_NAME)
     with suppress(FileNotFoundError):
         os.remove(suffix_file)
+    policy_cache.flush()
+    # Forget the templates looked up by the previous test.
+    from mailman.model.template import template_cache
+    template_cache.clear()
 
 
 @public
@@ -17,10 +17,13 @@
 
 """String utilities."""
 
+import re
 import logging
+import warnings
 
 from email.errors import HeaderParseError
 from email.header import decode_header, make_header
+from functools import lru_cache
 from mailman.config import config
 from public import public
 from string import Template, whitespace
@@ -31,6 +34,9 @@ EMPTYSTRING = ''
 NL = '\n'
 
 log = logging.getLogger('mailman.error')
+# Patterns which refer to their own groups can't be combined with others,
+# because combining them renumbers the groups.
+_GROUP_REFERENCE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
 
 
 @public
@@ -50,6 +56,22 @@ def expand(template, mlist=None, extras=None, template_class=Template):
     :return: The substituted string.
     :rtype: string
     """
+    substitutions = standard_substitutions(mlist)
+    if extras is not None:
+        substitutions.update(extras)
+    return template_class(template).safe_substitute(substitutions)
+
+
+@public
+def standard_substitutions(mlist=None):
+    """Return the standard substitutions used by `expand()`.
+
+    :param mlist: Optional mailing list.  If given, the list-specific
+        substitution variables are included.
+    :type mlist: `IMailingList`
+    :return: A new substitutions dictionary.
+    :rtype: dict
+    """
     substitutions = dict(
         site_email=config.mailman.site_owner,
         )
@@ -66,9 +88,116 @@ def expand(template, mlist=None, extras=None, template_class=Template):
             owner_email=mlist.owner_address,
             language=mlist.preferred_language.code,
             ))
-    if extras is not None:
-        substitutions.update(extras)
-    return template_class(template).safe_substitute(substitutions)
+    return substitutions
+
+
+@public
+class CompiledTemplate:
+    """A PEP 292 $-string template which is parsed only once.
+
+    Substituting into a compiled template gives the same result as the
+    template's `safe_substitute()`.  Some of the placeholders can be bound
+    ahead of time, e.g. the ones which are the same for every recipient of a
+    message, leaving only the others to be substituted each time.
+    """
+
+    def __init__(self, literals, placeholders):
+        # There is one more literal than there are placeholders; they
+        # alternate, starting and ending with a literal.  Each placeholder is
+        # a tuple of its name and its text in the template.
+        self._literals = literals
+        self._placeholders = placeholders
+
+    @classmethod
+    def parse(cls, template, template_class=Template):
+        """Parse the template.
+
+        :param template: A PEP 292 $-string template.
+        :type template: string
+        :param template_class: The template class whose syntax to use.
+        :type template_class: class
+        :return: The compiled template.
+        :rtype: `CompiledTemplate`
+        """
+        literals = []
+        placeholders = []
+        literal = []
+        start = 0
+        for mo in template_class.pattern.finditer(template):
+            literal.append(template[start:mo.start()])
+            start = mo.end()
+            name = mo.group('named') or mo.group('braced')
+            if name is not None:
+                literals.append(EMPTYSTRING.join(literal))
+                placeholders.append((name, mo.group()))
+                literal = []
+            elif mo.group('escaped') is not None:
+                literal.append(template_class.delimiter)
+            else:
+                # Like safe_substitute(), leave invalid placeholders alone.
+                literal.append(mo.group())
+        literal.append(template[start:])
+        literals.append(EMPTYSTRING.join(literal))
+        return cls(literals, placeholders)
+
+    def bind(self, substitutions):
+        """Substitute some of the placeholders.
+
+        :param substitutions: The values of the placeholders to bind.  Other
+            placeholders are left for later.
+        :type substitutions: dict
+        :return: The partially substituted template.
+        :rtype: `CompiledTemplate`
+        """
+        literals = []
+        placeholders = []
+        literal = [self._literals[0]]
+        for placeholder, following in zip(
+                self._placeholders, self._literals[1:]):
+            name = placeholder[0]
+            if name in substitutions:
+                literal.append(str(substitutions[name]))
+            else:
+                literals.append(EMPTYSTRING.join(literal))
+                placeholders.append(placeholder)
+                literal = []
+            literal.append(following)
+        literals.append(EMPTYSTRING.join(literal))
+        return CompiledTemplate(literals, placeholders)
+
+    def substitute(self, substitutions):
+        """Substitute the placeholders.
+
+        :param substitutions: The values of the placeholders.  Placeholders
+            without a value are left in the text.
+        :type substitutions: dict
+        :return: The substituted string.
+        :rtype: string
+        """
+        literals = self._literals
+        if len(literals) == 1:
+            return literals[0]
+        parts = [literals[0]]
+        for (name, text), following in zip(self._placeholders, literals[1:]):
+            value = substitutions.get(name, text)
+            parts.append(value if value is text else str(value))
+            parts.append(following)
+        return EMPTYSTRING.join(parts)
+
+
+@public
+@lru_cache(maxsize=256)
+def compile_template(template, template_class=Template):
+    """Return the compiled template, parsing it only the first time.
+
+    :param template: A PEP 292 $-string template.
+    :type template: string
+    :param template_class: The template class whose syntax to use.
+    :type template_class: class
+    :return: The compiled template.
+    :rtype: `CompiledTemplate`
+    """
+    return CompiledTemplate.parse(template, template_class)
 
 
 @public
@@ -185,3 +314,30 @@ def wrap(text, column=70, honor_leading_ws=True):
             wrapped_paragraphs.append(wrapper.fill(paragraph_text))
             add_paragraph_break = True
     return EMPTYSTRING.join(wrapped_paragraphs)
+
+
+@public
+def combine_patterns(patterns, flags=0):
+    """Combine regular expressions into one.
+
+    The combined regular expression matches wherever any of the patterns
+    matches, so it can rule them all out with a single search.
+
+    :param patterns: The regular expressions to combine, as strings.
+    :param flags: The flags to compile the combined regular expression with.
+    :return: The compiled regular expression, or None if the patterns can't
+        be combined safely, e.g. because they refer to their own groups.
+    """
+    if any(_GROUP_REFERENCE.search(pattern) for pattern in patterns):
+        return None
+    # Inline global flags are only allowed at the start of a pattern.  Older
+    # Pythons just warn about them elsewhere, but the warning means that the
+    # combined pattern may not mean the same thing.
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        try:
+            return re.compile(
+                '|'.join('(?:{})'.format(pattern) for pattern in patterns),
+                flags)
+        except (re.error, Warning):
+            return None
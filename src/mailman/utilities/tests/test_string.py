@@ -17,9 +17,11 @@
 
 """Test the string utilities."""
 
+import re
 import unittest
 
 from mailman.utilities import string
+from string import Template
 
 
 class TestString(unittest.TestCase):
@@ -28,3 +30,43 @@ class TestString(unittest.TestCase):
 
     def test_wrap_blank_paragraph(self):
         self.assertEqual(string.wrap('\n\n'), '\n\n')
+
+    def test_combine_patterns(self):
+        cre = string.combine_patterns(['^ant', 'bee$'], re.IGNORECASE)
+        self.assertIsNotNone(cre.match('ANTS'))
+        self.assertIsNotNone(cre.search('a bee'))
+        self.assertIsNone(cre.search('cat'))
+
+    def test_combine_patterns_group_references(self):
+        # Combining patterns renumbers their groups.
+        self.assertIsNone(string.combine_patterns(['(a)', r'(b)\1']))
+        self.assertIsNone(string.combine_patterns(['(?P<x>a)(?P=x)', 'b']))
+
+    def test_combine_patterns_global_flags(self):
+        # Inline global flags must start the pattern.
+        self.assertIsNone(string.combine_patterns(['a', '(?i)b']))
+
+    def test_compiled_template(self):
+        # Compiled templates substitute like safe_substitute() does.
+        text = 'a $b ${c} $$d $ $e ${f'
+        substitutions = dict(b=1, c='$b', e='E')
+        compiled = string.compile_template(text)
+        self.assertEqual(compiled.substitute(substitutions),
+                         Template(text).safe_substitute(substitutions))
+        self.assertEqual(compiled.substitute({}),
+                         Template(text).safe_substitute({}))
+        self.assertEqual(string.compile_template('plain').substitute({}),
+                         'plain')
+
+    def test_compiled_template_bind(self):
+        compiled = string.compile_template('$a-$b-${a}-$c$$')
+        bound = compiled.bind(dict(a='A', c='$b'))
+        # Bound values aren't expanded again.
+        self.assertEqual(bound.substitute(dict(b='B')), 'A-B-A-$b$')
+        self.assertEqual(bound.substitute({}), 'A-$b-A-$b$')
+        # The compiled template itself is unchanged.
+        self.assertEqual(compiled.substitute(dict(b='B')), '$a-B-${a}-$c$')
+
+    def test_compile_template_cached(self):
+        self.assertIs(string.compile_template('$a and $b'),
+                      string.compile_template('$a and $b'))